@@ -0,0 +1,31 @@
+"""add job lease and cancellation columns
+
+Revision ID: 20261019_0004
+Revises: 20260302_0003
+Create Date: 2026-10-19 09:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_0004"
+down_revision: Union[str, Sequence[str], None] = "20260302_0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "jobs",
+        sa.Column("cancel_requested", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.add_column("jobs", sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "lease_expires_at")
+    op.drop_column("jobs", "cancel_requested")
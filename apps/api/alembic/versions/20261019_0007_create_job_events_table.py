@@ -0,0 +1,55 @@
+"""create job events table
+
+Revision ID: 20261019_0007
+Revises: 20261019_0006
+Create Date: 2026-10-19 13:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261019_0007"
+down_revision: Union[str, Sequence[str], None] = "20261019_0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_events",
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            primary_key=True,
+            autoincrement=True,
+        ),
+        sa.Column("job_id", sa.String(length=64), nullable=False),
+        sa.Column("type", sa.String(length=32), nullable=False),
+        sa.Column("event", sa.String(length=16), nullable=False),
+        sa.Column("wait_seconds", sa.Float(), nullable=True),
+        sa.Column("run_seconds", sa.Float(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+    op.create_index("ix_job_events_event_created_at", "job_events", ["event", "created_at"])
+    op.create_index(
+        "ix_job_events_created_at_type_event",
+        "job_events",
+        ["created_at", "type", "event"],
+    )
+    op.create_index("ix_job_events_job_id", "job_events", ["job_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_job_events_job_id", table_name="job_events")
+    op.drop_index("ix_job_events_created_at_type_event", table_name="job_events")
+    op.drop_index("ix_job_events_event_created_at", table_name="job_events")
+    op.drop_table("job_events")
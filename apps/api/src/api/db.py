@@ -5,6 +5,7 @@ from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 
 from api.config import get_settings
+from api.tracing import instrument_engine
 
 
 class Base(DeclarativeBase):
@@ -14,8 +15,10 @@ class Base(DeclarativeBase):
 @lru_cache
 def get_engine() -> Engine:
     settings = get_settings()
-    return create_engine(
-        settings.database_url,
-        echo=settings.db_echo,
-        pool_pre_ping=True,
+    return instrument_engine(
+        create_engine(
+            settings.database_url,
+            echo=settings.db_echo,
+            pool_pre_ping=True,
+        )
     )
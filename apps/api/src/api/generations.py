@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import sys
+
+from api.config import get_settings
+from api.services.rag.collection import resolve_collection
+from api.services.rag.generations import (
+    collect_generations,
+    current_generation,
+    generation_db_path,
+    index_writer_lock,
+    list_generations,
+    rollback_generation,
+)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(
+        prog="rag-generations",
+        description="List, roll back and garbage-collect RAG index generations",
+    )
+    parser.add_argument(
+        "--collection",
+        default=None,
+        help="Named collection from RAG_COLLECTIONS (sets the db path)",
+    )
+    parser.add_argument(
+        "--db-path",
+        default=None,
+        help=f"SQLite index path (default: {settings.rag_db_path})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show retained generations and the current one")
+    rollback = commands.add_parser("rollback", help="Point the index at an older generation")
+    rollback.add_argument(
+        "--to",
+        type=int,
+        default=None,
+        help="Generation id (default: the newest one older than the current)",
+    )
+    gc = commands.add_parser("gc", help="Delete generations beyond the retention count")
+    gc.add_argument(
+        "--keep",
+        type=int,
+        default=settings.rag_index_generations_keep,
+        help=f"Generations to retain, the current one always included (default: {settings.rag_index_generations_keep})",
+    )
+    return parser
+
+
+def _describe(db_path: Path) -> dict[str, object]:
+    current = current_generation(db_path)
+    return {
+        "db_path": str(db_path),
+        "current": current.generation if current is not None else None,
+        "generations": [
+            {
+                "generation": generation,
+                "path": str(generation_db_path(db_path, generation)),
+                "bytes": generation_db_path(db_path, generation).stat().st_size,
+            }
+            for generation in list_generations(db_path)
+        ],
+    }
+
+
+def main() -> None:
+    parser = _build_parser()
+    args = parser.parse_args()
+
+    try:
+        collection = resolve_collection(args.collection)
+        db_path = Path(args.db_path) if args.db_path else collection.db_path
+        if args.command == "rollback":
+            with index_writer_lock(db_path):
+                previous = current_generation(db_path)
+                restored = rollback_generation(db_path, args.to)
+            result: dict[str, object] = {
+                "db_path": str(db_path),
+                "previous": previous.generation if previous is not None else None,
+                "current": restored.generation,
+            }
+        elif args.command == "gc":
+            with index_writer_lock(db_path):
+                removed = collect_generations(db_path, keep=max(1, args.keep))
+            result = {"db_path": str(db_path), "removed": removed}
+        else:
+            result = _describe(db_path)
+    except Exception as exc:
+        print(f"[rag-generations] failed: {exc}", file=sys.stderr, flush=True)
+        raise SystemExit(1) from exc
+
+    print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from pathlib import Path
 import sys
 
 from api.config import get_settings
+from api.services.rag.chunker import CHUNK_STRATEGIES
+from api.services.rag.collection import resolve_collection
 from api.services.rag.reindex_job_runner import run_reindex_job
 
 
@@ -15,27 +17,41 @@ def _build_parser() -> argparse.ArgumentParser:
         prog="rag-ingest",
         description="Ingest sample docs and persist a local RAG index",
     )
+    parser.add_argument(
+        "--collection",
+        default=None,
+        help="Named collection from RAG_COLLECTIONS (sets source dir, db path and embed model)",
+    )
     parser.add_argument(
         "--source-dir",
-        default=settings.rag_source_dir,
-        help="Source directory containing .txt/.md documents",
+        default=None,
+        help=f"Source directory containing .txt/.md documents (default: {settings.rag_source_dir})",
     )
     parser.add_argument(
         "--chunk-size",
         type=int,
         default=settings.rag_chunk_size,
-        help="Chunk size in characters",
+        help="Chunk size in characters (tokens with --chunk-strategy structured)",
     )
     parser.add_argument(
         "--chunk-overlap",
         type=int,
         default=settings.rag_chunk_overlap,
-        help="Chunk overlap in characters",
+        help="Chunk overlap in characters (tokens with --chunk-strategy structured)",
+    )
+    parser.add_argument(
+        "--chunk-strategy",
+        choices=CHUNK_STRATEGIES,
+        default=settings.rag_chunk_strategy,
+        help=(
+            "fixed: character windows; structured: Markdown headings/paragraphs/lists/tables; "
+            "content: content-defined boundaries (stable under edits), at most chunk_size characters"
+        ),
     )
     parser.add_argument(
         "--db-path",
-        default=settings.rag_db_path,
-        help="Output sqlite DB path for persisted index artifacts",
+        default=None,
+        help=f"Output sqlite DB path for persisted index artifacts (default: {settings.rag_db_path})",
     )
     return parser
 
@@ -45,11 +61,14 @@ def main() -> None:
     args = parser.parse_args()
 
     try:
+        collection = resolve_collection(args.collection)
         metrics = run_reindex_job(
-            source_dir=Path(args.source_dir),
-            db_path=Path(args.db_path),
+            source_dir=Path(args.source_dir) if args.source_dir else collection.source_dir,
+            db_path=Path(args.db_path) if args.db_path else collection.db_path,
             chunk_size=args.chunk_size,
             chunk_overlap=args.chunk_overlap,
+            chunk_strategy=args.chunk_strategy,
+            embed_model=collection.embed_model,
         )
     except Exception as exc:
         print(f"[rag-ingest] failed: {exc}", file=sys.stderr, flush=True)
@@ -59,6 +78,8 @@ def main() -> None:
         "[rag-ingest] completed "
         f"documents={metrics['documents']} "
         f"chunks={metrics['chunks']} "
+        f"embedded={metrics['embedded_chunks']} "
+        f"generation={metrics['generation']} "
         f"db_path={metrics['db_path']}",
         flush=True,
     )
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import InstrumentedAttribute, Session
+
+from api.models import JobEventRecord, JobRecord
+
+JOB_EVENTS = ("enqueued", "claimed", "succeeded", "requeued", "failed", "cancelled")
+# Events that end an attempt and carry its run_seconds.
+_ATTEMPT_END_EVENTS = ("succeeded", "requeued", "failed", "cancelled")
+_QUANTILES = {"p50": 0.5, "p95": 0.95}
+
+
+def _percentiles(
+    session: Session,
+    column: InstrumentedAttribute[float | None],
+    *,
+    events: tuple[str, ...],
+    since: datetime,
+) -> dict[str, dict[str, Any]]:
+    """Count and nearest-rank percentiles of `column` per job type, computed in SQL.
+
+    Rows come from ix_job_events_event_created_at; window functions rank them
+    per type so only one row per type is returned.
+    """
+    ranked = (
+        select(
+            JobEventRecord.type.label("type"),
+            column.label("seconds"),
+            func.row_number().over(partition_by=JobEventRecord.type, order_by=column).label("position"),
+            func.count().over(partition_by=JobEventRecord.type).label("total"),
+        )
+        .where(JobEventRecord.event.in_(events))
+        .where(JobEventRecord.created_at >= since)
+        .where(column.is_not(None))
+        .cte("ranked")
+    )
+    rows = session.execute(
+        select(
+            ranked.c.type,
+            func.max(ranked.c.total).label("count"),
+            *(
+                func.min(case((ranked.c.position >= quantile * ranked.c.total, ranked.c.seconds))).label(name)
+                for name, quantile in _QUANTILES.items()
+            ),
+        ).group_by(ranked.c.type)
+    ).mappings()
+    return {
+        str(row["type"]): {
+            "count": int(row["count"]),
+            **{name: round(float(row[name]), 3) for name in _QUANTILES},
+        }
+        for row in rows
+    }
+
+
+def job_stats(session: Session, *, since: datetime) -> dict[str, dict[str, Any]]:
+    """Per job type: current queue depth, event counts since `since`, and wait/run percentiles."""
+    depth_rows = session.execute(
+        select(JobRecord.type, JobRecord.status, func.count())
+        .where(JobRecord.status.in_(["queued", "running"]))
+        .group_by(JobRecord.type, JobRecord.status)
+    ).all()
+    event_rows = session.execute(
+        select(JobEventRecord.type, JobEventRecord.event, func.count())
+        .where(JobEventRecord.created_at >= since)
+        .group_by(JobEventRecord.type, JobEventRecord.event)
+    ).all()
+    wait = _percentiles(session, JobEventRecord.wait_seconds, events=("claimed",), since=since)
+    run = _percentiles(session, JobEventRecord.run_seconds, events=_ATTEMPT_END_EVENTS, since=since)
+
+    job_types = sorted({str(row[0]) for row in (*depth_rows, *event_rows)})
+    stats: dict[str, dict[str, Any]] = {
+        job_type: {
+            "queued": 0,
+            "running": 0,
+            "events": dict.fromkeys(JOB_EVENTS, 0),
+            "wait_seconds": wait.get(job_type, {"count": 0, "p50": None, "p95": None}),
+            "run_seconds": run.get(job_type, {"count": 0, "p50": None, "p95": None}),
+        }
+        for job_type in job_types
+    }
+    for job_type, status, count in depth_rows:
+        stats[str(job_type)][str(status)] = int(count)
+    for job_type, event, count in event_rows:
+        stats[str(job_type)]["events"][str(event)] = int(count)
+    return stats
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from time import perf_counter
 from typing import Protocol
 
 import httpx
 
+from api.metrics import LLM_REQUEST_SECONDS
+from api.tracing import http_client_span
+
 
 class LLMClientError(RuntimeError):
     pass
@@ -37,13 +41,17 @@ class OllamaChatClient:
 
     def generate_answer(self, *, question: str, context: str) -> ChatResult:
         for model, used_fallback in self._model_candidates():
+            role = "fallback" if used_fallback else "default"
+            start = perf_counter()
             try:
                 content = self._chat_completion(model=model, question=question, context=context)
             except (httpx.HTTPError, ValueError) as exc:
+                LLM_REQUEST_SECONDS.observe(perf_counter() - start, model=model, role=role, outcome="error")
                 if used_fallback:
                     raise LLMClientError(str(exc)) from exc
                 continue
 
+            LLM_REQUEST_SECONDS.observe(perf_counter() - start, model=model, role=role, outcome="ok")
             return ChatResult(answer=content, model=model, used_fallback=used_fallback)
 
         raise LLMClientError("No model candidates configured")
@@ -55,28 +63,31 @@ class OllamaChatClient:
         return candidates
 
     def _chat_completion(self, *, model: str, question: str, context: str) -> str:
-        response = httpx.post(
-            f"{self._base_url}/chat/completions",
-            json={
-                "model": model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": (
-                            "Answer using only the provided context when possible. "
-                            "If context is insufficient, say so briefly."
-                        ),
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Context:\n{context}\n\nQuestion: {question}",
-                    },
-                ],
-                "temperature": 0,
-            },
-            timeout=self._timeout_seconds,
-        )
-        response.raise_for_status()
+        url = f"{self._base_url}/chat/completions"
+        with http_client_span("POST", url, {"gen_ai.request.model": model}) as span:
+            response = httpx.post(
+                url,
+                json={
+                    "model": model,
+                    "messages": [
+                        {
+                            "role": "system",
+                            "content": (
+                                "Answer using only the provided context when possible. "
+                                "If context is insufficient, say so briefly."
+                            ),
+                        },
+                        {
+                            "role": "user",
+                            "content": f"Context:\n{context}\n\nQuestion: {question}",
+                        },
+                    ],
+                    "temperature": 0,
+                },
+                timeout=self._timeout_seconds,
+            )
+            span.set_attribute("http.response.status_code", response.status_code)
+            response.raise_for_status()
 
         payload = response.json()
         choices = payload.get("choices")
@@ -1,21 +1,36 @@
-from datetime import datetime, timezone
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
 import json
 import re
-from pathlib import Path
+import sys
+from time import perf_counter
 from typing import Annotated, Any, Literal
 
-from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, ConfigDict, Field
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from starlette.routing import Match
 
 from api.config import get_settings
 from api.db import get_engine
 from api.llm import LLMClient, LLMClientError, OllamaChatClient
-from api.models import JobRecord
+from api.metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, render_metrics
+from api.job_stats import job_stats
+from api.models import JobEventRecord, JobRecord
 from api.services.rag.embedding_client import EmbeddingClient, OllamaEmbeddingClient
-from api.services.rag import search_index
+from api.services.rag import SearchFilters, search_index
+from api.services.rag.collection import (
+    RagCollection,
+    UnknownCollectionError,
+    get_loaded_index_cache,
+    list_collections,
+    resolve_collection,
+)
+from api.services.rag.generations import current_generation
+from api.timings import StageTimings
+from api.tracing import current_span, start_span
 
 app = FastAPI(title="Industrial AI Harness API", version="0.1.0")
 
@@ -25,6 +40,7 @@ class AskRequest(BaseModel):
 
     question: str = Field(min_length=1)
     k: int = Field(default=3, ge=1, le=20)
+    collection: str | None = None
 
 
 class ReindexEnqueueRequest(BaseModel):
@@ -47,7 +63,10 @@ def _enqueue_job(
 ) -> JSONResponse:
     conflict_types = active_types or (job_type,)
 
-    with Session(get_engine()) as session:
+    with (
+        start_span(f"enqueue {job_type}", attributes={"job.type": job_type}) as span,
+        Session(get_engine()) as session,
+    ):
         existing = session.scalar(
             select(JobRecord)
             .where(JobRecord.type.in_(conflict_types))
@@ -64,6 +83,7 @@ def _enqueue_job(
                 },
             )
 
+        now = datetime.now(timezone.utc)
         job = JobRecord(
             id=_next_job_id(session),
             type=job_type,
@@ -71,12 +91,16 @@ def _enqueue_job(
             payload_json=payload_json,
             attempts=0,
             max_attempts=3,
-            updated_at=datetime.now(timezone.utc),
+            updated_at=now,
+            # The worker's job span continues this trace.
+            trace_parent=span.traceparent,
         )
         session.add(job)
+        session.add(JobEventRecord(job_id=job.id, type=job_type, event="enqueued", created_at=now))
         session.commit()
         job_id = job.id
         job_status = job.status
+        span.set_attribute("job.id", job_id)
 
     return JSONResponse(status_code=202, content={"job_id": job_id, "status": job_status})
 
@@ -86,6 +110,57 @@ def startup() -> None:
     get_engine()
 
 
+def _route_template(request: Request) -> str:
+    # Label by path template (/jobs/{job_id}), not the raw path, to bound cardinality.
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return str(getattr(route, "path", request.url.path))
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(
+    request: Request,
+    call_next: Callable[[Request], Awaitable[Response]],
+) -> Response:
+    route = _route_template(request)
+    status = "500"
+    start = perf_counter()
+    with HTTP_REQUESTS_IN_FLIGHT.track_inprogress(route=route):
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                perf_counter() - start,
+                method=request.method,
+                route=route,
+                status=status,
+            )
+
+
+@app.middleware("http")
+async def trace_requests(
+    request: Request,
+    call_next: Callable[[Request], Awaitable[Response]],
+) -> Response:
+    route = _route_template(request)
+    if route == "/metrics":
+        return await call_next(request)
+    with start_span(
+        f"{request.method} {route}",
+        parent=request.headers.get("traceparent"),
+        root=True,
+        kind="server",
+        attributes={"http.request.method": request.method, "http.route": route},
+    ) as span:
+        response = await call_next(request)
+        span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+
 def get_llm_client() -> LLMClient:
     settings = get_settings()
     return OllamaChatClient(
@@ -105,6 +180,38 @@ def get_embedding_client() -> EmbeddingClient:
     )
 
 
+def _resolve_collection_or_404(name: str | None) -> RagCollection:
+    try:
+        return resolve_collection(name)
+    except UnknownCollectionError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+def _collection_embedding_client(
+    collection: RagCollection,
+    default_client: EmbeddingClient,
+) -> EmbeddingClient:
+    # Queries must be embedded with the model that built the collection's index.
+    settings = get_settings()
+    if collection.embed_model == settings.ollama_embed_model:
+        return default_client
+    return OllamaEmbeddingClient(
+        base_url=settings.ollama_embed_base_url,
+        model=collection.embed_model,
+        timeout_seconds=settings.ollama_timeout_seconds,
+    )
+
+
+def _collection_payload(
+    payload_json: dict[str, Any] | None,
+    collection: str | None,
+) -> dict[str, Any] | None:
+    if collection is None:
+        return payload_json
+    _resolve_collection_or_404(collection)
+    return {**(payload_json or {}), "collection": collection}
+
+
 def _to_iso(value: datetime | None) -> str | None:
     if value is None:
         return None
@@ -119,30 +226,22 @@ def _job_summary(job: JobRecord) -> dict[str, Any]:
     }
 
 
-def _job_detail(job: JobRecord) -> dict[str, Any]:
-    payload_json = job.payload_json
-    if isinstance(payload_json, str):
+def _decode_json_column(value: Any) -> Any:
+    if isinstance(value, str):
         try:
-            parsed_payload = json.loads(payload_json)
+            parsed = json.loads(value)
         except json.JSONDecodeError:
-            parsed_payload = None
-        else:
-            payload_json = parsed_payload if isinstance(parsed_payload, dict) else None
+            return value
+        return parsed if isinstance(parsed, dict) else None
+    return value
 
-    result_json = job.result_json
-    if isinstance(result_json, str):
-        try:
-            parsed_result = json.loads(result_json)
-        except json.JSONDecodeError:
-            parsed_result = None
-        else:
-            result_json = parsed_result if isinstance(parsed_result, dict) else None
 
+def _job_detail(job: JobRecord) -> dict[str, Any]:
     return {
         "id": job.id,
         "type": job.type,
         "status": job.status,
-        "payload_json": payload_json,
+        "payload_json": _decode_json_column(job.payload_json),
         "attempts": job.attempts,
         "max_attempts": job.max_attempts,
         "created_at": _to_iso(job.created_at),
@@ -150,7 +249,11 @@ def _job_detail(job: JobRecord) -> dict[str, Any]:
         "started_at": _to_iso(job.started_at),
         "finished_at": _to_iso(job.finished_at),
         "error": job.error,
-        "result_json": result_json,
+        "result_json": _decode_json_column(job.result_json),
+        "progress_json": _decode_json_column(job.progress_json),
+        "cancel_requested": bool(job.cancel_requested),
+        "lease_expires_at": _to_iso(job.lease_expires_at),
+        "trace_parent": job.trace_parent,
     }
 
 
@@ -161,6 +264,29 @@ def _extract_numeric_suffix(value: str) -> int | None:
     return int(match.group(1))
 
 
+def _report_timings(response: Response, timings: StageTimings, *, route: str) -> dict[str, float]:
+    """Set the Server-Timing header and log the request if it exceeds API_SLOW_REQUEST_MS."""
+    timings_ms = timings.as_dict()
+    response.headers["Server-Timing"] = timings.server_timing()
+    threshold_ms = get_settings().slow_request_ms
+    if threshold_ms and timings_ms["total"] >= threshold_ms:
+        record: dict[str, Any] = {
+            "event": "slow_request",
+            "route": route,
+            "threshold_ms": threshold_ms,
+            "timings_ms": timings_ms,
+        }
+        span = current_span()
+        if span.recording:
+            record["trace_id"] = span.trace_id
+        print(
+            json.dumps(record),
+            file=sys.stderr,
+            flush=True,
+        )
+    return timings_ms
+
+
 def _next_job_id(session: Session) -> str:
     next_id = 1
     for existing_id in session.scalars(select(JobRecord.id)).all():
@@ -176,12 +302,21 @@ def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 @app.post("/rag/reindex")
 def enqueue_rag_reindex(
     request: ReindexEnqueueRequest | None = None,
     mode: Literal["full", "incremental"] = Query(default="full"),
+    collection: str | None = Query(default=None),
 ) -> JSONResponse:
-    payload_json = request.payload_json if request is not None else None
+    payload_json = _collection_payload(
+        request.payload_json if request is not None else None,
+        collection,
+    )
     job_type = _job_type_for_reindex_mode(mode)
     return _enqueue_job(job_type=job_type, payload_json=payload_json)
 
@@ -192,8 +327,31 @@ def enqueue_rag_warmup() -> JSONResponse:
 
 
 @app.post("/rag/verify")
-def enqueue_rag_verify_index() -> JSONResponse:
-    return _enqueue_job(job_type="rag_verify_index")
+def enqueue_rag_verify_index(collection: str | None = Query(default=None)) -> JSONResponse:
+    return _enqueue_job(
+        job_type="rag_verify_index",
+        payload_json=_collection_payload(None, collection),
+    )
+
+
+@app.get("/rag/collections")
+def rag_collections() -> list[dict[str, object]]:
+    loaded = set(get_loaded_index_cache().loaded_paths())
+    collections: list[dict[str, object]] = []
+    for collection in list_collections():
+        current = current_generation(collection.db_path)
+        collections.append(
+            {
+                "name": collection.name,
+                "source_dir": str(collection.source_dir),
+                "db_path": str(collection.db_path),
+                "embed_model": collection.embed_model,
+                "indexed": current is not None,
+                "generation": current.generation if current is not None else None,
+                "loaded": collection.db_path.absolute() in loaded,
+            }
+        )
+    return collections
 
 
 @app.get("/jobs")
@@ -215,6 +373,16 @@ def list_jobs(
     return [_job_summary(job) for job in jobs]
 
 
+@app.get("/jobs/stats")
+def get_job_stats(
+    window_seconds: int = Query(default=3600, ge=1, le=30 * 24 * 3600),
+) -> dict[str, Any]:
+    since = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+    with Session(get_engine()) as session:
+        types = job_stats(session, since=since)
+    return {"window_seconds": window_seconds, "since": since.isoformat(), "types": types}
+
+
 @app.get("/jobs/{job_id}")
 def get_job(job_id: str) -> dict[str, Any]:
     with Session(get_engine()) as session:
@@ -225,31 +393,100 @@ def get_job(job_id: str) -> dict[str, Any]:
     return _job_detail(job)
 
 
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str) -> JSONResponse:
+    now = datetime.now(timezone.utc)
+
+    with Session(get_engine()) as session:
+        # Queued jobs never reached a worker, so they can be cancelled outright.
+        cancelled = session.connection().execute(
+            update(JobRecord)
+            .where(JobRecord.id == job_id)
+            .where(JobRecord.status == "queued")
+            .values(
+                status="cancelled",
+                cancel_requested=True,
+                finished_at=now,
+                updated_at=now,
+            )
+        )
+        if cancelled.rowcount == 1:
+            job_type = session.scalar(select(JobRecord.type).where(JobRecord.id == job_id))
+            session.add(JobEventRecord(job_id=job_id, type=job_type, event="cancelled", created_at=now))
+            session.commit()
+            return JSONResponse(status_code=200, content={"job_id": job_id, "status": "cancelled"})
+
+        # Running jobs are stopped cooperatively: the worker observes the flag on
+        # its next lease renewal and the runner stops at the next batch boundary.
+        flagged = session.connection().execute(
+            update(JobRecord)
+            .where(JobRecord.id == job_id)
+            .where(JobRecord.status == "running")
+            .values(cancel_requested=True, updated_at=now)
+        )
+        if flagged.rowcount == 1:
+            session.commit()
+            return JSONResponse(
+                status_code=202,
+                content={"job_id": job_id, "status": "running", "cancel_requested": True},
+            )
+
+        job = session.get(JobRecord, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="job not found")
+        job_status = job.status
+
+    return JSONResponse(
+        status_code=409,
+        content={"detail": f"job already {job_status}", "job_id": job_id},
+    )
+
+
 @app.get("/rag/search")
 def rag_search(
     q: str,
+    response: Response,
     embedding_client: Annotated[EmbeddingClient, Depends(get_embedding_client)],
     k: int = 3,
+    mode: Literal["vector", "hybrid"] | None = Query(default=None),
+    prefilter: bool | None = Query(default=None),
+    source_prefix: str | None = Query(default=None),
+    source_glob: str | None = Query(default=None),
+    doc_id: list[str] | None = Query(default=None),
+    collection: str | None = Query(default=None),
+    collapse: bool | None = Query(default=None),
 ) -> list[dict[str, object]]:
     if not q.strip():
         raise HTTPException(status_code=400, detail="q must not be empty")
 
-    settings = get_settings()
+    timings = StageTimings()
+    rag_collection = _resolve_collection_or_404(collection)
     top_k = max(1, min(k, 20))
 
     try:
         hits = search_index(
-            index_dir=Path(settings.rag_index_dir),
-            db_path=Path(settings.rag_db_path),
+            index_dir=rag_collection.index_dir,
+            db_path=rag_collection.db_path,
             query_text=q,
             top_k=top_k,
-            embedding_client=embedding_client,
+            embedding_client=_collection_embedding_client(rag_collection, embedding_client),
+            mode=mode,
+            prefilter=prefilter,
+            filters=SearchFilters(
+                source_path_prefix=source_prefix or None,
+                source_path_glob=source_glob or None,
+                doc_ids=tuple(doc_id or ()),
+            ),
+            collapse_duplicates=collapse,
+            timings=timings,
         )
     except FileNotFoundError as exc:
         raise HTTPException(status_code=503, detail=str(exc)) from exc
     except ValueError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
+    # The body stays a plain hit list; stage timings travel in Server-Timing only.
+    _report_timings(response, timings, route="/rag/search")
     return [
         {
             "chunk_id": hit.chunk_id,
@@ -264,6 +501,7 @@ def rag_search(
 @app.post("/ask")
 def ask(
     request: AskRequest,
+    response: Response,
     llm_client: Annotated[LLMClient, Depends(get_llm_client)],
     embedding_client: Annotated[EmbeddingClient, Depends(get_embedding_client)],
 ) -> dict[str, Any]:
@@ -271,15 +509,18 @@ def ask(
     if not question:
         raise HTTPException(status_code=400, detail="question must not be empty")
 
+    timings = StageTimings()
     settings = get_settings()
+    rag_collection = _resolve_collection_or_404(request.collection)
 
     try:
         hits = search_index(
-            index_dir=Path(settings.rag_index_dir),
-            db_path=Path(settings.rag_db_path),
+            index_dir=rag_collection.index_dir,
+            db_path=rag_collection.db_path,
             query_text=question,
             top_k=request.k,
-            embedding_client=embedding_client,
+            embedding_client=_collection_embedding_client(rag_collection, embedding_client),
+            timings=timings,
         )
     except FileNotFoundError as exc:
         raise HTTPException(status_code=503, detail=str(exc)) from exc
@@ -292,7 +533,8 @@ def ask(
     ) or "No relevant context found in local retrieval index."
 
     try:
-        chat_result = llm_client.generate_answer(question=question, context=context)
+        with timings.stage("llm"):
+            chat_result = llm_client.generate_answer(question=question, context=context)
     except LLMClientError as exc:
         raise HTTPException(status_code=502, detail=f"LLM request failed: {exc}") from exc
 
@@ -312,8 +554,10 @@ def ask(
             "model": chat_result.model,
             "used_fallback": chat_result.used_fallback,
             "retrieval_k": request.k,
+            "collection": rag_collection.name,
             "retrieved_count": len(hits),
             "ollama_base_url": settings.ollama_base_url,
+            "timings_ms": _report_timings(response, timings, route="/ask"),
         },
     }
 
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import JSON, DateTime, Integer, String, Text, text
+from sqlalchemy import JSON, BigInteger, Boolean, DateTime, Float, Index, Integer, String, Text, false, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from api.db import Base
@@ -42,6 +42,54 @@ class JobRecord(Base):
     finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     error: Mapped[str | None] = mapped_column(Text, nullable=True)
     result_json: Mapped[dict[str, Any] | None] = mapped_column(JSON, nullable=True)
+    progress_json: Mapped[dict[str, Any] | None] = mapped_column(JSON, nullable=True)
+    cancel_requested: Mapped[bool] = mapped_column(
+        Boolean,
+        nullable=False,
+        server_default=false(),
+    )
+    lease_expires_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+    # Token of the claim holding the lease; the worker's renew/finish writes must match it.
+    lease_owner: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # W3C traceparent of the span that enqueued the job (NULL when tracing is off).
+    trace_parent: Mapped[str | None] = mapped_column(String(55), nullable=True)
+
+
+class JobEventRecord(Base):
+    """Append-only history of job state changes, kept apart from the latest-state `jobs` row.
+
+    `wait_seconds` is set on `claimed` (time spent claimable), `run_seconds` on
+    the events ending an attempt. There is no foreign key, so history outlives
+    deleted jobs.
+    """
+
+    __tablename__ = "job_events"
+    __table_args__ = (
+        Index("ix_job_events_event_created_at", "event", "created_at"),
+        # Covers the per-type/per-event counts over a window (index-only range scan).
+        Index("ix_job_events_created_at_type_event", "created_at", "type", "event"),
+        Index("ix_job_events_job_id", "job_id"),
+    )
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer(), "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    job_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    type: Mapped[str] = mapped_column(String(32), nullable=False)
+    # enqueued, claimed, succeeded, requeued, failed or cancelled.
+    event: Mapped[str] = mapped_column(String(16), nullable=False)
+    wait_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    run_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=text("CURRENT_TIMESTAMP"),
+    )
 
 
 class WorkerHeartbeatRecord(Base):
@@ -1,5 +1,5 @@
 from api.services.rag.ingest import ingest_documents
 from api.services.rag.query import search_index
-from api.services.rag.types import IngestionSummary, QueryHit
+from api.services.rag.types import IngestionSummary, QueryHit, SearchFilters
 
-__all__ = ["IngestionSummary", "QueryHit", "ingest_documents", "search_index"]
+__all__ = ["IngestionSummary", "QueryHit", "SearchFilters", "ingest_documents", "search_index"]
@@ -1,9 +1,34 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+import re
+import zlib
+
 from api.services.rag.types import ChunkRecord, SourceDocument
 
+# "fixed": character windows of chunk_size/chunk_overlap characters.
+# "structured": heading/paragraph/list/table blocks packed up to chunk_size
+# tokens (whitespace-separated words, like chunks.token_count).
+# "content": content-defined boundaries of at most chunk_size characters, so a
+# local edit only moves the boundaries around it.
+CHUNK_STRATEGIES = ("fixed", "structured", "content")
+HEADING_PATH_SEPARATOR = " > "
 
-def _chunk_text(text: str, *, chunk_size: int, chunk_overlap: int) -> list[str]:
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_TABLE_ROW = re.compile(r"^\s*\|")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?。])\s+")
+_WHITESPACE_RUN = re.compile(r"\s+")
+# A content-defined cut is decided by a hash of this many characters before it.
+_CDC_WINDOW_CHARS = 32
+# Rough characters between whitespace cut points; scales the hash divisor so
+# pieces average about halfway between the minimum and maximum length.
+_CDC_CUT_POINT_GAP = 6
+
+
+def _validate_chunk_params(chunk_size: int, chunk_overlap: int) -> None:
     if chunk_size <= 0:
         raise ValueError("chunk_size must be > 0")
     if chunk_overlap < 0:
@@ -11,6 +36,10 @@ def _chunk_text(text: str, *, chunk_size: int, chunk_overlap: int) -> list[str]:
     if chunk_overlap >= chunk_size:
         raise ValueError("chunk_overlap must be smaller than chunk_size")
 
+
+def _chunk_text(text: str, *, chunk_size: int, chunk_overlap: int) -> list[str]:
+    _validate_chunk_params(chunk_size, chunk_overlap)
+
     chunks: list[str] = []
     cursor = 0
     text_length = len(text)
@@ -28,28 +57,281 @@ def _chunk_text(text: str, *, chunk_size: int, chunk_overlap: int) -> list[str]:
     return chunks
 
 
+def _is_cdc_boundary(text: str, cut: int, divisor: int) -> bool:
+    window = text[max(0, cut - _CDC_WINDOW_CHARS) : cut]
+    return zlib.crc32(window.encode("utf-8")) % divisor == 0
+
+
+def _chunk_content_defined(text: str, *, chunk_size: int, chunk_overlap: int) -> list[str]:
+    """Chunks cut where a hash of the preceding characters hits, snapped to whitespace.
+
+    A cut depends only on the `_CDC_WINDOW_CHARS` before it, so inserting a
+    sentence changes the chunks around the edit and the following boundaries
+    fall where they were. Pieces are `chunk_size - chunk_overlap` characters at
+    most; without a hash hit in range they are cut at the last sentence end,
+    else the last whitespace. Each chunk repeats up to `chunk_overlap`
+    characters (whole words) from the end of the previous piece.
+    """
+    _validate_chunk_params(chunk_size, chunk_overlap)
+    max_length = chunk_size - chunk_overlap
+    min_length = max(1, max_length // 4)
+    divisor = max(1, (max_length - min_length) // 2 // _CDC_CUT_POINT_GAP)
+    # Cut points are word starts: (cut offset, cut follows a sentence end).
+    cut_points = [
+        (match.end(), match.start() > 0 and text[match.start() - 1] in ".!?。")
+        for match in _WHITESPACE_RUN.finditer(text)
+    ]
+
+    chunks: list[str] = []
+    start = 0
+    cursor = 0
+    while start < len(text):
+        end: int | None = None
+        last_cut: int | None = None
+        last_sentence_cut: int | None = None
+        while cursor < len(cut_points) and cut_points[cursor][0] - start <= max_length:
+            cut, after_sentence = cut_points[cursor]
+            cursor += 1
+            if cut - start < min_length:
+                continue
+            if _is_cdc_boundary(text, cut, divisor):
+                end = cut
+                break
+            last_cut = cut
+            if after_sentence:
+                last_sentence_cut = cut
+        if end is None:
+            if len(text) - start <= max_length:
+                end = len(text)
+            else:
+                end = last_sentence_cut or last_cut or start + max_length
+        while cursor < len(cut_points) and cut_points[cursor][0] <= end:
+            cursor += 1
+
+        chunk_start = start
+        if chunks and chunk_overlap:
+            chunk_start = max(0, start - chunk_overlap)
+            if chunk_start > 0 and not text[chunk_start - 1].isspace():
+                # Start the overlap at a whole word.
+                word_start = _WHITESPACE_RUN.search(text, chunk_start, start)
+                chunk_start = word_start.end() if word_start else start
+        chunk = text[chunk_start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+
+    return chunks
+
+
+@dataclass(frozen=True)
+class _Block:
+    text: str
+    kind: str  # "heading", "table" or "text"
+    heading_path: tuple[str, ...]
+
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def _split_blocks(text: str) -> list[_Block]:
+    """Split text into headings, paragraphs, list items, tables and code fences."""
+    blocks: list[_Block] = []
+    headings: list[tuple[int, str]] = []
+    lines: list[str] = []
+    kind = "text"
+    in_fence = False
+
+    def flush() -> None:
+        nonlocal lines, kind
+        block_text = "\n".join(lines).strip()
+        if block_text:
+            blocks.append(_Block(block_text, kind, tuple(title for _, title in headings)))
+        lines = []
+        kind = "text"
+
+    for line in text.splitlines():
+        if in_fence:
+            lines.append(line)
+            if _FENCE.match(line):
+                in_fence = False
+                flush()
+            continue
+        if _FENCE.match(line):
+            flush()
+            lines.append(line)
+            in_fence = True
+            continue
+        if not line.strip():
+            flush()
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            headings = [item for item in headings if item[0] < level] + [(level, heading.group(2))]
+            lines.append(line)
+            kind = "heading"
+            flush()
+            continue
+        is_table_row = _TABLE_ROW.match(line) is not None
+        if lines and (is_table_row != (kind == "table") or (not is_table_row and _LIST_ITEM.match(line))):
+            # A table starts or ends, or a new list item (procedure step) begins.
+            flush()
+        if is_table_row:
+            kind = "table"
+        lines.append(line)
+    flush()
+    return blocks
+
+
+def _pack(units: list[str], *, limit: int, joiner: str) -> list[str]:
+    """Greedily join consecutive units while they fit in `limit` tokens."""
+    packed: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for unit in units:
+        tokens = _count_tokens(unit)
+        if current and current_tokens + tokens > limit:
+            packed.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        packed.append(joiner.join(current))
+    return packed
+
+
+def _split_words(text: str, *, chunk_size: int, chunk_overlap: int) -> list[str]:
+    words = text.split()
+    step = chunk_size - chunk_overlap
+    return [
+        " ".join(words[start : start + chunk_size])
+        for start in range(0, max(1, len(words) - chunk_overlap), step)
+    ]
+
+
+def _split_oversized(block: _Block, *, chunk_size: int, chunk_overlap: int) -> list[str]:
+    """Pieces of a block that does not fit in one chunk, cut at the coarsest boundary."""
+    if block.kind == "table":
+        rows = block.text.splitlines()
+        header_length = 2 if len(rows) > 1 and _TABLE_SEPARATOR.match(rows[1]) else 1
+        header = "\n".join(rows[:header_length])
+        body_limit = chunk_size - _count_tokens(header)
+        if body_limit > 0 and all(_count_tokens(row) <= body_limit for row in rows[header_length:]):
+            # Every piece repeats the header so its columns stay interpretable.
+            return [
+                f"{header}\n{group}"
+                for group in _pack(rows[header_length:], limit=body_limit, joiner="\n")
+            ]
+
+    pieces: list[str] = []
+    for sentence_group in _pack(_SENTENCE_END.split(block.text), limit=chunk_size, joiner=" "):
+        if _count_tokens(sentence_group) <= chunk_size:
+            pieces.append(sentence_group)
+        else:
+            pieces.extend(_split_words(sentence_group, chunk_size=chunk_size, chunk_overlap=chunk_overlap))
+    return pieces
+
+
+def _chunk_structured(text: str, *, chunk_size: int, chunk_overlap: int) -> list[tuple[str, str | None]]:
+    """(chunk text, heading path) pairs; chunks never straddle a heading.
+
+    Blocks are packed up to `chunk_size` tokens. Consecutive chunks of the same
+    section repeat up to `chunk_overlap` tokens of whole trailing blocks.
+    """
+    _validate_chunk_params(chunk_size, chunk_overlap)
+
+    chunks: list[tuple[str, str | None]] = []
+    pieces: list[tuple[str, str, int]] = []  # (text, kind, tokens)
+    section: tuple[str, ...] = ()
+
+    def emit() -> None:
+        if pieces:
+            chunks.append(
+                (
+                    "\n\n".join(piece_text for piece_text, _, _ in pieces),
+                    HEADING_PATH_SEPARATOR.join(section) or None,
+                )
+            )
+
+    for block in _split_blocks(text):
+        if block.heading_path != section:
+            # A heading directly followed by a subheading travels with it
+            # instead of becoming a heading-only chunk.
+            if any(kind != "heading" for _, kind, _ in pieces):
+                emit()
+                pieces = []
+            section = block.heading_path
+
+        if _count_tokens(block.text) <= chunk_size:
+            block_pieces = [block.text]
+        else:
+            block_pieces = _split_oversized(block, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+        for piece_text in block_pieces:
+            tokens = _count_tokens(piece_text)
+            if pieces and sum(piece[2] for piece in pieces) + tokens > chunk_size:
+                emit()
+                carried: list[tuple[str, str, int]] = []
+                carried_tokens = 0
+                for piece in reversed(pieces):
+                    if carried_tokens + piece[2] > chunk_overlap:
+                        break
+                    carried.insert(0, piece)
+                    carried_tokens += piece[2]
+                pieces = carried if carried_tokens + tokens <= chunk_size else []
+            pieces.append((piece_text, block.kind, tokens))
+    emit()
+    return chunks
+
+
 def chunk_documents(
     documents: list[SourceDocument],
     *,
     chunk_size: int,
     chunk_overlap: int,
+    strategy: str = "fixed",
 ) -> list[ChunkRecord]:
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError(f"chunk strategy must be one of {', '.join(CHUNK_STRATEGIES)}, got {strategy!r}")
+
     chunk_records: list[ChunkRecord] = []
 
     for document in documents:
-        chunks = _chunk_text(
-            document.text,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-        )
+        if strategy == "structured":
+            chunks = _chunk_structured(
+                document.text,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+            )
+        elif strategy == "content":
+            chunks = [
+                (chunk_text, None)
+                for chunk_text in _chunk_content_defined(
+                    document.text,
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                )
+            ]
+        else:
+            chunks = [
+                (chunk_text, None)
+                for chunk_text in _chunk_text(
+                    document.text,
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                )
+            ]
 
-        for index, chunk_text in enumerate(chunks):
+        for index, (chunk_text, heading_path) in enumerate(chunks):
             chunk_records.append(
                 ChunkRecord(
                     chunk_id=f"{document.doc_id}-{index:04d}",
                     doc_id=document.doc_id,
                     source_path=document.source_path,
                     text=chunk_text,
+                    heading_path=heading_path,
                 )
             )
 
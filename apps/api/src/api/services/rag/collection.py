@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+import mmap
+from pathlib import Path
+import sqlite3
+from threading import Lock
+
+from api.config import Settings, get_settings
+from api.metrics import RAG_INDEX_CACHE_REQUESTS, RAG_INDEX_LOAD_SECONDS
+from api.services.rag.vector_sidecar import (
+    VectorSidecarInfo,
+    open_vector_sidecar,
+    read_vector_sidecar_info,
+)
+
+# The legacy single-index settings (RAG_SOURCE_DIR / RAG_INDEX_DIR / RAG_DB_PATH /
+# OLLAMA_EMBED_MODEL) are always available under this name.
+DEFAULT_COLLECTION = "default"
+
+
+class UnknownCollectionError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class RagCollection:
+    name: str
+    source_dir: Path
+    index_dir: Path
+    db_path: Path
+    embed_model: str
+
+
+def resolve_collection(name: str | None, settings: Settings | None = None) -> RagCollection:
+    """Resolve a collection name (None = default) from RAG_COLLECTIONS."""
+    settings = settings or get_settings()
+    if not name or name == DEFAULT_COLLECTION:
+        return RagCollection(
+            name=DEFAULT_COLLECTION,
+            source_dir=Path(settings.rag_source_dir),
+            index_dir=Path(settings.rag_index_dir),
+            db_path=Path(settings.rag_db_path),
+            embed_model=settings.ollama_embed_model,
+        )
+
+    options = settings.rag_collections.get(name)
+    if options is None:
+        raise UnknownCollectionError(f"unknown RAG collection: {name}")
+    index_dir = Path(options.get("index_dir", str(Path(settings.rag_index_dir) / "collections" / name)))
+    return RagCollection(
+        name=name,
+        source_dir=Path(options["source_dir"]),
+        index_dir=index_dir,
+        db_path=Path(options.get("db_path", str(index_dir / "rag.db"))),
+        embed_model=options.get("embed_model", settings.ollama_embed_model),
+    )
+
+
+def list_collections(settings: Settings | None = None) -> list[RagCollection]:
+    settings = settings or get_settings()
+    return [
+        resolve_collection(name, settings)
+        for name in [DEFAULT_COLLECTION, *sorted(settings.rag_collections)]
+    ]
+
+
+@dataclass(frozen=True)
+class LoadedIndex:
+    # Generation file the mapping belongs to.
+    db_path: Path
+    info: VectorSidecarInfo
+    mapped: mmap.mmap
+
+
+class LoadedIndexCache:
+    """Bounded LRU of mapped vector sidecars, keyed by the configured rag.db path.
+
+    Each entry is tied to the generation it was mapped from: a lookup for
+    another generation (after a publish or rollback) or with different sidecar
+    meta replaces the cached mapping. Evicted mappings are not closed here:
+    they close when the last search still holding one drops it.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, capacity)
+        self._entries: OrderedDict[Path, LoadedIndex] = OrderedDict()
+        self._lock = Lock()
+
+    def get(
+        self,
+        db_path: Path,
+        *,
+        index_path: Path | None = None,
+        connection: sqlite3.Connection | None = None,
+    ) -> LoadedIndex | None:
+        """Mapping for generation file `db_path` of the index at `index_path` (default `db_path`).
+
+        `connection` is the caller's open connection to `db_path`, if any.
+        """
+        info = read_vector_sidecar_info(db_path, connection=connection)
+        # Not resolve(): rag.db is a symlink to the current generation.
+        key = (index_path or db_path).absolute()
+        with self._lock:
+            cached = self._entries.get(key)
+            if info is not None and cached is not None and cached.db_path == db_path and cached.info == info:
+                self._entries.move_to_end(key)
+                RAG_INDEX_CACHE_REQUESTS.inc(result="hit")
+                return cached
+            self._entries.pop(key, None)
+
+        if info is None:
+            RAG_INDEX_CACHE_REQUESTS.inc(result="unavailable")
+            return None
+        RAG_INDEX_CACHE_REQUESTS.inc(result="miss")
+        with RAG_INDEX_LOAD_SECONDS.time():
+            mapped = open_vector_sidecar(db_path, info)
+        if mapped is None:
+            return None
+
+        loaded = LoadedIndex(db_path=db_path, info=info, mapped=mapped)
+        with self._lock:
+            self._entries[key] = loaded
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return loaded
+
+    def loaded_paths(self) -> list[Path]:
+        """Resident index paths (absolute), least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache
+def get_loaded_index_cache() -> LoadedIndexCache:
+    return LoadedIndexCache(get_settings().rag_collection_cache_size)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+import hashlib
+from itertools import repeat
+from operator import eq, xor
+import re
+
+from api.services.rag.embedding_client import EmbeddingClient, embed_texts_in_batches
+from api.services.rag.job_control import CancellationToken, ProgressReporter
+from api.services.rag.sqlite_store import compute_content_hash
+from api.services.rag.types import QueryHit
+
+# Near-duplicates are chunks whose word 3-shingle sets have an (estimated)
+# Jaccard similarity of at least NEAR_DUPLICATE_JACCARD: reflowed boilerplate, a
+# changed revision number. MinHash signatures use XOR masks over one 64-bit
+# shingle hash as the permutations; LSH banding (16 bands x 4 rows) makes pairs
+# above the threshold share a band bucket with probability > 0.999, so
+# candidates come from buckets instead of a pairwise scan.
+MINHASH_PERMUTATIONS = 64
+NEAR_DUPLICATE_JACCARD = 0.8
+_LSH_ROWS = 4
+_SHINGLE_SIZE = 3
+_MINHASH_MASKS = tuple(
+    int.from_bytes(hashlib.blake2b(f"minhash-{index}".encode("ascii"), digest_size=8).digest(), "big")
+    for index in range(MINHASH_PERMUTATIONS)
+)
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Extra candidates fetched per requested hit so collapsed duplicates do not
+# leave the result short.
+COLLAPSE_OVERFETCH = 3
+
+Signature = tuple[int, ...]
+
+
+def shingles(text: str) -> set[str]:
+    words = _WORD_PATTERN.findall(text.lower())
+    return {
+        " ".join(words[index : index + _SHINGLE_SIZE])
+        for index in range(max(1, len(words) - _SHINGLE_SIZE + 1))
+    }
+
+
+def jaccard(left: set[str], right: set[str]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+def minhash_signature(text: str) -> Signature:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles(text)
+    ]
+    return tuple(min(map(xor, hashes, repeat(mask, len(hashes)))) for mask in _MINHASH_MASKS)
+
+
+def estimated_jaccard(left: Signature, right: Signature) -> float:
+    return sum(map(eq, left, right)) / MINHASH_PERMUTATIONS
+
+
+class NearDuplicateIndex:
+    """MinHash LSH index: `add` reports whether a near-duplicate was already added."""
+
+    def __init__(self) -> None:
+        self._buckets: dict[tuple[int, ...], list[Signature]] = {}
+
+    @staticmethod
+    def _bands(signature: Signature) -> list[tuple[int, ...]]:
+        return [
+            (start, *signature[start : start + _LSH_ROWS])
+            for start in range(0, MINHASH_PERMUTATIONS, _LSH_ROWS)
+        ]
+
+    def find(self, signature: Signature) -> Signature | None:
+        for key in self._bands(signature):
+            for candidate in self._buckets.get(key, ()):
+                if estimated_jaccard(candidate, signature) >= NEAR_DUPLICATE_JACCARD:
+                    return candidate
+        return None
+
+    def add(self, signature: Signature) -> bool:
+        duplicate = self.find(signature) is not None
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, []).append(signature)
+        return duplicate
+
+
+def count_near_duplicates(texts: Iterable[str]) -> int:
+    """Texts that are near-duplicates of an earlier one (pass distinct texts only)."""
+    index = NearDuplicateIndex()
+    return sum(index.add(minhash_signature(text)) for text in texts)
+
+
+def embed_texts_deduplicated(
+    embedding_client: EmbeddingClient,
+    texts: list[str],
+    *,
+    batch_size: int,
+    known_embeddings: Callable[[list[str]], dict[str, list[float]]] | None = None,
+    cancel_token: CancellationToken | None = None,
+    progress: ProgressReporter | None = None,
+) -> tuple[list[list[float]], int]:
+    """Embed each distinct text once; returns vectors aligned with `texts` and the embed count.
+
+    `known_embeddings` maps text hashes to vectors that already exist (e.g. in
+    the index being built) so those texts are not sent to the model at all.
+    """
+    hashes = [compute_content_hash(text) for text in texts]
+    distinct: dict[str, str] = {}
+    for text_hash, text in zip(hashes, texts):
+        distinct.setdefault(text_hash, text)
+
+    vectors = known_embeddings(list(distinct)) if known_embeddings is not None else {}
+    pending = [text_hash for text_hash in distinct if text_hash not in vectors]
+    embedded = embed_texts_in_batches(
+        embedding_client,
+        [distinct[text_hash] for text_hash in pending],
+        batch_size=batch_size,
+        cancel_token=cancel_token,
+        progress=progress,
+    )
+    vectors.update(zip(pending, embedded))
+    if progress is not None and len(texts) > len(pending):
+        # Shared vectors count as processed chunks for the ETA.
+        progress.advance(chunks=len(texts) - len(pending))
+    return [vectors[text_hash] for text_hash in hashes], len(pending)
+
+
+def collapse_duplicate_hits(hits: list[QueryHit], *, limit: int) -> list[QueryHit]:
+    """Keep the best-ranked hit of each exact or near-duplicate group, up to `limit`.
+
+    A result list is small, so near-duplicates are checked with exact shingle
+    Jaccard against the hits kept so far rather than with MinHash estimates.
+    """
+    kept: list[QueryHit] = []
+    kept_texts: set[str] = set()
+    kept_shingles: list[set[str]] = []
+    for hit in hits:
+        if hit.text in kept_texts:
+            continue
+        hit_shingles = shingles(hit.text)
+        if any(jaccard(hit_shingles, other) >= NEAR_DUPLICATE_JACCARD for other in kept_shingles):
+            continue
+        kept_texts.add(hit.text)
+        kept_shingles.append(hit_shingles)
+        kept.append(hit)
+        if len(kept) >= limit:
+            break
+    return kept
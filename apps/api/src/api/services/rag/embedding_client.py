@@ -4,6 +4,9 @@ from typing import Protocol
 
 import httpx
 
+from api.services.rag.job_control import CancellationToken, ProgressReporter
+from api.tracing import http_client_span
+
 
 class EmbeddingClientError(RuntimeError):
     pass
@@ -13,6 +16,28 @@ class EmbeddingClient(Protocol):
     def embed_texts(self, texts: list[str]) -> list[list[float]]: ...
 
 
+def embed_texts_in_batches(
+    embedding_client: EmbeddingClient,
+    texts: list[str],
+    *,
+    batch_size: int,
+    cancel_token: CancellationToken | None = None,
+    progress: ProgressReporter | None = None,
+) -> list[list[float]]:
+    if batch_size <= 0:
+        raise ValueError("batch_size must be > 0")
+
+    vectors: list[list[float]] = []
+    for start in range(0, len(texts), batch_size):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled(f"embedding batch {start // batch_size}")
+        batch = texts[start : start + batch_size]
+        vectors.extend(embedding_client.embed_texts(batch))
+        if progress is not None:
+            progress.advance(chunks=len(batch))
+    return vectors
+
+
 class OllamaEmbeddingClient:
     def __init__(self, *, base_url: str, model: str, timeout_seconds: float = 30.0) -> None:
         self._base_url = base_url.rstrip("/")
@@ -23,13 +48,20 @@ class OllamaEmbeddingClient:
         if not texts:
             return []
 
+        url = f"{self._base_url}/embeddings"
         try:
-            response = httpx.post(
-                f"{self._base_url}/embeddings",
-                json={"model": self._model, "input": texts},
-                timeout=self._timeout_seconds,
-            )
-            response.raise_for_status()
+            with http_client_span(
+                "POST",
+                url,
+                {"gen_ai.request.model": self._model, "rag.embed.texts": len(texts)},
+            ) as span:
+                response = httpx.post(
+                    url,
+                    json={"model": self._model, "input": texts},
+                    timeout=self._timeout_seconds,
+                )
+                span.set_attribute("http.response.status_code", response.status_code)
+                response.raise_for_status()
         except httpx.HTTPError as exc:
             raise EmbeddingClientError(str(exc)) from exc
 
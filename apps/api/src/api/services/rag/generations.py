@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+import fcntl
+import os
+from pathlib import Path
+import shutil
+from time import sleep
+
+from api.services.rag.job_control import CancellationToken
+from api.services.rag.sqlite_store import checkpoint_wal, leave_wal_mode
+from api.services.rag.vector_sidecar import move_vector_sidecar, vector_sidecar_path
+
+# An index configured at rag.db is stored as immutable generations,
+# rag.db.generations/<id>/rag.db, each next to its own vector sidecar. rag.db
+# itself is a relative symlink to the current generation. Publishing or rolling
+# back swaps that symlink with a single rename. A reader that resolves it once
+# per request therefore sees the old or the new generation, never a mix.
+# Writers build the next generation in a private file and never modify a
+# published one. Writers of one index (full/incremental/path reindex, rag-ingest,
+# rag-watch, rollback and gc) serialize on rag.db.lock: they share the staging
+# and working-copy files and pick the next generation id.
+_GENERATION_ID_WIDTH = 6
+# Linux FICLONE ioctl (fcntl.FICLONE from Python 3.12): share the extents of
+# another file, copy-on-write.
+_FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+# Id given to a plain pre-generations rag.db when the first generation is
+# published over it, so it stays available for rollback.
+ADOPTED_GENERATION = 0
+
+
+@dataclass(frozen=True)
+class IndexGeneration:
+    index_path: Path
+    db_path: Path
+    # None for a plain rag.db file that has not been adopted yet.
+    generation: int | None
+
+
+def generations_dir(index_path: Path) -> Path:
+    return index_path.with_name(f"{index_path.name}.generations")
+
+
+def generation_db_path(index_path: Path, generation: int) -> Path:
+    return generations_dir(index_path) / f"{generation:0{_GENERATION_ID_WIDTH}d}" / index_path.name
+
+
+def index_lock_path(index_path: Path) -> Path:
+    return index_path.with_name(f"{index_path.name}.lock")
+
+
+@contextmanager
+def index_writer_lock(
+    index_path: Path,
+    *,
+    cancel_token: CancellationToken | None = None,
+    poll_seconds: float = 0.5,
+) -> Iterator[None]:
+    """Hold the exclusive writer lock of `index_path`, waiting for other writers.
+
+    An flock is released by the kernel when its process exits, so a killed
+    runner never leaves a stale lock. While waiting, `cancel_token` is checked
+    every `poll_seconds`, so a cancelled job does not block on a long reindex.
+    """
+    lock_path = index_lock_path(index_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled("waiting for the index writer lock")
+                sleep(poll_seconds)
+        yield
+    finally:
+        # Closing the descriptor releases the lock.
+        os.close(fd)
+
+
+def clone_file(source: Path, target: Path) -> None:
+    """Copy `source` to `target` as a reflink where the filesystem supports it.
+
+    On btrfs, XFS (reflink=1) and similar filesystems the copy shares the
+    source's blocks and takes time independent of the file size; only blocks
+    later written to `target` are duplicated. Elsewhere it is a byte copy.
+    """
+    with source.open("rb") as source_file, target.open("wb") as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+def current_generation(index_path: Path) -> IndexGeneration | None:
+    """The generation `index_path` points at, or None if there is no index yet.
+
+    Resolve once per request and read only through the returned `db_path`:
+    a publish that happens meanwhile does not affect it.
+    """
+    if index_path.is_symlink():
+        target = Path(os.readlink(index_path))
+        db_path = target if target.is_absolute() else index_path.parent / target
+        if not db_path.exists():
+            return None
+        name = db_path.parent.name
+        return IndexGeneration(index_path, db_path, int(name) if name.isdigit() else None)
+    if index_path.exists():
+        return IndexGeneration(index_path, index_path, None)
+    return None
+
+
+def resolve_index_db_path(index_path: Path) -> Path:
+    """File holding the current generation; `index_path` itself when there is none."""
+    current = current_generation(index_path)
+    return current.db_path if current is not None else index_path
+
+
+def _generation_ids(index_path: Path) -> list[int]:
+    directory = generations_dir(index_path)
+    if not directory.is_dir():
+        return []
+    return sorted(int(entry.name) for entry in directory.iterdir() if entry.name.isdigit())
+
+
+def list_generations(index_path: Path) -> list[int]:
+    """Published generation ids, oldest first."""
+    return [
+        generation
+        for generation in _generation_ids(index_path)
+        if generation_db_path(index_path, generation).exists()
+    ]
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _point_to(index_path: Path, generation: int) -> None:
+    target = generation_db_path(index_path, generation).relative_to(index_path.parent)
+    pointer_tmp = index_path.with_name(f"{index_path.name}.pointer-{os.getpid()}")
+    pointer_tmp.unlink(missing_ok=True)
+    os.symlink(target, pointer_tmp)
+    os.replace(pointer_tmp, index_path)
+    _fsync_dir(index_path.parent)
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _adopt_plain_index(index_path: Path) -> None:
+    """Keep a plain rag.db (and its sidecar) as generation ADOPTED_GENERATION."""
+    target = generation_db_path(index_path, ADOPTED_GENERATION)
+    if target.exists():
+        return
+    checkpoint_wal(index_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    _link_or_copy(index_path, target)
+    sidecar = vector_sidecar_path(index_path)
+    if sidecar.exists():
+        _link_or_copy(sidecar, vector_sidecar_path(target))
+
+
+def publish_generation(index_path: Path, staged_db_path: Path) -> IndexGeneration:
+    """Move a fully built database and its sidecar into a new generation and switch to it.
+
+    Callers hold `index_writer_lock(index_path)`.
+    """
+    leave_wal_mode(staged_db_path)
+    current = current_generation(index_path)
+    # Sidecar path taken now: once rag.db is a symlink it resolves into the generation.
+    legacy_sidecar: Path | None = None
+    if current is not None and current.generation is None and not index_path.is_symlink():
+        _adopt_plain_index(index_path)
+        legacy_sidecar = vector_sidecar_path(index_path)
+
+    generation = max(_generation_ids(index_path), default=ADOPTED_GENERATION) + 1
+    target = generation_db_path(index_path, generation)
+    target.parent.mkdir(parents=True)
+    os.replace(staged_db_path, target)
+    move_vector_sidecar(staged_db_path, target)
+    _fsync_dir(target.parent)
+    _point_to(index_path, generation)
+
+    if legacy_sidecar is not None:
+        # The plain file's side files now belong to nothing: rag.db resolves
+        # to the generation directory.
+        for suffix in ("-wal", "-shm", "-journal"):
+            index_path.with_name(index_path.name + suffix).unlink(missing_ok=True)
+        legacy_sidecar.unlink(missing_ok=True)
+    return IndexGeneration(index_path, target, generation)
+
+
+def rollback_generation(index_path: Path, generation: int | None = None) -> IndexGeneration:
+    """Point the index at `generation`, by default the newest one older than the current."""
+    available = list_generations(index_path)
+    if generation is None:
+        current = current_generation(index_path)
+        if current is None or current.generation is None:
+            raise ValueError(f"{index_path} has no generations to roll back")
+        older = [candidate for candidate in available if candidate < current.generation]
+        if not older:
+            raise ValueError(f"no generation older than {current.generation} is retained for {index_path}")
+        generation = older[-1]
+    elif generation not in available:
+        raise ValueError(f"generation {generation} not found for {index_path} (available: {available})")
+
+    _point_to(index_path, generation)
+    return IndexGeneration(index_path, generation_db_path(index_path, generation), generation)
+
+
+def collect_generations(index_path: Path, *, keep: int) -> list[int]:
+    """Delete all but the newest `keep` generations, never the current one; returns removed ids.
+
+    A search opens one connection to its generation for the whole request
+    (search_index), and an open file or mapped sidecar stays readable after
+    its directory is removed, so a request that started on a removed
+    generation still finishes on it. Anything that reopens a generation by
+    path after resolving it has no such guarantee.
+    """
+    available = list_generations(index_path)
+    retained = set(available[-keep:]) if keep > 0 else set()
+    current = current_generation(index_path)
+    if current is not None and current.generation is not None:
+        retained.add(current.generation)
+
+    removed = [generation for generation in available if generation not in retained]
+    for generation in removed:
+        shutil.rmtree(generation_db_path(index_path, generation).parent)
+    return removed
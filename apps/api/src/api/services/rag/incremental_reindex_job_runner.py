@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+from dataclasses import dataclass, replace
 import json
 from pathlib import Path
 import sqlite3
@@ -9,35 +10,86 @@ from time import perf_counter
 from typing import TypedDict
 
 from api.config import get_settings
-from api.services.rag.chunker import chunk_documents
+from api.services.rag.chunker import CHUNK_STRATEGIES
+from api.services.rag.collection import resolve_collection
+from api.services.rag.dedup import embed_texts_deduplicated
 from api.services.rag.embedding_client import EmbeddingClient, OllamaEmbeddingClient
-from api.services.rag.loader import load_documents
+from api.services.rag.generations import (
+    IndexGeneration,
+    clone_file,
+    collect_generations,
+    current_generation,
+    index_writer_lock,
+    publish_generation,
+)
+from api.services.rag.job_control import (
+    CANCELLED_EXIT_CODE,
+    CancellationToken,
+    JobCancelledError,
+    ProgressReporter,
+    install_sigterm_cancellation,
+)
+from api.services.rag.loader import (
+    SourceFile,
+    hash_source_file,
+    scan_source_files,
+    stable_mtime_ns,
+    stat_source_file,
+)
+from api.services.rag.prepare import PreparedDocument, prepare_documents, resolve_ingest_workers
 from api.services.rag.sqlite_store import (
     StoredDocument,
-    compute_content_hash,
+    connect_sqlite,
     delete_document_and_chunks,
+    delete_index_meta,
     ensure_sqlite_schema,
+    get_documents_for_source_paths,
     get_documents_map_by_source_path,
-    replace_chunks_for_doc,
+    get_index_meta,
+    load_embeddings_by_text_hash,
+    remove_sqlite_files,
+    set_index_meta,
     sqlite_index_stats,
+    update_chunks_for_doc,
+    update_document_stats,
     upsert_document,
 )
-from api.services.rag.types import SourceDocument
+from api.services.rag.vector_sidecar import (
+    SIDECAR_DISABLED,
+    ensure_vector_sidecar,
+    patch_vector_sidecar,
+    read_vector_sidecar_info,
+    release_vector_rows,
+    vector_sidecar_path,
+)
+from api.tracing import runner_span
+
+# index_meta key naming the generation a working copy was copied from; a
+# working copy is only resumed while that generation is still current.
+WORKING_BASE_META = "working_base"
 
 
 class IncrementalReindexResult(TypedDict):
     mode: str
     scanned_files: int
+    hashed_files: int
     unchanged: int
     new: int
     updated: int
     removed: int
     documents_total_after: int
     chunks_total_after: int
+    embedded_chunks: int
+    reused_chunks: int
+    chunk_reuse_ratio: float | None
+    written_chunks: int
     duration_ms: int
     embed_model: str
+    chunk_strategy: str
     max_embedding_dim: int
     db_path: str
+    generation: int | None
+    vector_sidecar: str
 
 
 def _build_parser() -> argparse.ArgumentParser:
@@ -48,7 +100,12 @@ def _build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--payload-json",
         default=None,
-        help="Optional JSON object payload with runtime overrides (source_dir/chunk_size/chunk_overlap/db_path)",
+        help="Optional JSON object payload with runtime overrides (collection/source_dir/chunk_size/chunk_overlap/chunk_strategy/db_path/embed_batch_size)",
+    )
+    parser.add_argument(
+        "--job-id",
+        default=None,
+        help="Queue job id (incremental runs resume from per-document checkpoints regardless)",
     )
     return parser
 
@@ -73,165 +130,486 @@ def _payload_int(payload: dict[str, object], key: str, default: int) -> int:
     raise ValueError(f"{key} must be an integer")
 
 
-def _load_documents_allow_empty(source_dir: Path) -> list[SourceDocument]:
-    try:
-        return load_documents(source_dir)
-    except ValueError as exc:
-        if "No non-empty supported documents found" in str(exc):
-            return []
-        raise
+@dataclass(frozen=True)
+class _SourceScan:
+    unchanged: list[SourceFile]
+    new: list[SourceFile]
+    updated: list[tuple[StoredDocument, SourceFile]]
+    removed: list[StoredDocument]
+    # (doc_id, file_size, file_mtime_ns) of unchanged files whose stat moved.
+    restat: list[tuple[str, int, int | None]]
+    hashed_files: int
 
 
-def _classify_documents(
-    scanned_docs: list[SourceDocument],
-    stored_docs_by_path: dict[str, StoredDocument],
-) -> tuple[list[SourceDocument], list[SourceDocument], list[tuple[StoredDocument, SourceDocument]], list[StoredDocument]]:
-    scanned_by_path = {document.source_path: document for document in scanned_docs}
+def _stat_matches(stored_doc: StoredDocument, source_file: SourceFile) -> bool:
+    return stored_doc.file_size == source_file.size and stored_doc.file_mtime_ns == source_file.mtime_ns
 
-    unchanged_docs: list[SourceDocument] = []
-    new_docs: list[SourceDocument] = []
-    updated_docs: list[tuple[StoredDocument, SourceDocument]] = []
 
-    for source_path, scanned_doc in scanned_by_path.items():
-        existing = stored_docs_by_path.get(source_path)
-        scanned_hash = compute_content_hash(scanned_doc.text)
-        if existing is None:
-            new_docs.append(scanned_doc)
-            continue
-        if existing.content_hash == scanned_hash:
-            unchanged_docs.append(scanned_doc)
+def _classify_source_files(
+    source_files: list[SourceFile],
+    stored_docs_by_path: dict[str, StoredDocument],
+) -> _SourceScan:
+    """Compare scanned files with stored documents, reading only files whose stat changed.
+
+    A file with the stored size and mtime is unchanged without being opened.
+    Any other file is hashed block by block; files that are empty after
+    stripping are treated as absent, as `load_documents` skips them.
+    """
+    unchanged: list[SourceFile] = []
+    new: list[SourceFile] = []
+    updated: list[tuple[StoredDocument, SourceFile]] = []
+    restat: list[tuple[str, int, int | None]] = []
+    present_paths: set[str] = set()
+    hashed_files = 0
+
+    for source_file in source_files:
+        existing = stored_docs_by_path.get(source_file.source_path)
+        if existing is not None and _stat_matches(existing, source_file):
+            present_paths.add(source_file.source_path)
+            unchanged.append(source_file)
             continue
-        updated_docs.append((existing, scanned_doc))
 
-    removed_docs = [
+        hashed_files += 1
+        content_hash = hash_source_file(source_file)
+        if content_hash is None:
+            continue
+        present_paths.add(source_file.source_path)
+        if existing is None:
+            new.append(source_file)
+        elif existing.content_hash == content_hash:
+            unchanged.append(source_file)
+            mtime_ns = stable_mtime_ns(source_file)
+            # A file still too recent to trust keeps mtime None; rewriting the
+            # same stat would only make a no-op run publish a generation.
+            if (existing.file_size, existing.file_mtime_ns) != (source_file.size, mtime_ns):
+                restat.append((existing.doc_id, source_file.size, mtime_ns))
+        else:
+            updated.append((existing, source_file))
+
+    removed = [
         stored_doc
         for source_path, stored_doc in stored_docs_by_path.items()
-        if source_path not in scanned_by_path
+        if source_path not in present_paths
     ]
-
-    return unchanged_docs, new_docs, updated_docs, removed_docs
+    return _SourceScan(
+        unchanged=unchanged,
+        new=new,
+        updated=updated,
+        removed=removed,
+        restat=restat,
+        hashed_files=hashed_files,
+    )
 
 
-def _upsert_and_replace_doc(
+def _upsert_and_update_doc(
     connection: sqlite3.Connection,
     *,
-    doc_id: str,
-    source_document: SourceDocument,
-    chunk_size: int,
-    chunk_overlap: int,
-    embedding_client: EmbeddingClient,
-) -> None:
-    normalized_document = SourceDocument(
-        doc_id=doc_id,
-        source_path=source_document.source_path,
-        text=source_document.text,
-    )
-    chunks = chunk_documents([normalized_document], chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    embeddings = embedding_client.embed_texts([chunk.text for chunk in chunks]) if chunks else []
-
+    prepared: PreparedDocument,
+    embeddings: list[list[float]],
+) -> int:
+    document = prepared.document
     upsert_document(
         connection,
-        doc_id=doc_id,
-        source_path=normalized_document.source_path,
-        content_hash=compute_content_hash(normalized_document.text),
+        doc_id=document.doc_id,
+        source_path=document.source_path,
+        content_hash=prepared.content_hash,
+        file_size=document.file_size,
+        file_mtime_ns=document.file_mtime_ns,
     )
-    replace_chunks_for_doc(
+    return update_chunks_for_doc(
         connection,
-        doc_id=doc_id,
-        chunks=chunks,
+        doc_id=document.doc_id,
+        chunks=prepared.chunks,
         embeddings=embeddings,
     )
 
 
-def run_incremental_reindex_job(
+def _stat_changed_paths(
+    connection: sqlite3.Connection,
+    source_dir: Path,
+    changed_paths: set[str],
+) -> tuple[list[SourceFile], dict[str, StoredDocument]]:
+    """Source files and stored documents for `changed_paths` only.
+
+    A changed directory stands for its whole subtree; a path that no longer
+    exists may have been a file or a directory, so both are looked up.
+    """
+    source_files: dict[str, SourceFile] = {}
+    file_paths: list[str] = []
+    prefixes: list[str] = []
+    for changed_path in sorted(path.strip("/") for path in changed_paths):
+        if not changed_path:
+            continue
+        target = source_dir / changed_path
+        if target.is_dir():
+            prefixes.append(f"{changed_path}/")
+            for source_file in scan_source_files(target, relative_to=source_dir):
+                source_files[source_file.source_path] = source_file
+            continue
+        file_paths.append(changed_path)
+        source_file = stat_source_file(source_dir, changed_path)
+        if source_file is not None:
+            source_files[source_file.source_path] = source_file
+        elif not target.exists():
+            prefixes.append(f"{changed_path}/")
+
+    stored_docs = get_documents_for_source_paths(
+        connection,
+        source_paths=file_paths,
+        source_prefixes=prefixes,
+    )
+    return sorted(source_files.values(), key=lambda item: item.path), stored_docs
+
+
+def _working_db_path(db_path: Path) -> Path:
+    return db_path.with_name(f"{db_path.name}.next")
+
+
+def _generation_key(current: IndexGeneration | None) -> str:
+    if current is None:
+        return "empty"
+    return "plain" if current.generation is None else str(current.generation)
+
+
+def _discard_working_copy(working_db_path: Path) -> None:
+    remove_sqlite_files(working_db_path)
+    vector_sidecar_path(working_db_path).unlink(missing_ok=True)
+
+
+def _resumable_working_copy(db_path: Path, current: IndexGeneration | None) -> Path | None:
+    """The working copy left by an interrupted run on top of `current`, if any.
+
+    A working copy based on another generation (a full reindex or rollback
+    happened since) is discarded.
+    """
+    working_db_path = _working_db_path(db_path)
+    if not working_db_path.exists():
+        return None
+    try:
+        with connect_sqlite(working_db_path) as connection:
+            base = get_index_meta(connection, WORKING_BASE_META)
+    except sqlite3.DatabaseError:
+        base = None
+    if base == _generation_key(current):
+        return working_db_path
+    _discard_working_copy(working_db_path)
+    return None
+
+
+def _create_working_copy(db_path: Path, current: IndexGeneration | None) -> Path:
+    """Copy the current generation (and its sidecar) into a private, writable file.
+
+    A published generation is left in rollback-journal mode and never written,
+    so its file is cloned as is (a reflink where the filesystem supports one).
+    A plain pre-generations rag.db may still have a WAL and goes through the
+    SQLite backup API.
+    """
+    working_db_path = _working_db_path(db_path)
+    _discard_working_copy(working_db_path)
+    if current is not None and current.generation is not None:
+        clone_file(current.db_path, working_db_path)
+    elif current is not None:
+        with connect_sqlite(current.db_path) as source, connect_sqlite(working_db_path) as target:
+            source.backup(target)
+    if current is not None:
+        sidecar = vector_sidecar_path(current.db_path)
+        if sidecar.exists():
+            clone_file(sidecar, vector_sidecar_path(working_db_path))
+    with connect_sqlite(working_db_path) as target:
+        ensure_sqlite_schema(target)
+        set_index_meta(target, WORKING_BASE_META, _generation_key(current))
+    return working_db_path
+
+
+def _run_reindex(
     *,
     source_dir: Path,
     db_path: Path,
+    changed_paths: set[str] | None,
     chunk_size: int,
     chunk_overlap: int,
+    chunk_strategy: str | None,
     embedding_client: EmbeddingClient,
     embed_model: str,
+    embed_batch_size: int | None,
+    ingest_workers: int | None,
+    cancel_token: CancellationToken | None,
+    progress: ProgressReporter | None,
 ) -> IncrementalReindexResult:
     if chunk_overlap >= chunk_size:
         raise ValueError("chunk_overlap must be smaller than chunk_size")
 
+    settings = get_settings()
+    resolved_batch_size = embed_batch_size or settings.rag_embed_batch_size
+    resolved_chunk_strategy = chunk_strategy or settings.rag_chunk_strategy
+
     start = perf_counter()
-    scanned_docs = _load_documents_allow_empty(source_dir)
+    if changed_paths is None:
+        source_files = scan_source_files(source_dir)
 
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(db_path) as connection:
-        ensure_sqlite_schema(connection)
-        connection.execute("PRAGMA foreign_keys = ON")
-
-        stored_docs_by_path = get_documents_map_by_source_path(connection)
-        unchanged_docs, new_docs, updated_docs, removed_docs = _classify_documents(
-            scanned_docs,
-            stored_docs_by_path,
-        )
-
-        try:
-            connection.execute("BEGIN")
-            for removed_doc in removed_docs:
-                delete_document_and_chunks(connection, removed_doc.doc_id)
-
-            for new_doc in new_docs:
-                _upsert_and_replace_doc(
-                    connection,
-                    doc_id=new_doc.doc_id,
-                    source_document=new_doc,
-                    chunk_size=chunk_size,
-                    chunk_overlap=chunk_overlap,
-                    embedding_client=embedding_client,
+    current = current_generation(db_path)
+    # Published generations are immutable; changes go to a working copy that
+    # is published as the next generation. A plain pre-generations rag.db is
+    # not written in place either: its first run publishes it as a generation.
+    published_db_path = current.db_path if current is not None and current.generation is not None else None
+    working_db_path = _resumable_working_copy(db_path, current)
+    if working_db_path is None and published_db_path is None:
+        working_db_path = _create_working_copy(db_path, current)
+
+    # Without a working copy the scan reads the published generation
+    # directly, so a run that finds nothing to do copies nothing.
+    scan_db_path = working_db_path or published_db_path or db_path
+    with connect_sqlite(scan_db_path) as connection:
+        if changed_paths is None:
+            stored_docs_by_path = get_documents_map_by_source_path(connection)
+        else:
+            source_files, stored_docs_by_path = _stat_changed_paths(connection, source_dir, changed_paths)
+    scan = _classify_source_files(source_files, stored_docs_by_path)
+
+    generation = current.generation if current is not None else None
+    if working_db_path is None and (scan.removed or scan.new or scan.updated or scan.restat):
+        working_db_path = _create_working_copy(db_path, current)
+
+    embedded_chunks = 0
+    reused_chunks = 0
+    written_chunks = 0
+    if working_db_path is None:
+        with connect_sqlite(scan_db_path) as connection:
+            documents_total_after, chunks_total_after, max_embedding_dim = sqlite_index_stats(connection)
+        sidecar = read_vector_sidecar_info(scan_db_path)
+    else:
+        # Updated documents keep their stored id, so their chunk ids are stable.
+        pending_files = scan.new + [
+            replace(updated_file, doc_id=existing_doc.doc_id) for existing_doc, updated_file in scan.updated
+        ]
+        touched_doc_ids = [removed_doc.doc_id for removed_doc in scan.removed] + [
+            pending_file.doc_id for pending_file in pending_files
+        ]
+        # The copied sidecar is patched for the touched documents at the end.
+        # A working copy resumed after an earlier run wrote chunks has lost its
+        # sidecar metadata and rebuilds it instead.
+        base_sidecar = read_vector_sidecar_info(working_db_path)
+        if base_sidecar is not None and base_sidecar.dtype != settings.rag_vector_sidecar:
+            base_sidecar = None
+        released_rows: dict[bytes, int] = {}
+        with connect_sqlite(working_db_path) as connection:
+            ensure_sqlite_schema(connection)
+            connection.execute("PRAGMA foreign_keys = ON")
+
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                if base_sidecar is not None and touched_doc_ids:
+                    released_rows = release_vector_rows(connection, touched_doc_ids)
+                for removed_doc in scan.removed:
+                    delete_document_and_chunks(connection, removed_doc.doc_id)
+                update_document_stats(connection, scan.restat)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+            if progress is not None:
+                progress.start(phase="embedding", docs_total=len(pending_files))
+
+            # Each document is its own checkpoint in the working copy: once
+            # committed, its content_hash matches the source file, so a retry
+            # resumes the working copy, classifies it as unchanged and continues
+            # with the remaining documents. Embedding happens before the write
+            # transaction, so the write lock is only held while rows are
+            # written, never across embedding requests. Chunk texts already in
+            # the index (e.g. the untouched paragraphs of an edited document)
+            # reuse their stored vectors, and only chunk rows that differ are
+            # written.
+            for prepared in prepare_documents(
+                pending_files,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                chunk_strategy=resolved_chunk_strategy,
+                workers=resolve_ingest_workers(
+                    ingest_workers if ingest_workers is not None else settings.rag_ingest_workers
+                ),
+            ):
+                if prepared is None:
+                    # Emptied after the scan; its stat no longer matches, so the
+                    # next run removes it.
+                    continue
+                embeddings, document_embedded = embed_texts_deduplicated(
+                    embedding_client,
+                    [chunk.text for chunk in prepared.chunks],
+                    batch_size=resolved_batch_size,
+                    known_embeddings=lambda text_hashes: load_embeddings_by_text_hash(connection, text_hashes),
+                    cancel_token=cancel_token,
+                    progress=progress,
                 )
-
-            for existing_doc, updated_doc in updated_docs:
-                _upsert_and_replace_doc(
-                    connection,
-                    doc_id=existing_doc.doc_id,
-                    source_document=updated_doc,
-                    chunk_size=chunk_size,
-                    chunk_overlap=chunk_overlap,
-                    embedding_client=embedding_client,
-                )
-            connection.commit()
-        except Exception:
-            connection.rollback()
-            raise
-
-        documents_total_after, chunks_total_after, max_embedding_dim = sqlite_index_stats(connection)
+                embedded_chunks += document_embedded
+                reused_chunks += len(prepared.chunks) - document_embedded
+                try:
+                    connection.execute("BEGIN IMMEDIATE")
+                    written_chunks += _upsert_and_update_doc(
+                        connection,
+                        prepared=prepared,
+                        embeddings=embeddings,
+                    )
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                if progress is not None:
+                    progress.advance(docs=1)
+
+            documents_total_after, chunks_total_after, max_embedding_dim = sqlite_index_stats(connection)
+
+        # Chunk writes above invalidated the copied sidecar; it is patched (or
+        # rebuilt) before the generation becomes visible.
+        if base_sidecar is not None and touched_doc_ids:
+            sidecar = patch_vector_sidecar(
+                working_db_path,
+                base_sidecar,
+                doc_ids=touched_doc_ids,
+                released=released_rows,
+            )
+        else:
+            sidecar = ensure_vector_sidecar(working_db_path, dtype=settings.rag_vector_sidecar)
+        with connect_sqlite(working_db_path) as connection:
+            delete_index_meta(connection, WORKING_BASE_META)
+        published = publish_generation(db_path, working_db_path)
+        collect_generations(db_path, keep=settings.rag_index_generations_keep)
+        generation = published.generation
 
     duration_ms = int((perf_counter() - start) * 1000)
     return {
-        "mode": "incremental",
-        "scanned_files": len(scanned_docs),
-        "unchanged": len(unchanged_docs),
-        "new": len(new_docs),
-        "updated": len(updated_docs),
-        "removed": len(removed_docs),
+        "mode": "incremental" if changed_paths is None else "paths",
+        "scanned_files": len(scan.unchanged) + len(scan.new) + len(scan.updated),
+        "hashed_files": scan.hashed_files,
+        "unchanged": len(scan.unchanged),
+        "new": len(scan.new),
+        "updated": len(scan.updated),
+        "removed": len(scan.removed),
         "documents_total_after": documents_total_after,
         "chunks_total_after": chunks_total_after,
+        "embedded_chunks": embedded_chunks,
+        "reused_chunks": reused_chunks,
+        # Share of the new/updated documents' chunks that kept a stored vector.
+        "chunk_reuse_ratio": (
+            round(reused_chunks / (reused_chunks + embedded_chunks), 4)
+            if reused_chunks + embedded_chunks
+            else None
+        ),
+        "written_chunks": written_chunks,
         "duration_ms": duration_ms,
         "embed_model": embed_model,
+        "chunk_strategy": resolved_chunk_strategy,
         "max_embedding_dim": max_embedding_dim,
         "db_path": str(db_path),
+        "generation": generation,
+        "vector_sidecar": sidecar.dtype if sidecar is not None else SIDECAR_DISABLED,
     }
 
 
-def main() -> None:
+def run_incremental_reindex_job(
+    *,
+    source_dir: Path,
+    db_path: Path,
+    chunk_size: int,
+    chunk_overlap: int,
+    embedding_client: EmbeddingClient,
+    embed_model: str,
+    chunk_strategy: str | None = None,
+    embed_batch_size: int | None = None,
+    ingest_workers: int | None = None,
+    cancel_token: CancellationToken | None = None,
+    progress: ProgressReporter | None = None,
+) -> IncrementalReindexResult:
+    with index_writer_lock(db_path, cancel_token=cancel_token):
+        return _run_reindex(
+            source_dir=source_dir,
+            db_path=db_path,
+            changed_paths=None,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            chunk_strategy=chunk_strategy,
+            embedding_client=embedding_client,
+            embed_model=embed_model,
+            embed_batch_size=embed_batch_size,
+            ingest_workers=ingest_workers,
+            cancel_token=cancel_token,
+            progress=progress,
+        )
+
+
+def run_path_reindex(
+    *,
+    source_dir: Path,
+    db_path: Path,
+    changed_paths: set[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    embedding_client: EmbeddingClient,
+    embed_model: str,
+    chunk_strategy: str | None = None,
+    embed_batch_size: int | None = None,
+    ingest_workers: int | None = None,
+    cancel_token: CancellationToken | None = None,
+) -> IncrementalReindexResult:
+    """Incremental reindex restricted to `changed_paths` (relative to `source_dir`).
+
+    Used by the source watcher: only the named files and directory subtrees
+    are stat-ed, so the cost follows the change, not the corpus. Waits for
+    the index writer lock while a queued reindex of the same index runs.
+    """
+    with index_writer_lock(db_path, cancel_token=cancel_token):
+        return _run_reindex(
+            source_dir=source_dir,
+            db_path=db_path,
+            changed_paths=changed_paths,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            chunk_strategy=chunk_strategy,
+            embedding_client=embedding_client,
+            embed_model=embed_model,
+            embed_batch_size=embed_batch_size,
+            ingest_workers=ingest_workers,
+            cancel_token=cancel_token,
+            progress=None,
+        )
+
+
+def _payload_chunk_strategy(payload: dict[str, object], default: str) -> str:
+    value = payload.get("chunk_strategy", default)
+    if value not in CHUNK_STRATEGIES:
+        raise ValueError(f"chunk_strategy must be one of {', '.join(CHUNK_STRATEGIES)}")
+    return str(value)
+
+
+def _payload_collection(payload: dict[str, object]) -> str | None:
+    value = payload.get("collection")
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("collection must be a string")
+    return value
+
+
+def _main() -> None:
     parser = _build_parser()
     args = parser.parse_args()
     settings = get_settings()
+    cancel_token = install_sigterm_cancellation()
 
     try:
         payload = _resolve_payload(args.payload_json)
-        source_dir = Path(str(payload.get("source_dir", settings.rag_source_dir)))
-        db_path = Path(str(payload.get("db_path", settings.rag_db_path)))
+        collection = resolve_collection(_payload_collection(payload), settings)
+        source_dir = Path(str(payload.get("source_dir", collection.source_dir)))
+        db_path = Path(str(payload.get("db_path", collection.db_path)))
         chunk_size = _payload_int(payload, "chunk_size", settings.rag_chunk_size)
         chunk_overlap = _payload_int(payload, "chunk_overlap", settings.rag_chunk_overlap)
+        chunk_strategy = _payload_chunk_strategy(payload, settings.rag_chunk_strategy)
+        embed_batch_size = _payload_int(payload, "embed_batch_size", settings.rag_embed_batch_size)
 
         embedding_client = OllamaEmbeddingClient(
             base_url=settings.ollama_embed_base_url,
-            model=settings.ollama_embed_model,
+            model=collection.embed_model,
             timeout_seconds=settings.ollama_timeout_seconds,
         )
 
@@ -240,14 +618,26 @@ def main() -> None:
             db_path=db_path,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
+            chunk_strategy=chunk_strategy,
             embedding_client=embedding_client,
-            embed_model=settings.ollama_embed_model,
+            embed_model=collection.embed_model,
+            embed_batch_size=embed_batch_size,
+            cancel_token=cancel_token,
+            progress=ProgressReporter(phase="scanning"),
         )
+    except JobCancelledError as exc:
+        print(f"[rag-incremental-reindex-runner] cancelled: {exc}", file=sys.stderr, flush=True)
+        raise SystemExit(CANCELLED_EXIT_CODE) from exc
     except Exception as exc:
         print(f"[rag-incremental-reindex-runner] failed: {exc}", file=sys.stderr, flush=True)
         raise SystemExit(1) from exc
 
-    print(json.dumps(metrics), flush=True)
+    print(json.dumps({**metrics, "collection": collection.name}), flush=True)
+
+
+def main() -> None:
+    with runner_span("rag_reindex_incremental"):
+        _main()
 
 
 if __name__ == "__main__":
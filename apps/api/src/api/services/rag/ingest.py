@@ -3,11 +3,20 @@ from __future__ import annotations
 from pathlib import Path
 
 from api.config import get_settings
-from api.services.rag.chunker import chunk_documents
+from api.services.rag.dedup import embed_texts_deduplicated
 from api.services.rag.embedding_client import EmbeddingClient, OllamaEmbeddingClient
-from api.services.rag.loader import load_documents
-from api.services.rag.sqlite_store import persist_sqlite_index
+from api.services.rag.generations import collect_generations, index_writer_lock, publish_generation
+from api.services.rag.job_control import CancellationToken, ProgressReporter
+from api.services.rag.loader import no_documents_error, scan_source_files
+from api.services.rag.prepare import prepare_documents, resolve_ingest_workers
+from api.services.rag.sqlite_store import (
+    compress_chunk_texts,
+    connect_sqlite,
+    persist_sqlite_index,
+    remove_sqlite_files,
+)
 from api.services.rag.types import IngestionSummary
+from api.services.rag.vector_sidecar import write_vector_sidecar
 
 
 def ingest_documents(
@@ -16,36 +25,77 @@ def ingest_documents(
     db_path: Path,
     chunk_size: int,
     chunk_overlap: int,
+    chunk_strategy: str | None = None,
     embedding_client: EmbeddingClient | None = None,
+    embed_batch_size: int | None = None,
+    cancel_token: CancellationToken | None = None,
+    progress: ProgressReporter | None = None,
 ) -> IngestionSummary:
     if chunk_overlap >= chunk_size:
         raise ValueError("chunk_overlap must be smaller than chunk_size")
 
+    settings = get_settings()
     if embedding_client is None:
-        settings = get_settings()
         embedding_client = OllamaEmbeddingClient(
             base_url=settings.ollama_embed_base_url,
             model=settings.ollama_embed_model,
             timeout_seconds=settings.ollama_timeout_seconds,
         )
 
-    documents = load_documents(source_dir)
-    chunks = chunk_documents(
-        documents,
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
-    embeddings = embedding_client.embed_texts([chunk.text for chunk in chunks])
-    index_file = persist_sqlite_index(
-        db_path,
-        documents=documents,
-        chunks=chunks,
-        embeddings=embeddings,
+    prepared_documents = [
+        prepared
+        for prepared in prepare_documents(
+            scan_source_files(source_dir),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            chunk_strategy=chunk_strategy or settings.rag_chunk_strategy,
+            workers=resolve_ingest_workers(settings.rag_ingest_workers),
+        )
+        if prepared is not None
+    ]
+    if not prepared_documents:
+        raise no_documents_error(source_dir)
+    documents = [prepared.document for prepared in prepared_documents]
+    chunks = [chunk for prepared in prepared_documents for chunk in prepared.chunks]
+    if progress is not None:
+        # Loading and chunking are done up front, so every document is "processed"
+        # once embedding starts; chunk throughput drives the ETA.
+        progress.start(
+            phase="embedding",
+            docs_total=len(documents),
+            docs_done=len(documents),
+            chunks_total=len(chunks),
+        )
+    embeddings, _ = embed_texts_deduplicated(
+        embedding_client,
+        [chunk.text for chunk in chunks],
+        batch_size=embed_batch_size or settings.rag_embed_batch_size,
+        cancel_token=cancel_token,
+        progress=progress,
     )
+    # Built aside and published as a new generation, like a full reindex.
+    staged_db_path = db_path.with_name(f"{db_path.name}.ingest")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with index_writer_lock(db_path, cancel_token=cancel_token):
+        remove_sqlite_files(staged_db_path)
+        persist_sqlite_index(
+            staged_db_path,
+            documents=documents,
+            chunks=chunks,
+            embeddings=embeddings,
+        )
+        if settings.rag_text_compression == "zlib":
+            with connect_sqlite(staged_db_path) as connection:
+                compress_chunk_texts(connection)
+                connection.commit()
+                connection.execute("VACUUM")
+        write_vector_sidecar(staged_db_path, dtype=settings.rag_vector_sidecar)
+        published = publish_generation(db_path, staged_db_path)
+        collect_generations(db_path, keep=settings.rag_index_generations_keep)
 
     return IngestionSummary(
         document_count=len(documents),
         chunk_count=len(chunks),
         output_dir=str(db_path.parent),
-        index_file=str(index_file),
+        index_file=str(published.db_path),
     )
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+from threading import Event
+from time import perf_counter
+from types import FrameType
+from typing import Any, Callable
+
+# Conventional exit status for a process stopped on request rather than by failure.
+CANCELLED_EXIT_CODE = 130
+PROGRESS_EVENT = "progress"
+# Set to "1" by the worker when a failure of this run will not be retried.
+FINAL_ATTEMPT_ENV = "JOB_FINAL_ATTEMPT"
+
+
+class JobCancelledError(RuntimeError):
+    pass
+
+
+def is_final_attempt() -> bool:
+    return os.environ.get(FINAL_ATTEMPT_ENV) == "1"
+
+
+class CancellationToken:
+    def __init__(self) -> None:
+        self._event = Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self, checkpoint: str) -> None:
+        if self._event.is_set():
+            raise JobCancelledError(f"cancelled at {checkpoint}")
+
+
+def install_sigterm_cancellation() -> CancellationToken:
+    """Turn SIGTERM from the worker into a cooperative cancel request.
+
+    Runners check the returned token at batch boundaries, so the current
+    embedding call finishes and the process exits without partial writes.
+    """
+    token = CancellationToken()
+
+    def _handle_sigterm(signum: int, frame: FrameType | None) -> None:
+        token.cancel()
+
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    return token
+
+
+def _print_progress_event(snapshot: dict[str, Any]) -> None:
+    print(json.dumps({"event": PROGRESS_EVENT, **snapshot}), flush=True)
+
+
+class ProgressReporter:
+    """Track docs/chunks throughput and emit throttled progress snapshots.
+
+    The default sink prints one JSON line per snapshot to stdout, which the
+    worker reads while the runner is still running and stores on the job row.
+    """
+
+    def __init__(
+        self,
+        *,
+        phase: str,
+        emit: Callable[[dict[str, Any]], None] | None = None,
+        min_interval_seconds: float = 1.0,
+    ) -> None:
+        self._phase = phase
+        self._emit = emit or _print_progress_event
+        self._min_interval_seconds = min_interval_seconds
+        self._started = perf_counter()
+        self._last_emit: float | None = None
+        self.docs_total: int | None = None
+        self.docs_done = 0
+        self.chunks_total: int | None = None
+        self.chunks_done = 0
+
+    def start(
+        self,
+        *,
+        phase: str | None = None,
+        docs_total: int | None = None,
+        chunks_total: int | None = None,
+        docs_done: int = 0,
+    ) -> None:
+        if phase is not None:
+            self._phase = phase
+        self.docs_total = docs_total
+        self.docs_done = docs_done
+        self.chunks_total = chunks_total
+        self.chunks_done = 0
+        self._started = perf_counter()
+        self.report(force=True)
+
+    def advance(self, *, docs: int = 0, chunks: int = 0) -> None:
+        self.docs_done += docs
+        self.chunks_done += chunks
+        self.report()
+
+    def report(self, *, force: bool = False) -> None:
+        now = perf_counter()
+        if (
+            not force
+            and self._last_emit is not None
+            and now - self._last_emit < self._min_interval_seconds
+        ):
+            return
+        self._last_emit = now
+        self._emit(self.snapshot())
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = max(perf_counter() - self._started, 1e-9)
+        embeddings_per_sec = self.chunks_done / elapsed
+
+        eta_seconds: float | None = None
+        if self.chunks_total is not None and embeddings_per_sec > 0:
+            eta_seconds = max(0, self.chunks_total - self.chunks_done) / embeddings_per_sec
+        elif self.docs_total is not None and self.docs_done > 0:
+            eta_seconds = max(0, self.docs_total - self.docs_done) * elapsed / self.docs_done
+
+        return {
+            "phase": self._phase,
+            "docs_done": self.docs_done,
+            "docs_total": self.docs_total,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "embeddings_per_sec": round(embeddings_per_sec, 2),
+            "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+            "elapsed_ms": int(elapsed * 1000),
+        }
@@ -1,49 +1,173 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 import hashlib
+import os
 from pathlib import Path
+import time
 
 from api.services.rag.types import SourceDocument
 
 SUPPORTED_EXTENSIONS = {".txt", ".md"}
 
+# Characters per read when hashing a file without loading it whole.
+_HASH_BLOCK_CHARS = 1 << 20
 
-def load_documents(
-    source_dir: Path,
-    supported_extensions: set[str] | None = None,
-) -> list[SourceDocument]:
+# A file modified this recently may change again within the filesystem's mtime
+# granularity without its stat moving, so its mtime is not recorded and the next
+# incremental scan hashes it again (git's "racily clean" rule).
+_RACY_MTIME_WINDOW_NS = 2_000_000_000
+
+
+@dataclass(frozen=True)
+class SourceFile:
+    """A supported file found by `scan_source_files`; only its stat has been read."""
+
+    path: Path
+    source_path: str
+    doc_id: str
+    size: int
+    mtime_ns: int
+
+
+def document_id(source_path: str) -> str:
+    return hashlib.sha256(source_path.encode("utf-8")).hexdigest()[:16]
+
+
+def stable_mtime_ns(source_file: SourceFile) -> int | None:
+    """The mtime to record for `source_file`, or None while it is too recent to trust."""
+    if time.time_ns() - source_file.mtime_ns < _RACY_MTIME_WINDOW_NS:
+        return None
+    return source_file.mtime_ns
+
+
+def _check_source_dir(source_dir: Path) -> None:
     if not source_dir.exists():
         raise FileNotFoundError(f"Source directory not found: {source_dir}")
     if not source_dir.is_dir():
         raise NotADirectoryError(f"Source path is not a directory: {source_dir}")
 
+
+def _source_file(path: Path, root: Path, stat: os.stat_result) -> SourceFile:
+    relative_path = path.relative_to(root).as_posix()
+    return SourceFile(
+        path=path,
+        source_path=relative_path,
+        doc_id=document_id(relative_path),
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+    )
+
+
+def scan_source_files(
+    source_dir: Path,
+    supported_extensions: set[str] | None = None,
+    *,
+    relative_to: Path | None = None,
+) -> list[SourceFile]:
+    """List supported files with size/mtime, one stat per file and no reads.
+
+    `relative_to` scans a subdirectory while keeping source paths relative to
+    the source root.
+    """
+    _check_source_dir(source_dir)
     extensions = supported_extensions or SUPPORTED_EXTENSIONS
-    files = sorted(
-        path
-        for path in source_dir.rglob("*")
-        if path.is_file() and path.suffix.lower() in extensions
+    root = relative_to or source_dir
+
+    files: list[SourceFile] = []
+    pending = [source_dir]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                # Like Path.rglob: symlinked directories are not descended into.
+                if entry.is_dir() and not entry.is_symlink():
+                    pending.append(Path(entry.path))
+                    continue
+                if not entry.is_file() or Path(entry.name).suffix.lower() not in extensions:
+                    continue
+                files.append(_source_file(Path(entry.path), root, entry.stat()))
+    files.sort(key=lambda item: item.path)
+    return files
+
+
+def stat_source_file(
+    source_dir: Path,
+    source_path: str,
+    supported_extensions: set[str] | None = None,
+) -> SourceFile | None:
+    """Stat one file by source path; None if it is missing or not a supported file."""
+    extensions = supported_extensions or SUPPORTED_EXTENSIONS
+    path = source_dir / source_path
+    if path.suffix.lower() not in extensions:
+        return None
+    try:
+        stat = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not path.is_file():
+        return None
+    return _source_file(path, source_dir, stat)
+
+
+def read_source_document(source_file: SourceFile) -> SourceDocument | None:
+    """Load one scanned file; None if it is empty after stripping whitespace."""
+    text = source_file.path.read_text(encoding="utf-8").strip()
+    if not text:
+        return None
+    return SourceDocument(
+        doc_id=source_file.doc_id,
+        source_path=source_file.source_path,
+        text=text,
+        file_size=source_file.size,
+        file_mtime_ns=stable_mtime_ns(source_file),
+    )
+
+
+def hash_source_file(source_file: SourceFile) -> str | None:
+    """`compute_content_hash` of the stripped file text, read in blocks.
+
+    Returns None for files that are empty after stripping, which
+    `load_documents` skips.
+    """
+    digest = hashlib.sha256()
+    started = False
+    trailing_whitespace = ""
+    with source_file.path.open(encoding="utf-8") as handle:
+        while block := handle.read(_HASH_BLOCK_CHARS):
+            if not started:
+                block = block.lstrip()
+                if not block:
+                    continue
+                started = True
+            body = block.rstrip()
+            if not body:
+                # Whitespace only counts once more text follows it.
+                trailing_whitespace += block
+                continue
+            digest.update((trailing_whitespace + body).encode("utf-8"))
+            trailing_whitespace = block[len(body) :]
+    return digest.hexdigest() if started else None
+
+
+def no_documents_error(source_dir: Path, supported_extensions: set[str] | None = None) -> ValueError:
+    extensions = supported_extensions or SUPPORTED_EXTENSIONS
+    return ValueError(
+        f"No non-empty supported documents found in {source_dir} "
+        f"(supported: {sorted(extensions)})"
     )
 
-    documents: list[SourceDocument] = []
-    for path in files:
-        text = path.read_text(encoding="utf-8").strip()
-        if not text:
-            continue
-
-        relative_path = path.relative_to(source_dir).as_posix()
-        doc_id = hashlib.sha256(relative_path.encode("utf-8")).hexdigest()[:16]
-        documents.append(
-            SourceDocument(
-                doc_id=doc_id,
-                source_path=relative_path,
-                text=text,
-            )
-        )
+
+def load_documents(
+    source_dir: Path,
+    supported_extensions: set[str] | None = None,
+) -> list[SourceDocument]:
+    documents = [
+        document
+        for source_file in scan_source_files(source_dir, supported_extensions)
+        if (document := read_source_document(source_file)) is not None
+    ]
 
     if not documents:
-        raise ValueError(
-            f"No non-empty supported documents found in {source_dir} "
-            f"(supported: {sorted(extensions)})"
-        )
+        raise no_documents_error(source_dir, supported_extensions)
 
     return documents
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import os
+
+from api.services.rag.chunker import chunk_documents
+from api.services.rag.loader import SourceFile, read_source_document
+from api.services.rag.sqlite_store import compute_content_hash
+from api.services.rag.types import ChunkRecord, SourceDocument
+
+# Files per pool task: large enough to amortize pickling, small enough that the
+# first results reach the embedding stage quickly.
+_FILES_PER_TASK = 32
+# Tasks queued per worker ahead of the consumer; bounds memory while embedding
+# is slower than preparation.
+_TASKS_AHEAD_PER_WORKER = 2
+# Below this many files the pool's startup costs more than it saves.
+_MIN_PARALLEL_FILES = 256
+
+
+@dataclass(frozen=True)
+class PreparedDocument:
+    document: SourceDocument
+    content_hash: str
+    chunks: list[ChunkRecord]
+
+
+def resolve_ingest_workers(configured: int) -> int:
+    """RAG_INGEST_WORKERS, where 0 means one worker per CPU."""
+    return configured if configured > 0 else os.cpu_count() or 1
+
+
+def _prepare_files(
+    source_files: list[SourceFile],
+    *,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_strategy: str,
+) -> list[PreparedDocument | None]:
+    prepared: list[PreparedDocument | None] = []
+    for source_file in source_files:
+        document = read_source_document(source_file)
+        if document is None:
+            prepared.append(None)
+            continue
+        prepared.append(
+            PreparedDocument(
+                document=document,
+                content_hash=compute_content_hash(document.text),
+                chunks=chunk_documents(
+                    [document],
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                    strategy=chunk_strategy,
+                ),
+            )
+        )
+    return prepared
+
+
+def prepare_documents(
+    source_files: list[SourceFile],
+    *,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_strategy: str = "fixed",
+    workers: int = 1,
+) -> Iterator[PreparedDocument | None]:
+    """Read, hash and chunk `source_files`, yielding one result per file in input order.
+
+    Empty files yield None. With `workers` > 1 the work runs in a process pool
+    and results stream back in order with a bounded number of tasks in flight,
+    so the caller can embed early documents while later ones are prepared. The
+    output is identical to `load_documents` + `chunk_documents`.
+    """
+    prepare = partial(
+        _prepare_files,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        chunk_strategy=chunk_strategy,
+    )
+    if workers <= 1 or len(source_files) < _MIN_PARALLEL_FILES:
+        for start in range(0, len(source_files), _FILES_PER_TASK):
+            yield from prepare(source_files[start : start + _FILES_PER_TASK])
+        return
+
+    tasks = (
+        source_files[start : start + _FILES_PER_TASK]
+        for start in range(0, len(source_files), _FILES_PER_TASK)
+    )
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight: deque[Future[list[PreparedDocument | None]]] = deque()
+        for task in tasks:
+            in_flight.append(pool.submit(prepare, task))
+            if len(in_flight) >= workers * _TASKS_AHEAD_PER_WORKER:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
@@ -1,21 +1,43 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+import heapq
 import json
 import math
 from pathlib import Path
+import sqlite3
 
 from api.config import get_settings
+from api.metrics import RAG_QUERY_EMBEDDING_SECONDS, RAG_SCORING_SECONDS
+from api.services.rag.collection import get_loaded_index_cache
+from api.services.rag.dedup import COLLAPSE_OVERFETCH, collapse_duplicate_hits
 from api.services.rag.embedder import embed_text
 from api.services.rag.embedding_client import (
     EmbeddingClient,
     EmbeddingClientError,
     OllamaEmbeddingClient,
 )
-from api.services.rag.sqlite_store import load_sqlite_chunks
-from api.services.rag.types import QueryHit
+from api.services.rag.generations import IndexGeneration, current_generation
+from api.services.rag.sqlite_store import (
+    StoredChunk,
+    connect_sqlite,
+    iter_sqlite_vectors,
+    load_chunk_texts_by_rowid,
+    load_sqlite_chunks_by_rowid,
+    search_fts_rowids,
+)
+from api.services.rag.types import QueryHit, SearchFilters
+from api.services.rag.vector_sidecar import search_vector_sidecar
+from api.timings import StageTimings, timed_stage
+
+SEARCH_MODES = ("vector", "hybrid")
+# Standard RRF constant: damps the influence of the very top ranks of either list.
+RRF_K = 60
 
 
-def _cosine(a: list[float], b: list[float]) -> float:
+def cosine_similarity(a: list[float], b: list[float]) -> float:
     dot = sum(x * y for x, y in zip(a, b))
     norm_a = math.sqrt(sum(x * x for x in a))
     norm_b = math.sqrt(sum(y * y for y in b))
@@ -39,7 +61,21 @@ def _load_index_records(index_dir: Path) -> list[dict[str, object]]:
     return records
 
 
-def _search_json_index(*, index_dir: Path, query_text: str, top_k: int) -> list[QueryHit]:
+def _matches_filters(filters: SearchFilters, *, source_path: str, doc_id: object) -> bool:
+    if filters.source_path_prefix and not source_path.startswith(filters.source_path_prefix):
+        return False
+    if filters.source_path_glob and not fnmatchcase(source_path, filters.source_path_glob):
+        return False
+    return not filters.doc_ids or doc_id in filters.doc_ids
+
+
+def _search_json_index(
+    *,
+    index_dir: Path,
+    query_text: str,
+    top_k: int,
+    filters: SearchFilters | None = None,
+) -> list[QueryHit]:
     records = _load_index_records(index_dir)
     if not records:
         return []
@@ -63,12 +99,17 @@ def _search_json_index(*, index_dir: Path, query_text: str, top_k: int) -> list[
             or not isinstance(text, str)
         ):
             continue
+        # The legacy JSON index has no query planner; filters are applied per record.
+        if filters is not None and not _matches_filters(
+            filters, source_path=source_path, doc_id=record.get("doc_id")
+        ):
+            continue
         hits.append(
             QueryHit(
                 chunk_id=chunk_id,
                 source_path=source_path,
                 text=text,
-                score=_cosine(query_embedding, [float(value) for value in embedding]),
+                score=cosine_similarity(query_embedding, [float(value) for value in embedding]),
             )
         )
 
@@ -76,6 +117,192 @@ def _search_json_index(*, index_dir: Path, query_text: str, top_k: int) -> list[
     return hits[: max(1, top_k)]
 
 
+def _embed_query(query_text: str, embedding_client: EmbeddingClient | None) -> list[float]:
+    if embedding_client is None:
+        settings = get_settings()
+        embedding_client = OllamaEmbeddingClient(
+            base_url=settings.ollama_embed_base_url,
+            model=settings.ollama_embed_model,
+            timeout_seconds=settings.ollama_timeout_seconds,
+        )
+
+    try:
+        with RAG_QUERY_EMBEDDING_SECONDS.time():
+            return embedding_client.embed_texts([query_text])[0]
+    except (EmbeddingClientError, IndexError) as exc:
+        raise ValueError(f"Failed to generate query embedding: {exc}") from exc
+
+
+@contextmanager
+def _open_generation(index_path: Path, generation: IndexGeneration) -> Iterator[tuple[Path, sqlite3.Connection]]:
+    """One connection to `generation` for a whole request.
+
+    A publish plus gc between resolving the generation and opening it can
+    remove it; the then-current generation is opened instead.
+    """
+    try:
+        connection = connect_sqlite(generation.db_path)
+    except sqlite3.OperationalError:
+        current = current_generation(index_path)
+        if current is None or current.db_path == generation.db_path:
+            raise
+        generation = current
+        connection = connect_sqlite(generation.db_path)
+    with connection:
+        yield generation.db_path, connection
+
+
+def _index_has_chunks(connection: sqlite3.Connection) -> bool:
+    return connection.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is not None
+
+
+def _vector_hits(
+    connection: sqlite3.Connection,
+    db_path: Path,
+    query_embedding: list[float],
+    *,
+    limit: int,
+    filters: SearchFilters | None = None,
+    index_path: Path | None = None,
+    timings: StageTimings | None = None,
+) -> list[QueryHit]:
+    with timed_stage(timings, "index_load"):
+        loaded = get_loaded_index_cache().get(db_path, index_path=index_path, connection=connection)
+    if loaded is not None:
+        with RAG_SCORING_SECONDS.time(path="sidecar"), timed_stage(timings, "score"):
+            sidecar_hits = search_vector_sidecar(
+                db_path,
+                loaded.info,
+                query_embedding=query_embedding,
+                top_k=limit,
+                rerank_factor=get_settings().rag_rerank_factor,
+                filters=filters,
+                mapped=loaded.mapped,
+                connection=connection,
+            )
+        if sidecar_hits is not None:
+            return sidecar_hits
+
+    # BLOB scan: vectors are streamed and only (rowid, score) of the current
+    # top `limit` stay resident; text and source_path are fetched for the
+    # winners alone. nlargest keeps chunk id order on ties.
+    with RAG_SCORING_SECONDS.time(path="blob"), timed_stage(timings, "score"):
+        top = heapq.nlargest(
+            limit,
+            (
+                (rowid, cosine_similarity(query_embedding, embedding))
+                for rowid, embedding in iter_sqlite_vectors(connection, filters=filters)
+            ),
+            key=lambda item: item[1],
+        )
+    with timed_stage(timings, "fetch"):
+        texts = load_chunk_texts_by_rowid(connection, [rowid for rowid, _ in top])
+    return [
+        QueryHit(
+            chunk_id=texts[rowid].chunk_id,
+            source_path=texts[rowid].source_path,
+            text=texts[rowid].text,
+            score=score,
+        )
+        for rowid, score in top
+        if rowid in texts
+    ]
+
+
+def _score_chunks(chunks: list[StoredChunk], query_embedding: list[float]) -> list[QueryHit]:
+    hits = [
+        QueryHit(
+            chunk_id=chunk.chunk_id,
+            source_path=chunk.source_path,
+            text=chunk.text,
+            score=cosine_similarity(query_embedding, chunk.embedding),
+        )
+        for chunk in sorted(chunks, key=lambda item: item.chunk_id)
+    ]
+    hits.sort(key=lambda hit: hit.score, reverse=True)
+    return hits
+
+
+def _reciprocal_rank_fusion(rankings: list[list[QueryHit]], *, limit: int) -> list[QueryHit]:
+    scores: dict[str, float] = {}
+    first_seen: dict[str, QueryHit] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            scores[hit.chunk_id] = scores.get(hit.chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+            first_seen.setdefault(hit.chunk_id, hit)
+
+    fused = sorted(scores, key=lambda chunk_id: (-scores[chunk_id], chunk_id))
+    return [
+        QueryHit(
+            chunk_id=chunk_id,
+            source_path=first_seen[chunk_id].source_path,
+            text=first_seen[chunk_id].text,
+            score=scores[chunk_id],
+        )
+        for chunk_id in fused[:limit]
+    ]
+
+
+def _search_sqlite_index(
+    connection: sqlite3.Connection,
+    db_path: Path,
+    *,
+    query_text: str,
+    query_embedding: list[float],
+    top_k: int,
+    mode: str,
+    prefilter: bool,
+    candidates: int,
+    filters: SearchFilters | None,
+    index_path: Path,
+    timings: StageTimings | None,
+) -> list[QueryHit]:
+    if mode == "vector" and not prefilter:
+        return _vector_hits(
+            connection,
+            db_path,
+            query_embedding,
+            limit=top_k,
+            filters=filters,
+            index_path=index_path,
+            timings=timings,
+        )
+
+    with timed_stage(timings, "fts"):
+        lexical_rowids = search_fts_rowids(connection, query_text, limit=candidates, filters=filters)
+        lexical_chunks = load_sqlite_chunks_by_rowid(connection, lexical_rowids)
+
+    if prefilter and lexical_chunks:
+        # Only chunks sharing a term with the query are vector-scored; queries
+        # without lexical matches fall back to the full scan.
+        with RAG_SCORING_SECONDS.time(path="prefilter"), timed_stage(timings, "score"):
+            vector_hits = _score_chunks(list(lexical_chunks.values()), query_embedding)
+    else:
+        vector_hits = _vector_hits(
+            connection,
+            db_path,
+            query_embedding,
+            limit=top_k if mode == "vector" else max(top_k, candidates),
+            filters=filters,
+            index_path=index_path,
+            timings=timings,
+        )
+    if mode == "vector":
+        return vector_hits[:top_k]
+
+    lexical_hits = [
+        QueryHit(
+            chunk_id=lexical_chunks[rowid].chunk_id,
+            source_path=lexical_chunks[rowid].source_path,
+            text=lexical_chunks[rowid].text,
+            score=0.0,
+        )
+        for rowid in lexical_rowids
+        if rowid in lexical_chunks
+    ]
+    return _reciprocal_rank_fusion([vector_hits, lexical_hits], limit=top_k)
+
+
 def search_index(
     *,
     index_dir: Path,
@@ -83,45 +310,82 @@ def search_index(
     top_k: int = 3,
     db_path: Path | None = None,
     embedding_client: EmbeddingClient | None = None,
+    mode: str | None = None,
+    prefilter: bool | None = None,
+    filters: SearchFilters | None = None,
+    collapse_duplicates: bool | None = None,
+    timings: StageTimings | None = None,
 ) -> list[QueryHit]:
+    """Rank chunks for `query_text`.
+
+    `mode="vector"` scores cosine similarity; `mode="hybrid"` fuses it with FTS5
+    BM25 ranks via reciprocal rank fusion (hit scores are then RRF scores).
+    `prefilter=True` limits vector scoring to the top FTS candidates. Both
+    default to RAG_SEARCH_MODE / RAG_FTS_PREFILTER.
+
+    `filters` restrict candidates by source_path prefix/glob and document id;
+    they are applied in SQL before scoring, so only matching chunks are read.
+
+    `collapse_duplicates` (default RAG_COLLAPSE_DUPLICATES) keeps one hit per
+    group of identical or near-identical chunk texts, ranking
+    COLLAPSE_OVERFETCH x `top_k` candidates to fill the freed slots.
+
+    `timings` receives the duration of each stage (embed, index_load, fts,
+    score, fetch, collapse).
+    """
     normalized_query = query_text.strip()
     if not normalized_query:
         raise ValueError("query_text must not be empty")
 
-    resolved_db_path = db_path or (index_dir / "rag.db")
-    if resolved_db_path.exists():
-        chunks = load_sqlite_chunks(resolved_db_path)
-        if not chunks:
-            return []
-
-        if embedding_client is None:
-            settings = get_settings()
-            embedding_client = OllamaEmbeddingClient(
-                base_url=settings.ollama_embed_base_url,
-                model=settings.ollama_embed_model,
-                timeout_seconds=settings.ollama_timeout_seconds,
-            )
+    settings = get_settings()
+    resolved_mode = mode or settings.rag_search_mode
+    if resolved_mode not in SEARCH_MODES:
+        raise ValueError(f"unsupported search mode: {resolved_mode}")
 
-        try:
-            query_embedding = embedding_client.embed_texts([normalized_query])[0]
-        except (EmbeddingClientError, IndexError) as exc:
-            raise ValueError(f"Failed to generate query embedding: {exc}") from exc
+    limit = max(1, top_k)
+    collapse = settings.rag_collapse_duplicates if collapse_duplicates is None else collapse_duplicates
+    candidate_limit = limit * COLLAPSE_OVERFETCH if collapse else limit
 
-        hits = [
-            QueryHit(
-                chunk_id=chunk.chunk_id,
-                source_path=chunk.source_path,
-                text=chunk.text,
-                score=_cosine(query_embedding, chunk.embedding),
+    resolved_db_path = db_path or (index_dir / "rag.db")
+    # Resolved and opened once: the whole request reads this generation on one
+    # connection, even if a reindex publishes or a rollback switches
+    # meanwhile. The open file stays readable after gc removes its directory.
+    generation = current_generation(resolved_db_path)
+    if generation is not None:
+        with _open_generation(resolved_db_path, generation) as (generation_db_path, connection):
+            if not _index_has_chunks(connection):
+                return []
+
+            with timed_stage(timings, "embed"):
+                query_embedding = _embed_query(normalized_query, embedding_client)
+            hits = _search_sqlite_index(
+                connection,
+                generation_db_path,
+                query_text=normalized_query,
+                query_embedding=query_embedding,
+                top_k=candidate_limit,
+                mode=resolved_mode,
+                prefilter=settings.rag_fts_prefilter if prefilter is None else prefilter,
+                candidates=settings.rag_fts_candidates,
+                filters=filters,
+                index_path=resolved_db_path,
+                timings=timings,
             )
-            for chunk in chunks
-        ]
-        hits.sort(key=lambda hit: hit.score, reverse=True)
-        return hits[: max(1, top_k)]
+    elif (index_dir / "index.json").exists():
+        with timed_stage(timings, "score"):
+            hits = _search_json_index(
+                index_dir=index_dir,
+                query_text=normalized_query,
+                top_k=candidate_limit,
+                filters=filters,
+            )
+    else:
+        raise FileNotFoundError(
+            f"RAG index file not found: {resolved_db_path}. Run `uv run --project apps/api rag-ingest` first."
+        )
 
-    if (index_dir / "index.json").exists():
-        return _search_json_index(index_dir=index_dir, query_text=normalized_query, top_k=top_k)
+    if not collapse:
+        return hits[:limit]
+    with timed_stage(timings, "collapse"):
+        return collapse_duplicate_hits(hits, limit=limit)
 
-    raise FileNotFoundError(
-        f"RAG index file not found: {resolved_db_path}. Run `uv run --project apps/api rag-ingest` first."
-    )
@@ -3,24 +3,69 @@ from __future__ import annotations
 import argparse
 import json
 from pathlib import Path
-import os
 import sqlite3
 import sys
 from time import perf_counter
-from typing import TypedDict
+from typing import Iterable, Iterator, TypedDict
 
 from api.config import get_settings
-from api.services.rag.embedding_client import EmbeddingClient
-from api.services.rag.ingest import ingest_documents
+from api.services.rag.chunker import CHUNK_STRATEGIES
+from api.services.rag.collection import resolve_collection
+from api.services.rag.dedup import count_near_duplicates, embed_texts_deduplicated
+from api.services.rag.embedding_client import EmbeddingClient, OllamaEmbeddingClient
+from api.services.rag.generations import collect_generations, index_writer_lock, publish_generation
+from api.services.rag.job_control import (
+    CANCELLED_EXIT_CODE,
+    CancellationToken,
+    JobCancelledError,
+    ProgressReporter,
+    install_sigterm_cancellation,
+    is_final_attempt,
+)
+from api.services.rag.loader import no_documents_error, scan_source_files
+from api.services.rag.prepare import PreparedDocument, prepare_documents, resolve_ingest_workers
+from api.services.rag.sqlite_store import (
+    chunk_text_sql,
+    compress_chunk_texts,
+    connect_sqlite,
+    delete_document_and_chunks,
+    delete_index_meta,
+    ensure_sqlite_schema,
+    get_documents_map_by_source_path,
+    get_index_meta,
+    load_embeddings_by_text_hash,
+    load_text_dictionary,
+    remove_sqlite_files,
+    replace_chunks_for_doc,
+    set_index_meta,
+    stored_chunk_text,
+    upsert_document,
+)
+from api.services.rag.vector_sidecar import (
+    SIDECAR_DISABLED,
+    vector_sidecar_path,
+    write_vector_sidecar,
+)
+from api.tracing import runner_span
+
+STAGING_KEY_META = "staging_key"
 
 
 class ReindexResult(TypedDict):
     documents: int
+    resumed_documents: int
     chunks: int
+    embedded_chunks: int
+    duplicate_chunks: int
+    near_duplicate_chunks: int
+    compressed_chunks: int
     db_path: str
+    generation: int | None
     duration_ms: int
     max_embedding_dim: int
     embed_model: str
+    chunk_strategy: str
+    vector_sidecar: str
 
 
 def _build_parser() -> argparse.ArgumentParser:
@@ -31,13 +76,18 @@ def _build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--payload-json",
         default=None,
-        help="Optional JSON object payload with runtime overrides (source_dir/chunk_size/chunk_overlap/db_path)",
+        help="Optional JSON object payload with runtime overrides (collection/source_dir/chunk_size/chunk_overlap/chunk_strategy/db_path/embed_batch_size)",
+    )
+    parser.add_argument(
+        "--job-id",
+        default=None,
+        help="Queue job id; retries of the same job resume the staging DB instead of starting over",
     )
     return parser
 
 
 def _self_check_sqlite(db_path: Path) -> tuple[int, int]:
-    with sqlite3.connect(db_path) as connection:
+    with connect_sqlite(db_path) as connection:
         chunk_count = int(connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
         max_embedding_dim = int(
             connection.execute("SELECT COALESCE(MAX(embedding_dim), 0) FROM chunks").fetchone()[0]
@@ -51,43 +101,299 @@ def _self_check_sqlite(db_path: Path) -> tuple[int, int]:
     return chunk_count, max_embedding_dim
 
 
+def _count_duplicates(db_path: Path) -> tuple[int, int]:
+    """Chunks sharing another chunk's exact text, and distinct texts near-duplicating an earlier one."""
+    with connect_sqlite(db_path) as connection:
+        duplicate_chunks = int(
+            connection.execute("SELECT COUNT(*) - COUNT(DISTINCT text_hash) FROM chunks").fetchone()[0]
+        )
+        dictionary = load_text_dictionary(connection)
+        # A resumed staging DB may already hold compressed rows.
+        texts = (
+            str(stored_chunk_text(text, compressed, dictionary))
+            for text, compressed in connection.execute(
+                f"""
+                SELECT {chunk_text_sql(connection)}
+                FROM chunks c
+                WHERE c.rowid IN (SELECT MIN(rowid) FROM chunks GROUP BY text_hash)
+                ORDER BY c.text_hash
+                """
+            )
+        )
+        near_duplicate_chunks = count_near_duplicates(texts)
+    return duplicate_chunks, near_duplicate_chunks
+
+
+def _staging_key(
+    *,
+    job_id: str,
+    source_dir: Path,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_strategy: str,
+    embed_model: str,
+) -> str:
+    return json.dumps(
+        {
+            "job_id": job_id,
+            "source_dir": str(source_dir),
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "chunk_strategy": chunk_strategy,
+            "embed_model": embed_model,
+        },
+        sort_keys=True,
+    )
+
+
+def _discard_stale_staging(tmp_db_path: Path, staging_key: str | None) -> None:
+    if not tmp_db_path.exists():
+        return
+
+    if staging_key is not None:
+        try:
+            with connect_sqlite(tmp_db_path) as connection:
+                stored_key = get_index_meta(connection, STAGING_KEY_META)
+        except sqlite3.DatabaseError:
+            stored_key = None
+        if stored_key == staging_key:
+            return
+
+    remove_sqlite_files(tmp_db_path)
+
+
+def _group_by_chunk_budget(
+    prepared_documents: Iterable[PreparedDocument],
+    budget: int,
+) -> Iterator[list[PreparedDocument]]:
+    group: list[PreparedDocument] = []
+    group_chunks = 0
+    for prepared in prepared_documents:
+        group.append(prepared)
+        group_chunks += len(prepared.chunks)
+        if group_chunks >= budget:
+            yield group
+            group = []
+            group_chunks = 0
+    if group:
+        yield group
+
+
+def _build_staging_index(
+    tmp_db_path: Path,
+    *,
+    source_dir: Path,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_strategy: str,
+    embedding_client: EmbeddingClient,
+    embed_batch_size: int,
+    ingest_workers: int,
+    staging_key: str | None,
+    cancel_token: CancellationToken | None,
+    progress: ProgressReporter | None,
+) -> tuple[int, int, int]:
+    """Embed every document into the staging DB, skipping ones already staged.
+
+    Documents are committed in groups of roughly one embedding batch, keyed by
+    content hash, so an interrupted attempt leaves a consistent partial index
+    that the next attempt of the same job picks up. Chunk texts already in the
+    staging DB (headers, disclaimers) reuse the stored vector instead of being
+    embedded again. Files are read and chunked by `prepare_documents` while
+    earlier groups are embedded. Returns (documents, resumed documents,
+    embedded chunks).
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    source_files = scan_source_files(source_dir)
+
+    tmp_db_path.parent.mkdir(parents=True, exist_ok=True)
+    with connect_sqlite(tmp_db_path) as connection:
+        ensure_sqlite_schema(connection)
+        if staging_key is not None:
+            set_index_meta(connection, STAGING_KEY_META, staging_key)
+        staged_docs = get_documents_map_by_source_path(connection)
+        connection.commit()
+
+        source_paths: set[str] = set()
+        resumed_documents = 0
+        embedded_chunks = 0
+        if progress is not None:
+            # Chunk totals are unknown until every file is chunked, so the ETA
+            # follows documents.
+            progress.start(phase="embedding", docs_total=len(source_files))
+
+        def pending_documents() -> Iterator[PreparedDocument]:
+            nonlocal resumed_documents
+            for prepared in prepare_documents(
+                source_files,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                chunk_strategy=chunk_strategy,
+                workers=ingest_workers,
+            ):
+                if prepared is None:
+                    continue
+                source_paths.add(prepared.document.source_path)
+                staged_doc = staged_docs.get(prepared.document.source_path)
+                if staged_doc is not None and staged_doc.content_hash == prepared.content_hash:
+                    resumed_documents += 1
+                    if progress is not None:
+                        progress.advance(docs=1)
+                    continue
+                yield prepared
+
+        for group in _group_by_chunk_budget(pending_documents(), embed_batch_size):
+            group_chunks = [chunk for prepared in group for chunk in prepared.chunks]
+            embeddings, group_embedded = embed_texts_deduplicated(
+                embedding_client,
+                [chunk.text for chunk in group_chunks],
+                batch_size=embed_batch_size,
+                known_embeddings=lambda text_hashes: load_embeddings_by_text_hash(connection, text_hashes),
+                cancel_token=cancel_token,
+                progress=progress,
+            )
+            embedded_chunks += group_embedded
+
+            offset = 0
+            for prepared in group:
+                document = prepared.document
+                upsert_document(
+                    connection,
+                    doc_id=document.doc_id,
+                    source_path=document.source_path,
+                    content_hash=prepared.content_hash,
+                    file_size=document.file_size,
+                    file_mtime_ns=document.file_mtime_ns,
+                )
+                replace_chunks_for_doc(
+                    connection,
+                    doc_id=document.doc_id,
+                    chunks=prepared.chunks,
+                    embeddings=embeddings[offset : offset + len(prepared.chunks)],
+                )
+                offset += len(prepared.chunks)
+            connection.commit()
+            if progress is not None:
+                progress.advance(docs=len(group))
+
+        if not source_paths:
+            raise no_documents_error(source_dir)
+        for source_path, staged_doc in staged_docs.items():
+            if source_path not in source_paths:
+                delete_document_and_chunks(connection, staged_doc.doc_id)
+        connection.commit()
+
+    return len(source_paths), resumed_documents, embedded_chunks
+
+
 def run_reindex_job(
     *,
     source_dir: Path,
     db_path: Path,
     chunk_size: int,
     chunk_overlap: int,
+    chunk_strategy: str | None = None,
     embedding_client: EmbeddingClient | None = None,
+    embed_model: str | None = None,
+    embed_batch_size: int | None = None,
+    ingest_workers: int | None = None,
+    cancel_token: CancellationToken | None = None,
+    progress: ProgressReporter | None = None,
+    job_id: str | None = None,
+    final_attempt: bool = False,
 ) -> ReindexResult:
+    settings = get_settings()
+    resolved_embed_model = embed_model or settings.ollama_embed_model
+    resolved_chunk_strategy = chunk_strategy or settings.rag_chunk_strategy
     tmp_db_path = db_path.with_suffix(f"{db_path.suffix}.tmp")
     start = perf_counter()
 
-    if tmp_db_path.exists():
-        tmp_db_path.unlink()
+    if embedding_client is None:
+        embedding_client = OllamaEmbeddingClient(
+            base_url=settings.ollama_embed_base_url,
+            model=resolved_embed_model,
+            timeout_seconds=settings.ollama_timeout_seconds,
+        )
 
-    try:
-        summary = ingest_documents(
+    # Only queue jobs are resumable: without a job id there is no way to tell
+    # a retry from an unrelated run, so the staging DB starts fresh.
+    staging_key = (
+        _staging_key(
+            job_id=job_id,
             source_dir=source_dir,
-            db_path=tmp_db_path,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            embedding_client=embedding_client,
+            chunk_strategy=resolved_chunk_strategy,
+            embed_model=resolved_embed_model,
         )
-        chunk_count, max_embedding_dim = _self_check_sqlite(tmp_db_path)
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-        os.replace(tmp_db_path, db_path)
-    finally:
-        if tmp_db_path.exists():
-            tmp_db_path.unlink()
+        if job_id is not None
+        else None
+    )
+    # The staging DB is shared by every full reindex of this index, and the
+    # next generation id is picked at publish: one writer at a time.
+    with index_writer_lock(db_path, cancel_token=cancel_token):
+        _discard_stale_staging(tmp_db_path, staging_key)
+        # A failed run keeps its staging DB only for a retry that will come: not
+        # after the final attempt, and not after a cancel (never retried).
+        keep_staging = staging_key is not None and not final_attempt
+
+        try:
+            document_count, resumed_documents, embedded_chunks = _build_staging_index(
+                tmp_db_path,
+                source_dir=source_dir,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                chunk_strategy=resolved_chunk_strategy,
+                embedding_client=embedding_client,
+                embed_batch_size=embed_batch_size or settings.rag_embed_batch_size,
+                ingest_workers=resolve_ingest_workers(
+                    ingest_workers if ingest_workers is not None else settings.rag_ingest_workers
+                ),
+                staging_key=staging_key,
+                cancel_token=cancel_token,
+                progress=progress,
+            )
+            chunk_count, max_embedding_dim = _self_check_sqlite(tmp_db_path)
+            duplicate_chunks, near_duplicate_chunks = _count_duplicates(tmp_db_path)
+            compressed_chunks = 0
+            with connect_sqlite(tmp_db_path) as connection:
+                if settings.rag_text_compression == "zlib":
+                    compressed_chunks = compress_chunk_texts(connection)
+                delete_index_meta(connection, STAGING_KEY_META)
+                connection.commit()
+                if compressed_chunks:
+                    # Compressed rows leave free pages behind; the published file should not.
+                    connection.execute("VACUUM")
+            sidecar = write_vector_sidecar(tmp_db_path, dtype=settings.rag_vector_sidecar)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            published = publish_generation(db_path, tmp_db_path)
+            collect_generations(db_path, keep=settings.rag_index_generations_keep)
+        except JobCancelledError:
+            keep_staging = False
+            raise
+        finally:
+            if not keep_staging and tmp_db_path.exists():
+                remove_sqlite_files(tmp_db_path)
+                vector_sidecar_path(tmp_db_path).unlink(missing_ok=True)
 
     duration_ms = int((perf_counter() - start) * 1000)
     return {
-        "documents": summary.document_count,
+        "documents": document_count,
+        "resumed_documents": resumed_documents,
         "chunks": chunk_count,
+        "embedded_chunks": embedded_chunks,
+        "duplicate_chunks": duplicate_chunks,
+        "near_duplicate_chunks": near_duplicate_chunks,
+        "compressed_chunks": compressed_chunks,
         "db_path": str(db_path),
+        "generation": published.generation,
         "duration_ms": duration_ms,
         "max_embedding_dim": max_embedding_dim,
-        "embed_model": get_settings().ollama_embed_model,
+        "embed_model": resolved_embed_model,
+        "chunk_strategy": resolved_chunk_strategy,
+        "vector_sidecar": sidecar.dtype if sidecar is not None else SIDECAR_DISABLED,
     }
 
 
@@ -111,30 +417,64 @@ def _payload_int(payload: dict[str, object], key: str, default: int) -> int:
     raise ValueError(f"{key} must be an integer")
 
 
-def main() -> None:
+def _payload_chunk_strategy(payload: dict[str, object], default: str) -> str:
+    value = payload.get("chunk_strategy", default)
+    if value not in CHUNK_STRATEGIES:
+        raise ValueError(f"chunk_strategy must be one of {', '.join(CHUNK_STRATEGIES)}")
+    return str(value)
+
+
+def _payload_collection(payload: dict[str, object]) -> str | None:
+    value = payload.get("collection")
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("collection must be a string")
+    return value
+
+
+def _main() -> None:
     parser = _build_parser()
     args = parser.parse_args()
     settings = get_settings()
+    cancel_token = install_sigterm_cancellation()
 
     try:
         payload = _resolve_payload(args.payload_json)
-        source_dir = Path(str(payload.get("source_dir", settings.rag_source_dir)))
-        db_path = Path(str(payload.get("db_path", settings.rag_db_path)))
+        collection = resolve_collection(_payload_collection(payload), settings)
+        source_dir = Path(str(payload.get("source_dir", collection.source_dir)))
+        db_path = Path(str(payload.get("db_path", collection.db_path)))
         chunk_size = _payload_int(payload, "chunk_size", settings.rag_chunk_size)
         chunk_overlap = _payload_int(payload, "chunk_overlap", settings.rag_chunk_overlap)
+        chunk_strategy = _payload_chunk_strategy(payload, settings.rag_chunk_strategy)
+        embed_batch_size = _payload_int(payload, "embed_batch_size", settings.rag_embed_batch_size)
 
         metrics = run_reindex_job(
             source_dir=source_dir,
             db_path=db_path,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
+            chunk_strategy=chunk_strategy,
+            embed_model=collection.embed_model,
+            embed_batch_size=embed_batch_size,
+            cancel_token=cancel_token,
+            progress=ProgressReporter(phase="loading"),
+            job_id=args.job_id,
+            final_attempt=is_final_attempt(),
         )
+    except JobCancelledError as exc:
+        print(f"[rag-reindex-runner] cancelled: {exc}", file=sys.stderr, flush=True)
+        raise SystemExit(CANCELLED_EXIT_CODE) from exc
     except Exception as exc:
         print(f"[rag-reindex-runner] failed: {exc}", file=sys.stderr, flush=True)
         raise SystemExit(1) from exc
 
-    metrics["embed_model"] = settings.ollama_embed_model
-    print(json.dumps(metrics), flush=True)
+    print(json.dumps({**metrics, "collection": collection.name}), flush=True)
+
+
+def main() -> None:
+    with runner_span("rag_reindex"):
+        _main()
 
 
 if __name__ == "__main__":
@@ -4,9 +4,49 @@ from array import array
 from dataclasses import dataclass
 import hashlib
 from pathlib import Path
+import re
 import sqlite3
-
-from api.services.rag.types import ChunkRecord, SourceDocument
+from types import TracebackType
+from typing import Any, Iterable, Iterator, Literal
+
+from api.services.rag.text_codec import (
+    TEXT_TRAINING_SAMPLE_TEXTS,
+    compress_text,
+    decompress_text,
+    train_text_dictionary,
+)
+from api.services.rag.types import ChunkRecord, SearchFilters, SourceDocument
+from api.tracing import db_statement_span, tracing_enabled
+
+# index_meta key describing the memory-mapped embedding sidecar (see vector_sidecar).
+# Every chunk write drops it so searches fall back to BLOBs until it is rebuilt.
+VECTOR_SIDECAR_META = "vector_sidecar"
+
+# Contentless FTS5 index over chunks.text keyed by chunks.rowid. '-' and '_' are
+# token characters so part numbers and alarm codes (P-101, AL_203) match whole.
+FTS_TABLE = "chunks_fts"
+_FTS_TOKEN_PATTERN = re.compile(r"[\w\-]+")
+
+# Single-row table holding the zlib dictionary of an index whose chunk texts are
+# compressed (see compress_chunk_texts). Without a row every text is plain.
+TEXT_DICTIONARY_TABLE = "text_dictionary"
+_COMPRESS_BATCH_ROWS = 1000
+
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds.
+_MAX_SQL_PARAMS = 500
+
+# Upper bound for prefix range scans on documents.source_path (BINARY collation),
+# so prefix filters use idx_documents_source_path instead of a LIKE scan.
+_PREFIX_UPPER_BOUND = "\U0010ffff"
+
+# Connection tuning shared by the indexers and the API. Indexes are written in
+# WAL mode (see ensure_sqlite_schema), so searches keep reading the last commit
+# while a reindex writes; synchronous=NORMAL is crash-safe under WAL and a power
+# loss only drops the latest commits, which the next incremental run repeats.
+_BUSY_TIMEOUT_SECONDS = 30.0
+_MMAP_SIZE_BYTES = 256 * 1024 * 1024
+_CACHE_SIZE_KIB = 64 * 1024
+_SIDE_FILE_SUFFIXES = ("-wal", "-shm", "-journal")
 
 
 @dataclass(frozen=True)
@@ -17,11 +57,20 @@ class StoredChunk:
     embedding: list[float]
 
 
+@dataclass(frozen=True)
+class StoredChunkText:
+    chunk_id: str
+    source_path: str
+    text: str
+
+
 @dataclass(frozen=True)
 class StoredDocument:
     doc_id: str
     source_path: str
     content_hash: str
+    file_size: int | None = None
+    file_mtime_ns: int | None = None
 
 
 def _encode_embedding(values: list[float]) -> bytes:
@@ -46,7 +95,90 @@ def _chunk_index(chunk: ChunkRecord) -> int:
     raise ValueError(f"Invalid chunk id format: {chunk.chunk_id}")
 
 
+class _ClosingConnection(sqlite3.Connection):
+    """Commits or rolls back like sqlite3.Connection, then also closes on `with` exit.
+
+    Connections sit in a reference cycle with their statement cache, so without
+    this they stay open until a GC pass, and an open connection keeps a WAL
+    database from being checkpointed or switched out of WAL mode.
+    """
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> Literal[False]:
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.close()
+        return False
+
+
+class _TracedConnection(_ClosingConnection):
+    """Records a client span per statement run inside a trace.
+
+    A span covers stepping the statement to its first row; rows fetched later
+    from the returned cursor fall outside it.
+    """
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        with db_statement_span("sqlite", sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Iterable[Any], /) -> sqlite3.Cursor:
+        with db_statement_span("sqlite", sql):
+            return super().executemany(sql, parameters)
+
+    def executescript(self, sql_script: str, /) -> sqlite3.Cursor:
+        with db_statement_span("sqlite", sql_script):
+            return super().executescript(sql_script)
+
+
+def connect_sqlite(db_path: Path) -> sqlite3.Connection:
+    # Only pay for the per-statement hook when spans are exported at all.
+    factory = _TracedConnection if tracing_enabled() else _ClosingConnection
+    connection = sqlite3.connect(db_path, timeout=_BUSY_TIMEOUT_SECONDS, factory=factory)
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(f"PRAGMA mmap_size = {_MMAP_SIZE_BYTES}")
+    connection.execute(f"PRAGMA cache_size = -{_CACHE_SIZE_KIB}")
+    connection.execute("PRAGMA temp_store = MEMORY")
+    return connection
+
+
+def checkpoint_wal(db_path: Path) -> None:
+    """Copy committed WAL frames into `db_path` and truncate the WAL file."""
+    if not db_path.exists():
+        return
+    with connect_sqlite(db_path) as connection:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def leave_wal_mode(db_path: Path) -> None:
+    """Fold the WAL into `db_path` and switch it back to a rollback journal.
+
+    Only a database in this state may be moved with os.replace: the -wal and
+    -shm files are found by name and would not follow the rename. The next
+    writer's ensure_sqlite_schema turns WAL back on.
+    """
+    with connect_sqlite(db_path) as connection:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        journal_mode = connection.execute("PRAGMA journal_mode = DELETE").fetchone()[0]
+    if str(journal_mode).lower() != "delete":
+        raise RuntimeError(f"could not leave WAL mode for {db_path} (journal_mode={journal_mode})")
+
+
+def remove_sqlite_files(db_path: Path) -> None:
+    """Delete a database together with its WAL, shared-memory and journal files."""
+    db_path.unlink(missing_ok=True)
+    for suffix in _SIDE_FILE_SUFFIXES:
+        db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+
+
 def ensure_sqlite_schema(connection: sqlite3.Connection) -> None:
+    # Persistent in the file: readers never wait for a writer's commit.
+    connection.execute("PRAGMA journal_mode = WAL")
     connection.executescript(
         """
         PRAGMA foreign_keys = ON;
@@ -55,7 +187,9 @@ def ensure_sqlite_schema(connection: sqlite3.Connection) -> None:
             id TEXT PRIMARY KEY,
             source_path TEXT NOT NULL UNIQUE,
             content_hash TEXT NOT NULL,
-            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            file_size INTEGER,
+            file_mtime_ns INTEGER
         );
 
         CREATE TABLE IF NOT EXISTS chunks (
@@ -67,15 +201,357 @@ def ensure_sqlite_schema(connection: sqlite3.Connection) -> None:
             embedding BLOB NOT NULL,
             embedding_dim INTEGER NOT NULL,
             created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            text_hash TEXT,
+            heading_path TEXT,
+            text_compressed BLOB,
             FOREIGN KEY (doc_id) REFERENCES documents(id) ON DELETE CASCADE,
             UNIQUE (doc_id, chunk_index)
         );
 
+        CREATE TABLE IF NOT EXISTS index_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS text_dictionary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            data BLOB NOT NULL
+        );
+
         CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks(doc_id);
         CREATE INDEX IF NOT EXISTS idx_documents_source_path ON documents(source_path);
         CREATE INDEX IF NOT EXISTS idx_chunks_created_at ON chunks(created_at);
         """
     )
+    _ensure_document_stat(connection)
+    _ensure_chunk_text_hash(connection)
+    _ensure_vector_rows(connection)
+    _ensure_fts_index(connection)
+
+
+def _ensure_document_stat(connection: sqlite3.Connection) -> None:
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(documents)").fetchall()}
+    # Rows without a stat are re-hashed on the next incremental scan.
+    for column in ("file_size", "file_mtime_ns"):
+        if column not in columns:
+            connection.execute(f"ALTER TABLE documents ADD COLUMN {column} INTEGER")
+    connection.commit()
+
+
+def _ensure_chunk_text_hash(connection: sqlite3.Connection) -> None:
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(chunks)").fetchall()}
+    if "text_hash" not in columns:
+        # Rows written before the column existed keep NULL and are never shared.
+        connection.execute("ALTER TABLE chunks ADD COLUMN text_hash TEXT")
+    if "heading_path" not in columns:
+        connection.execute("ALTER TABLE chunks ADD COLUMN heading_path TEXT")
+    if "text_compressed" not in columns:
+        connection.execute("ALTER TABLE chunks ADD COLUMN text_compressed BLOB")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_text_hash ON chunks(text_hash)")
+    connection.commit()
+
+
+def _ensure_vector_rows(connection: sqlite3.Connection) -> None:
+    """Chunk -> sidecar row map; chunks with identical vectors share one row."""
+    primary_key = [
+        row[1] for row in connection.execute("PRAGMA table_info(vector_rows)").fetchall() if row[5]
+    ]
+    if primary_key == ["row"]:
+        # One-row-per-chunk layout: drop it along with the sidecar it described;
+        # searches use BLOBs until the next sidecar build.
+        connection.execute("DROP TABLE vector_rows")
+        delete_index_meta(connection, VECTOR_SIDECAR_META)
+    connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS vector_rows (
+            chunk_id TEXT PRIMARY KEY,
+            row INTEGER NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_vector_rows_row ON vector_rows(row);
+        """
+    )
+
+
+def _has_table(connection: sqlite3.Connection, name: str) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (name,),
+    ).fetchone()
+    return row is not None
+
+
+def has_fts_index(connection: sqlite3.Connection) -> bool:
+    return _has_table(connection, FTS_TABLE)
+
+
+def load_text_dictionary(connection: sqlite3.Connection) -> bytes | None:
+    """The index's text compression dictionary; None when chunk texts are written plain."""
+    if not _has_table(connection, TEXT_DICTIONARY_TABLE):
+        return None
+    row = connection.execute(f"SELECT data FROM {TEXT_DICTIONARY_TABLE} WHERE id = 1").fetchone()
+    return bytes(row[0]) if row is not None else None
+
+
+def chunk_text_sql(connection: sqlite3.Connection, alias: str = "c") -> str:
+    """Select list of (text, text_compressed) for `alias`, valid on indexes older than the column."""
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(chunks)").fetchall()}
+    compressed = f"{alias}.text_compressed" if "text_compressed" in columns else "NULL"
+    return f"{alias}.text, {compressed}"
+
+
+def stored_chunk_text(text: object, compressed: object, dictionary: bytes | None) -> str | None:
+    """Chunk text of a row selected with `chunk_text_sql`; None for a malformed row."""
+    if isinstance(compressed, bytes):
+        return decompress_text(compressed, dictionary or b"")
+    return text if isinstance(text, str) else None
+
+
+def _stored_texts(
+    connection: sqlite3.Connection,
+    where: str,
+    params: list[object],
+) -> list[tuple[int, str]]:
+    """(rowid, text) of the chunks `c` matching `where`, decompressed."""
+    dictionary = load_text_dictionary(connection)
+    rows = connection.execute(
+        f"SELECT c.rowid, {chunk_text_sql(connection)} FROM chunks c WHERE {where}",
+        params,
+    ).fetchall()
+    texts: list[tuple[int, str]] = []
+    for rowid, text, compressed in rows:
+        stored = stored_chunk_text(text, compressed, dictionary)
+        if stored is not None:
+            texts.append((int(rowid), stored))
+    return texts
+
+
+def _ensure_fts_index(connection: sqlite3.Connection) -> None:
+    if has_fts_index(connection):
+        return
+    try:
+        connection.execute(
+            f"""
+            CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                text,
+                content='',
+                tokenize="unicode61 tokenchars '-_'"
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: lexical/hybrid search degrades to vector only.
+        return
+    # Indexes created before FTS existed get backfilled once.
+    connection.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (?, ?)",
+        _stored_texts(connection, "1 = 1", []),
+    )
+    # Like the executescript above, leave no transaction open for the caller.
+    connection.commit()
+
+
+def _fts_delete(connection: sqlite3.Connection, where: str, params: list[object]) -> None:
+    if has_fts_index(connection):
+        # Contentless tables need the original text to remove its tokens; it
+        # goes through Python because stored texts may be compressed.
+        connection.executemany(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text) VALUES ('delete', ?, ?)",
+            _stored_texts(connection, where, params),
+        )
+
+
+def _fts_insert_chunks(
+    connection: sqlite3.Connection,
+    chunks: list[ChunkRecord],
+    *,
+    doc_id: str | None = None,
+) -> None:
+    """Index the just inserted `chunks` (of `doc_id`, or of the whole table)."""
+    if not chunks or not has_fts_index(connection):
+        return
+    texts = {chunk.chunk_id: chunk.text for chunk in chunks}
+    if doc_id is None:
+        rows = connection.execute("SELECT rowid, id FROM chunks").fetchall()
+    else:
+        rows = connection.execute("SELECT rowid, id FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+    connection.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (?, ?)",
+        [(rowid, texts[chunk_id]) for rowid, chunk_id in rows if chunk_id in texts],
+    )
+
+
+def build_fts_query(query_text: str) -> str | None:
+    """OR of quoted terms, so user input never reaches FTS5 query syntax."""
+    terms: list[str] = []
+    for token in _FTS_TOKEN_PATTERN.findall(query_text.lower()):
+        token = token.strip("-")
+        if token and token not in terms:
+            terms.append(token)
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def search_filters_sql(filters: SearchFilters | None) -> tuple[str, list[object]]:
+    """WHERE fragment over `documents d` for `filters` ("1 = 1" when unfiltered)."""
+    clauses: list[str] = []
+    params: list[object] = []
+    if filters is not None:
+        if filters.source_path_prefix:
+            clauses.append("d.source_path >= ? AND d.source_path < ?")
+            params.extend([filters.source_path_prefix, filters.source_path_prefix + _PREFIX_UPPER_BOUND])
+        if filters.source_path_glob:
+            clauses.append("d.source_path GLOB ?")
+            params.append(filters.source_path_glob)
+        if filters.doc_ids:
+            clauses.append(f"d.id IN ({','.join('?' for _ in filters.doc_ids)})")
+            params.extend(filters.doc_ids)
+    return " AND ".join(clauses) or "1 = 1", params
+
+
+def search_fts_rowids(
+    connection: sqlite3.Connection,
+    query_text: str,
+    *,
+    limit: int,
+    filters: SearchFilters | None = None,
+) -> list[int]:
+    """chunks.rowid values ordered by BM25 (best first); empty without FTS or matches."""
+    fts_query = build_fts_query(query_text)
+    if fts_query is None or not has_fts_index(connection):
+        return []
+    where, params = search_filters_sql(filters)
+    rows = connection.execute(
+        f"""
+        SELECT f.rowid
+        FROM {FTS_TABLE} f
+        JOIN chunks c ON c.rowid = f.rowid
+        JOIN documents d ON d.id = c.doc_id
+        WHERE {FTS_TABLE} MATCH ? AND {where}
+        ORDER BY bm25({FTS_TABLE}), f.rowid
+        LIMIT ?
+        """,
+        [fts_query, *params, limit],
+    ).fetchall()
+    return [int(row[0]) for row in rows]
+
+
+def get_index_meta(connection: sqlite3.Connection, key: str) -> str | None:
+    row = connection.execute("SELECT value FROM index_meta WHERE key = ?", (key,)).fetchone()
+    if row is None or not isinstance(row[0], str):
+        return None
+    return row[0]
+
+
+def set_index_meta(connection: sqlite3.Connection, key: str, value: str) -> None:
+    connection.execute(
+        """
+        INSERT INTO index_meta (key, value)
+        VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """,
+        (key, value),
+    )
+
+
+def delete_index_meta(connection: sqlite3.Connection, key: str) -> None:
+    connection.execute("DELETE FROM index_meta WHERE key = ?", (key,))
+
+
+def _insert_chunks(
+    connection: sqlite3.Connection,
+    chunks: list[ChunkRecord],
+    embeddings: list[list[float]],
+) -> None:
+    dictionary = load_text_dictionary(connection)
+    rows: list[tuple[object, ...]] = []
+    for chunk, embedding in zip(chunks, embeddings):
+        text: str = chunk.text
+        compressed = _compress_if_smaller(chunk.text, dictionary) if dictionary is not None else None
+        if compressed is not None:
+            text = ""
+        rows.append(
+            (
+                chunk.chunk_id,
+                chunk.doc_id,
+                _chunk_index(chunk),
+                text,
+                compressed,
+                len(chunk.text.split()),
+                sqlite3.Binary(_encode_embedding(embedding)),
+                len(embedding),
+                compute_content_hash(chunk.text),
+                chunk.heading_path,
+            )
+        )
+    connection.executemany(
+        """
+        INSERT INTO chunks (
+            id, doc_id, chunk_index, text, text_compressed, token_count, embedding, embedding_dim,
+            text_hash, heading_path
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+def _compress_if_smaller(text: str, dictionary: bytes) -> bytes | None:
+    compressed = compress_text(text, dictionary)
+    return compressed if len(compressed) < len(text.encode("utf-8")) else None
+
+
+def compress_chunk_texts(connection: sqlite3.Connection) -> int:
+    """Store chunk texts zlib-compressed with a dictionary trained on this index.
+
+    The dictionary is kept in TEXT_DICTIONARY_TABLE and later writes to the
+    index compress with it too. A dictionary that already exists (a resumed
+    staging DB) is reused so rows compressed earlier stay readable. Texts that
+    would not shrink stay plain. Returns the number of rows compressed; run
+    VACUUM afterwards to give the freed pages back.
+    """
+    dictionary = load_text_dictionary(connection)
+    if dictionary is None:
+        plain_rows = int(
+            connection.execute("SELECT COUNT(*) FROM chunks WHERE text_compressed IS NULL").fetchone()[0]
+        )
+        step = max(1, plain_rows // TEXT_TRAINING_SAMPLE_TEXTS)
+        sample = [
+            str(row[0])
+            for row in connection.execute(
+                "SELECT text FROM chunks WHERE text_compressed IS NULL AND rowid % ? = 0",
+                (step,),
+            )
+        ]
+        dictionary = train_text_dictionary(sample)
+        connection.execute(
+            f"INSERT INTO {TEXT_DICTIONARY_TABLE} (id, data) VALUES (1, ?)",
+            (sqlite3.Binary(dictionary),),
+        )
+
+    compressed_rows = 0
+    last_rowid = 0
+    while True:
+        rows = connection.execute(
+            """
+            SELECT rowid, text FROM chunks
+            WHERE text_compressed IS NULL AND rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+            """,
+            (last_rowid, _COMPRESS_BATCH_ROWS),
+        ).fetchall()
+        if not rows:
+            return compressed_rows
+        last_rowid = int(rows[-1][0])
+        updates = [
+            (sqlite3.Binary(compressed), rowid)
+            for rowid, text in rows
+            if (compressed := _compress_if_smaller(str(text), dictionary)) is not None
+        ]
+        connection.executemany("UPDATE chunks SET text = '', text_compressed = ? WHERE rowid = ?", updates)
+        compressed_rows += len(updates)
 
 
 def persist_sqlite_index(
@@ -90,54 +566,43 @@ def persist_sqlite_index(
 
     db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with sqlite3.connect(db_path) as connection:
+    with connect_sqlite(db_path) as connection:
         ensure_sqlite_schema(connection)
+        delete_index_meta(connection, VECTOR_SIDECAR_META)
+        if has_fts_index(connection):
+            connection.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')")
         connection.execute("DELETE FROM chunks")
         connection.execute("DELETE FROM documents")
 
-        connection.executemany(
-            "INSERT INTO documents (id, source_path, content_hash) VALUES (?, ?, ?)",
-            [
-                (document.doc_id, document.source_path, compute_content_hash(document.text))
-                for document in sorted(documents, key=lambda item: item.doc_id)
-            ],
-        )
-
         connection.executemany(
             """
-            INSERT INTO chunks (id, doc_id, chunk_index, text, token_count, embedding, embedding_dim)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO documents (id, source_path, content_hash, file_size, file_mtime_ns)
+            VALUES (?, ?, ?, ?, ?)
             """,
             [
                 (
-                    chunk.chunk_id,
-                    chunk.doc_id,
-                    _chunk_index(chunk),
-                    chunk.text,
-                    len(chunk.text.split()),
-                    sqlite3.Binary(_encode_embedding(embedding)),
-                    len(embedding),
+                    document.doc_id,
+                    document.source_path,
+                    compute_content_hash(document.text),
+                    document.file_size,
+                    document.file_mtime_ns,
                 )
-                for chunk, embedding in zip(chunks, embeddings)
+                for document in sorted(documents, key=lambda item: item.doc_id)
             ],
         )
 
+        _insert_chunks(connection, chunks, embeddings)
+        _fts_insert_chunks(connection, chunks)
+
     return db_path
 
 
-def get_documents_map_by_source_path(connection: sqlite3.Connection) -> dict[str, StoredDocument]:
-    rows = connection.execute(
-        """
-        SELECT id, source_path, content_hash
-        FROM documents
-        ORDER BY source_path
-        """
-    ).fetchall()
+def _stored_documents(rows: list[tuple[object, ...]]) -> dict[str, StoredDocument]:
     documents: dict[str, StoredDocument] = {}
     for row in rows:
-        if len(row) != 3:
+        if len(row) != 5:
             continue
-        doc_id, source_path, content_hash = row
+        doc_id, source_path, content_hash, file_size, file_mtime_ns = row
         if (
             not isinstance(doc_id, str)
             or not isinstance(source_path, str)
@@ -148,30 +613,97 @@ def get_documents_map_by_source_path(connection: sqlite3.Connection) -> dict[str
             doc_id=doc_id,
             source_path=source_path,
             content_hash=content_hash,
+            file_size=file_size if isinstance(file_size, int) else None,
+            file_mtime_ns=file_mtime_ns if isinstance(file_mtime_ns, int) else None,
         )
     return documents
 
 
+_STORED_DOCUMENT_COLUMNS = "id, source_path, content_hash, file_size, file_mtime_ns"
+
+
+def get_documents_map_by_source_path(connection: sqlite3.Connection) -> dict[str, StoredDocument]:
+    rows = connection.execute(
+        f"""
+        SELECT {_STORED_DOCUMENT_COLUMNS}
+        FROM documents
+        ORDER BY source_path
+        """
+    ).fetchall()
+    return _stored_documents(rows)
+
+
+def get_documents_for_source_paths(
+    connection: sqlite3.Connection,
+    *,
+    source_paths: list[str],
+    source_prefixes: list[str],
+) -> dict[str, StoredDocument]:
+    """Stored documents at exactly `source_paths` or under any of `source_prefixes`."""
+    rows: list[tuple[object, ...]] = []
+    for start in range(0, len(source_paths), _MAX_SQL_PARAMS):
+        batch = source_paths[start : start + _MAX_SQL_PARAMS]
+        rows.extend(
+            connection.execute(
+                f"""
+                SELECT {_STORED_DOCUMENT_COLUMNS}
+                FROM documents
+                WHERE source_path IN ({','.join('?' for _ in batch)})
+                """,
+                batch,
+            ).fetchall()
+        )
+    for prefix in source_prefixes:
+        rows.extend(
+            connection.execute(
+                f"""
+                SELECT {_STORED_DOCUMENT_COLUMNS}
+                FROM documents
+                WHERE source_path >= ? AND source_path < ?
+                """,
+                (prefix, prefix + _PREFIX_UPPER_BOUND),
+            ).fetchall()
+        )
+    return _stored_documents(rows)
+
+
 def upsert_document(
     connection: sqlite3.Connection,
     *,
     doc_id: str,
     source_path: str,
     content_hash: str,
+    file_size: int | None = None,
+    file_mtime_ns: int | None = None,
 ) -> None:
     connection.execute(
         """
-        INSERT INTO documents (id, source_path, content_hash)
-        VALUES (?, ?, ?)
+        INSERT INTO documents (id, source_path, content_hash, file_size, file_mtime_ns)
+        VALUES (?, ?, ?, ?, ?)
         ON CONFLICT(source_path) DO UPDATE SET
             id = excluded.id,
-            content_hash = excluded.content_hash
+            content_hash = excluded.content_hash,
+            file_size = excluded.file_size,
+            file_mtime_ns = excluded.file_mtime_ns
         """,
-        (doc_id, source_path, content_hash),
+        (doc_id, source_path, content_hash, file_size, file_mtime_ns),
+    )
+
+
+def update_document_stats(
+    connection: sqlite3.Connection,
+    stats: list[tuple[str, int, int | None]],
+) -> None:
+    """Record (doc_id, file_size, file_mtime_ns) for files whose content did not change."""
+    connection.executemany(
+        "UPDATE documents SET file_size = ?, file_mtime_ns = ? WHERE id = ?",
+        [(file_size, file_mtime_ns, doc_id) for doc_id, file_size, file_mtime_ns in stats],
     )
 
 
 def delete_document_and_chunks(connection: sqlite3.Connection, doc_id: str) -> None:
+    delete_index_meta(connection, VECTOR_SIDECAR_META)
+    _fts_delete(connection, "c.doc_id = ?", [doc_id])
     connection.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
     connection.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
 
@@ -186,29 +718,104 @@ def replace_chunks_for_doc(
     if len(chunks) != len(embeddings):
         raise ValueError("chunks and embeddings must have the same length")
 
+    delete_index_meta(connection, VECTOR_SIDECAR_META)
+    _fts_delete(connection, "c.doc_id = ?", [doc_id])
     connection.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
     if not chunks:
         return
 
+    _insert_chunks(connection, chunks, embeddings)
+    _fts_insert_chunks(connection, chunks, doc_id=doc_id)
+
+
+def update_chunks_for_doc(
+    connection: sqlite3.Connection,
+    *,
+    doc_id: str,
+    chunks: list[ChunkRecord],
+    embeddings: list[list[float]],
+) -> int:
+    """Like `replace_chunks_for_doc`, but writes only rows that differ.
+
+    Stored rows are matched to the new chunks by text hash and heading path,
+    in document order, so the position of a chunk does not matter:
+    - a matched row at the same position is left untouched;
+    - a matched row at another position (chunks inserted or removed before
+      it) only gets its id and chunk_index updated, keeping its rowid, text,
+      vector and FTS entry;
+    - only unmatched rows are deleted and only unmatched chunks inserted.
+    Returns the number of chunk rows inserted, moved or removed.
+    """
+    if len(chunks) != len(embeddings):
+        raise ValueError("chunks and embeddings must have the same length")
+
+    stored_by_key: dict[tuple[object, object], list[tuple[int, str]]] = {}
+    for rowid, chunk_id, text_hash, heading_path in connection.execute(
+        "SELECT rowid, id, text_hash, heading_path FROM chunks WHERE doc_id = ? ORDER BY chunk_index DESC",
+        (doc_id,),
+    ).fetchall():
+        # Reversed, so pop() hands out repeated texts in document order.
+        stored_by_key.setdefault((text_hash, heading_path), []).append((int(rowid), str(chunk_id)))
+
+    moved: list[tuple[int, ChunkRecord]] = []
+    inserted: list[tuple[ChunkRecord, list[float]]] = []
+    for chunk, embedding in zip(chunks, embeddings):
+        candidates = stored_by_key.get((compute_content_hash(chunk.text), chunk.heading_path))
+        if not candidates:
+            inserted.append((chunk, embedding))
+            continue
+        rowid, stored_id = candidates.pop()
+        if stored_id != chunk.chunk_id:
+            moved.append((rowid, chunk))
+    stale_rowids = [rowid for candidates in stored_by_key.values() for rowid, _ in candidates]
+    if not moved and not inserted and not stale_rowids:
+        return 0
+
+    delete_index_meta(connection, VECTOR_SIDECAR_META)
+    for start in range(0, len(stale_rowids), _MAX_SQL_PARAMS):
+        batch = stale_rowids[start : start + _MAX_SQL_PARAMS]
+        placeholders = ",".join("?" for _ in batch)
+        _fts_delete(connection, f"c.rowid IN ({placeholders})", list(batch))
+        connection.execute(f"DELETE FROM chunks WHERE rowid IN ({placeholders})", batch)
+
+    # Moved rows first park on keys no real chunk uses, so swapping positions
+    # never trips UNIQUE(id) or UNIQUE(doc_id, chunk_index) midway.
     connection.executemany(
-        """
-        INSERT INTO chunks (id, doc_id, chunk_index, text, token_count, embedding, embedding_dim)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        [
-            (
-                chunk.chunk_id,
-                chunk.doc_id,
-                _chunk_index(chunk),
-                chunk.text,
-                len(chunk.text.split()),
-                sqlite3.Binary(_encode_embedding(embedding)),
-                len(embedding),
-            )
-            for chunk, embedding in zip(chunks, embeddings)
-        ],
+        "UPDATE chunks SET id = ?, chunk_index = ? WHERE rowid = ?",
+        [(f"\x00moving-{rowid}", -1 - rowid, rowid) for rowid, _ in moved],
+    )
+    connection.executemany(
+        "UPDATE chunks SET id = ?, chunk_index = ? WHERE rowid = ?",
+        [(chunk.chunk_id, _chunk_index(chunk), rowid) for rowid, chunk in moved],
     )
 
+    inserted_chunks = [chunk for chunk, _ in inserted]
+    _insert_chunks(connection, inserted_chunks, [embedding for _, embedding in inserted])
+    _fts_insert_chunks(connection, inserted_chunks, doc_id=doc_id)
+    return len(inserted) + len(moved) + len(stale_rowids)
+
+
+def load_embeddings_by_text_hash(
+    connection: sqlite3.Connection,
+    text_hashes: list[str],
+) -> dict[str, list[float]]:
+    """Stored embeddings keyed by chunk text hash, for texts already in this index."""
+    embeddings: dict[str, list[float]] = {}
+    for start in range(0, len(text_hashes), _MAX_SQL_PARAMS):
+        batch = text_hashes[start : start + _MAX_SQL_PARAMS]
+        rows = connection.execute(
+            f"""
+            SELECT text_hash, embedding
+            FROM chunks
+            WHERE text_hash IN ({','.join('?' for _ in batch)})
+            """,
+            batch,
+        ).fetchall()
+        for text_hash, embedding_blob in rows:
+            if isinstance(text_hash, str) and isinstance(embedding_blob, bytes):
+                embeddings.setdefault(text_hash, _decode_embedding(embedding_blob))
+    return embeddings
+
 
 def sqlite_index_stats(connection: sqlite3.Connection) -> tuple[int, int, int]:
     documents_total = int(connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
@@ -219,22 +826,27 @@ def sqlite_index_stats(connection: sqlite3.Connection) -> tuple[int, int, int]:
     return documents_total, chunks_total, max_embedding_dim
 
 
-def load_sqlite_chunks(db_path: Path) -> list[StoredChunk]:
+def load_sqlite_chunks(db_path: Path, *, filters: SearchFilters | None = None) -> list[StoredChunk]:
     if not db_path.exists():
         raise FileNotFoundError(f"RAG sqlite index file not found: {db_path}")
 
-    with sqlite3.connect(db_path) as connection:
+    where, params = search_filters_sql(filters)
+    with connect_sqlite(db_path) as connection:
+        dictionary = load_text_dictionary(connection)
         rows = connection.execute(
-            """
-            SELECT c.id, d.source_path, c.text, c.embedding, c.embedding_dim
+            f"""
+            SELECT c.id, d.source_path, {chunk_text_sql(connection)}, c.embedding, c.embedding_dim
             FROM chunks c
             JOIN documents d ON d.id = c.doc_id
+            WHERE {where}
             ORDER BY c.id
-            """
+            """,
+            params,
         ).fetchall()
 
     chunks: list[StoredChunk] = []
-    for chunk_id, source_path, text, embedding_blob, embedding_dim in rows:
+    for chunk_id, source_path, stored_text, compressed, embedding_blob, embedding_dim in rows:
+        text = stored_chunk_text(stored_text, compressed, dictionary)
         if (
             not isinstance(chunk_id, str)
             or not isinstance(source_path, str)
@@ -257,3 +869,91 @@ def load_sqlite_chunks(db_path: Path) -> list[StoredChunk]:
             )
         )
     return chunks
+
+
+def iter_sqlite_vectors(
+    connection: sqlite3.Connection,
+    *,
+    filters: SearchFilters | None = None,
+) -> Iterator[tuple[int, list[float]]]:
+    """(rowid, embedding) per chunk in chunk id order, streamed without text or source_path."""
+    where, params = search_filters_sql(filters)
+    rows = connection.execute(
+        f"""
+        SELECT c.rowid, c.embedding, c.embedding_dim
+        FROM chunks c
+        JOIN documents d ON d.id = c.doc_id
+        WHERE {where}
+        ORDER BY c.id
+        """,
+        params,
+    )
+    for rowid, embedding_blob, embedding_dim in rows:
+        if not isinstance(embedding_blob, bytes) or not isinstance(embedding_dim, int):
+            continue
+        embedding = _decode_embedding(embedding_blob)
+        if len(embedding) == embedding_dim:
+            yield int(rowid), embedding
+
+
+def load_chunk_texts_by_rowid(connection: sqlite3.Connection, rowids: list[int]) -> dict[int, StoredChunkText]:
+    """Chunk id, source_path and text for `rowids` (rowid lookups, no vectors)."""
+    texts: dict[int, StoredChunkText] = {}
+    if not rowids:
+        return texts
+    dictionary = load_text_dictionary(connection)
+    text_columns = chunk_text_sql(connection)
+    for start in range(0, len(rowids), _MAX_SQL_PARAMS):
+        batch = rowids[start : start + _MAX_SQL_PARAMS]
+        rows = connection.execute(
+            f"""
+            SELECT c.rowid, c.id, d.source_path, {text_columns}
+            FROM chunks c
+            JOIN documents d ON d.id = c.doc_id
+            WHERE c.rowid IN ({','.join('?' for _ in batch)})
+            """,
+            batch,
+        ).fetchall()
+        for rowid, chunk_id, source_path, stored_text, compressed in rows:
+            text = stored_chunk_text(stored_text, compressed, dictionary)
+            if isinstance(chunk_id, str) and isinstance(source_path, str) and isinstance(text, str):
+                texts[int(rowid)] = StoredChunkText(chunk_id=chunk_id, source_path=source_path, text=text)
+    return texts
+
+
+def load_sqlite_chunks_by_rowid(connection: sqlite3.Connection, rowids: list[int]) -> dict[int, StoredChunk]:
+    if not rowids:
+        return {}
+    placeholders = ",".join("?" for _ in rowids)
+    dictionary = load_text_dictionary(connection)
+    rows = connection.execute(
+        f"""
+        SELECT c.rowid, c.id, d.source_path, {chunk_text_sql(connection)}, c.embedding, c.embedding_dim
+        FROM chunks c
+        JOIN documents d ON d.id = c.doc_id
+        WHERE c.rowid IN ({placeholders})
+        """,
+        rowids,
+    ).fetchall()
+
+    chunks: dict[int, StoredChunk] = {}
+    for rowid, chunk_id, source_path, stored_text, compressed, embedding_blob, embedding_dim in rows:
+        text = stored_chunk_text(stored_text, compressed, dictionary)
+        if (
+            not isinstance(chunk_id, str)
+            or not isinstance(source_path, str)
+            or not isinstance(text, str)
+            or not isinstance(embedding_blob, bytes)
+            or not isinstance(embedding_dim, int)
+        ):
+            continue
+        embedding = _decode_embedding(embedding_blob)
+        if len(embedding) != embedding_dim:
+            continue
+        chunks[int(rowid)] = StoredChunk(
+            chunk_id=chunk_id,
+            source_path=source_path,
+            text=text,
+            embedding=embedding,
+        )
+    return chunks
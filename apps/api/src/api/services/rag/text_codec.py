@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from collections import Counter
+import re
+import zlib
+
+# Chunk texts are compressed one by one with zlib and a preset dictionary
+# shared by the whole index. Chunks are short, so on their own they barely
+# compress; the dictionary supplies the sentences and words the manuals
+# repeat (warnings, table headers, part vocabulary) as back-references.
+TEXT_COMPRESSION_CHOICES = ("none", "zlib")
+# zlib only looks back 32 KiB, so a longer dictionary is never referenced.
+TEXT_DICTIONARY_MAX_BYTES = 32 * 1024
+_COMPRESSION_LEVEL = 9
+# Texts sampled evenly from the index for training.
+TEXT_TRAINING_SAMPLE_TEXTS = 4000
+_FRAGMENT_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n+")
+_MIN_WORD_CHARS = 4
+
+
+def _fragments(text: str) -> set[str]:
+    """Sentences/lines and longer words of `text`, counted once per text."""
+    fragments: set[str] = set()
+    for sentence in _FRAGMENT_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        fragments.add(sentence)
+        fragments.update(word for word in sentence.split() if len(word) >= _MIN_WORD_CHARS)
+    return fragments
+
+
+def train_text_dictionary(texts: list[str]) -> bytes:
+    """A zlib preset dictionary of the fragments that recur across `texts`.
+
+    Fragments are scored by the bytes they would save (occurrences beyond the
+    first times their length) and the best are packed up to
+    TEXT_DICTIONARY_MAX_BYTES, best last: zlib encodes near references more
+    cheaply. Empty when nothing recurs.
+    """
+    counts: Counter[str] = Counter()
+    for text in texts:
+        counts.update(_fragments(text))
+
+    scored = sorted(
+        (
+            ((count - 1) * len(fragment.encode("utf-8")), fragment)
+            for fragment, count in counts.items()
+            if count > 1
+        ),
+        reverse=True,
+    )
+    selected: list[bytes] = []
+    size = 0
+    for _, fragment in scored:
+        encoded = fragment.encode("utf-8")
+        if size + len(encoded) + 1 > TEXT_DICTIONARY_MAX_BYTES:
+            continue
+        selected.append(encoded)
+        size += len(encoded) + 1
+    return b"\n".join(reversed(selected))
+
+
+def compress_text(text: str, dictionary: bytes) -> bytes:
+    if dictionary:
+        compressor = zlib.compressobj(_COMPRESSION_LEVEL, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(_COMPRESSION_LEVEL)
+    return compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+
+def decompress_text(data: bytes, dictionary: bytes) -> str:
+    # A stream written without a dictionary ignores the one passed here.
+    if dictionary:
+        decompressor = zlib.decompressobj(zdict=dictionary)
+    else:
+        decompressor = zlib.decompressobj()
+    return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
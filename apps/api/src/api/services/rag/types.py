@@ -6,6 +6,9 @@ class SourceDocument:
     doc_id: str
     source_path: str
     text: str
+    # Stat of the source file when it was read; lets incremental scans skip it.
+    file_size: int | None = None
+    file_mtime_ns: int | None = None
 
 
 @dataclass(frozen=True)
@@ -14,6 +17,9 @@ class ChunkRecord:
     doc_id: str
     source_path: str
     text: str
+    # Headings enclosing the chunk, outermost first, joined by " > "
+    # (structured chunking only).
+    heading_path: str | None = None
 
 
 @dataclass(frozen=True)
@@ -30,3 +36,14 @@ class QueryHit:
     source_path: str
     text: str
     score: float
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    source_path_prefix: str | None = None
+    source_path_glob: str | None = None
+    doc_ids: tuple[str, ...] = ()
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.source_path_prefix or self.source_path_glob or self.doc_ids)
@@ -0,0 +1,698 @@
+from __future__ import annotations
+
+from array import array
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
+import hashlib
+import heapq
+from itertools import count
+import json
+import math
+import mmap
+from operator import itemgetter, mul
+import os
+from pathlib import Path
+import sqlite3
+import struct
+import sys
+from typing import Iterable, Iterator
+from uuid import uuid4
+
+from api.services.rag.sqlite_store import (
+    VECTOR_SIDECAR_META,
+    chunk_text_sql,
+    connect_sqlite,
+    delete_index_meta,
+    ensure_sqlite_schema,
+    get_index_meta,
+    load_text_dictionary,
+    search_filters_sql,
+    set_index_meta,
+    stored_chunk_text,
+)
+from api.services.rag.types import QueryHit, SearchFilters
+
+# Sidecar layout: a fixed header (magic + build token) followed by `count` rows of
+# `dim` unit-normalised values in native byte order. Row N belongs to the chunks
+# recorded with `vector_rows.row = N` in rag.db: chunks whose stored vectors are
+# identical (duplicate boilerplate) share one row, and a search returns the lowest
+# chunk id of a row. index_meta[VECTOR_SIDECAR_META] carries the same token, so a
+# sidecar from another build is never trusted. A full build writes rows in chunk
+# id order; an incremental run patches only the rows of the documents it
+# rewrote (patch_vector_sidecar), so afterwards row order is build order.
+#
+# Quantized dtypes store int8 codes per row followed by one float32 scale per row
+# (value ~= code * scale). They only rank candidates; the final order comes from
+# re-scoring the best `top_k * rerank_factor` rows with the full-precision BLOBs.
+SIDECAR_MAGIC = b"RAGVEC01"
+SIDECAR_HEADER_SIZE = 64
+SIDECAR_DTYPES = {"float32": "f", "float16": "e", "int8": "b"}
+QUANTIZED_DTYPES = frozenset({"int8"})
+SIDECAR_DISABLED = "none"
+_SCALE_FORMAT = "f"
+_INT8_MAX = 127
+_SQL_BATCH = 500
+
+
+@dataclass(frozen=True)
+class VectorSidecarInfo:
+    token: str
+    dtype: str
+    dim: int
+    count: int
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype in QUANTIZED_DTYPES
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * struct.calcsize(f"={SIDECAR_DTYPES[self.dtype]}")
+
+    @property
+    def codes_end(self) -> int:
+        return SIDECAR_HEADER_SIZE + self.count * self.row_bytes
+
+    @property
+    def file_size(self) -> int:
+        scales_bytes = self.count * struct.calcsize(f"={_SCALE_FORMAT}") if self.quantized else 0
+        return self.codes_end + scales_bytes
+
+    @property
+    def full_precision_bytes(self) -> int:
+        return self.count * self.dim * struct.calcsize("=f")
+
+
+def vector_sidecar_path(db_path: Path) -> Path:
+    if db_path.is_symlink():
+        # rag.db pointing at a generation: the sidecar sits next to its target.
+        db_path = db_path.resolve()
+    return db_path.with_name(f"{db_path.name}.vectors")
+
+
+def _normalize(values: list[float]) -> list[float]:
+    norm = math.sqrt(sum(value * value for value in values))
+    if norm == 0:
+        return values
+    return [value / norm for value in values]
+
+
+def _quantize(values: list[float]) -> tuple[list[int], float]:
+    peak = max((abs(value) for value in values), default=0.0)
+    if peak == 0:
+        return [0] * len(values), 0.0
+    scale = peak / _INT8_MAX
+    return [round(value / scale) for value in values], scale
+
+
+def _vector_digest(embedding_blob: bytes) -> bytes:
+    return hashlib.blake2b(embedding_blob, digest_size=16).digest()
+
+
+def _encode_row(
+    row_struct: struct.Struct,
+    embedding_blob: bytes,
+    *,
+    quantized: bool,
+) -> tuple[bytes, float | None]:
+    vector = array("f")
+    vector.frombytes(embedding_blob)
+    normalized = _normalize(vector.tolist())
+    if not quantized:
+        return row_struct.pack(*normalized), None
+    codes, scale = _quantize(normalized)
+    return row_struct.pack(*codes), scale
+
+
+def _info_json(info: VectorSidecarInfo) -> str:
+    return json.dumps(
+        {
+            "token": info.token,
+            "dtype": info.dtype,
+            "dim": info.dim,
+            "count": info.count,
+            "byteorder": sys.byteorder,
+        },
+        sort_keys=True,
+    )
+
+
+def _read_info(connection: sqlite3.Connection) -> VectorSidecarInfo | None:
+    raw = get_index_meta(connection, VECTOR_SIDECAR_META)
+    if raw is None:
+        return None
+    try:
+        payload = json.loads(raw)
+        info = VectorSidecarInfo(
+            token=str(payload["token"]),
+            dtype=str(payload["dtype"]),
+            dim=int(payload["dim"]),
+            count=int(payload["count"]),
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+    if info.dtype not in SIDECAR_DTYPES or payload.get("byteorder") != sys.byteorder:
+        return None
+    return info
+
+
+def _file_matches(path: Path, info: VectorSidecarInfo) -> bool:
+    try:
+        with path.open("rb") as handle:
+            header = handle.read(SIDECAR_HEADER_SIZE)
+            size = os.fstat(handle.fileno()).st_size
+    except OSError:
+        return False
+    expected_header = SIDECAR_MAGIC + info.token.encode("ascii")
+    return header.startswith(expected_header) and size == info.file_size
+
+
+def _reader(db_path: Path, connection: sqlite3.Connection | None) -> AbstractContextManager[sqlite3.Connection]:
+    """`connection` when the caller holds one open on `db_path`, else a new connection."""
+    return nullcontext(connection) if connection is not None else connect_sqlite(db_path)
+
+
+def read_vector_sidecar_info(
+    db_path: Path,
+    *,
+    connection: sqlite3.Connection | None = None,
+) -> VectorSidecarInfo | None:
+    """Return the sidecar description if rag.db and the sidecar file agree.
+
+    `connection` (already open on `db_path`) is used instead of opening the file again.
+    """
+    if connection is None and not db_path.exists():
+        return None
+    with _reader(db_path, connection) as reader:
+        try:
+            info = _read_info(reader)
+        except sqlite3.OperationalError:
+            return None
+    if info is None or not _file_matches(vector_sidecar_path(db_path), info):
+        return None
+    return info
+
+
+def remove_vector_sidecar(db_path: Path) -> None:
+    with connect_sqlite(db_path) as connection:
+        ensure_sqlite_schema(connection)
+        delete_index_meta(connection, VECTOR_SIDECAR_META)
+        connection.execute("DELETE FROM vector_rows")
+    vector_sidecar_path(db_path).unlink(missing_ok=True)
+
+
+def _iter_embedding_rows(connection: sqlite3.Connection, dim: int) -> Iterator[tuple[str, bytes]]:
+    cursor = connection.execute(
+        """
+        SELECT c.id, c.embedding
+        FROM chunks c
+        JOIN documents d ON d.id = c.doc_id
+        WHERE c.embedding_dim = ?
+        ORDER BY c.id
+        """,
+        (dim,),
+    )
+    for chunk_id, embedding_blob in cursor:
+        if isinstance(chunk_id, str) and isinstance(embedding_blob, bytes):
+            yield chunk_id, embedding_blob
+
+
+def write_vector_sidecar(db_path: Path, *, dtype: str) -> VectorSidecarInfo | None:
+    """(Re)build the sidecar for `db_path`; returns None when disabled or not applicable.
+
+    Indexes with mixed embedding dims keep using the BLOB column only.
+    """
+    if dtype == SIDECAR_DISABLED:
+        remove_vector_sidecar(db_path)
+        return None
+    if dtype not in SIDECAR_DTYPES:
+        raise ValueError(f"unsupported vector sidecar dtype: {dtype}")
+
+    with connect_sqlite(db_path) as connection:
+        ensure_sqlite_schema(connection)
+        dims = [
+            int(row[0])
+            for row in connection.execute("SELECT DISTINCT embedding_dim FROM chunks").fetchall()
+        ]
+    if len(dims) != 1 or dims[0] <= 0:
+        remove_vector_sidecar(db_path)
+        return None
+
+    dim = dims[0]
+    token = uuid4().hex
+    row_struct = struct.Struct(f"={dim}{SIDECAR_DTYPES[dtype]}")
+    sidecar_path = vector_sidecar_path(db_path)
+    tmp_path = sidecar_path.with_name(f"{sidecar_path.name}.tmp")
+    quantized = dtype in QUANTIZED_DTYPES
+    chunk_rows: list[tuple[str, int]] = []
+    rows_by_digest: dict[bytes, int] = {}
+    scales = array(_SCALE_FORMAT)
+
+    with connect_sqlite(db_path) as connection, tmp_path.open("wb") as handle:
+        handle.write((SIDECAR_MAGIC + token.encode("ascii")).ljust(SIDECAR_HEADER_SIZE, b"\0"))
+        for chunk_id, embedding_blob in _iter_embedding_rows(connection, dim):
+            digest = _vector_digest(embedding_blob)
+            row = rows_by_digest.get(digest)
+            if row is not None:
+                chunk_rows.append((chunk_id, row))
+                continue
+            rows_by_digest[digest] = len(rows_by_digest)
+            chunk_rows.append((chunk_id, rows_by_digest[digest]))
+            encoded, scale = _encode_row(row_struct, embedding_blob, quantized=quantized)
+            handle.write(encoded)
+            if scale is not None:
+                scales.append(scale)
+        if quantized:
+            handle.write(scales.tobytes())
+    os.replace(tmp_path, sidecar_path)
+
+    info = VectorSidecarInfo(token=token, dtype=dtype, dim=dim, count=len(rows_by_digest))
+    with connect_sqlite(db_path) as connection:
+        connection.execute("DELETE FROM vector_rows")
+        connection.executemany(
+            "INSERT INTO vector_rows (chunk_id, row) VALUES (?, ?)",
+            chunk_rows,
+        )
+        set_index_meta(connection, VECTOR_SIDECAR_META, _info_json(info))
+    return info
+
+
+def ensure_vector_sidecar(db_path: Path, *, dtype: str) -> VectorSidecarInfo | None:
+    """Rebuild the sidecar only if it is missing, stale or has a different dtype."""
+    info = read_vector_sidecar_info(db_path)
+    if info is not None and info.dtype == dtype:
+        return info
+    if info is None and dtype == SIDECAR_DISABLED and not vector_sidecar_path(db_path).exists():
+        return None
+    return write_vector_sidecar(db_path, dtype=dtype)
+
+
+def release_vector_rows(connection: sqlite3.Connection, doc_ids: list[str]) -> dict[bytes, int]:
+    """Detach the chunks of `doc_ids` from their sidecar rows before they are rewritten.
+
+    Returns the released rows keyed by the digest of their vector, for
+    `patch_vector_sidecar`. Like any chunk write it invalidates the sidecar, so
+    a run interrupted before the patch rebuilds it instead.
+    """
+    delete_index_meta(connection, VECTOR_SIDECAR_META)
+    released: dict[bytes, int] = {}
+    for start in range(0, len(doc_ids), _SQL_BATCH):
+        batch = doc_ids[start : start + _SQL_BATCH]
+        placeholders = ",".join("?" for _ in batch)
+        rows = connection.execute(
+            f"""
+            SELECT c.id, c.embedding, vr.row
+            FROM chunks c
+            JOIN vector_rows vr ON vr.chunk_id = c.id
+            WHERE c.doc_id IN ({placeholders})
+            """,
+            batch,
+        ).fetchall()
+        connection.executemany("DELETE FROM vector_rows WHERE chunk_id = ?", [(row[0],) for row in rows])
+        for _, embedding_blob, row in rows:
+            released[_vector_digest(bytes(embedding_blob))] = int(row)
+    return released
+
+
+def _unmapped_chunks(
+    connection: sqlite3.Connection,
+    doc_ids: list[str],
+) -> list[tuple[str, str | None, bytes, int]]:
+    chunks: list[tuple[str, str | None, bytes, int]] = []
+    for start in range(0, len(doc_ids), _SQL_BATCH):
+        batch = doc_ids[start : start + _SQL_BATCH]
+        placeholders = ",".join("?" for _ in batch)
+        chunks.extend(
+            (str(chunk_id), text_hash, bytes(embedding_blob), int(dim))
+            for chunk_id, text_hash, embedding_blob, dim in connection.execute(
+                f"""
+                SELECT c.id, c.text_hash, c.embedding, c.embedding_dim
+                FROM chunks c
+                LEFT JOIN vector_rows vr ON vr.chunk_id = c.id
+                WHERE c.doc_id IN ({placeholders}) AND vr.chunk_id IS NULL
+                """,
+                batch,
+            )
+        )
+    return sorted(chunks)
+
+
+def _referenced_rows(connection: sqlite3.Connection, rows: list[int]) -> set[int]:
+    referenced: set[int] = set()
+    for start in range(0, len(rows), _SQL_BATCH):
+        batch = rows[start : start + _SQL_BATCH]
+        placeholders = ",".join("?" for _ in batch)
+        referenced.update(
+            int(row[0])
+            for row in connection.execute(
+                f"SELECT DISTINCT row FROM vector_rows WHERE row IN ({placeholders})",
+                batch,
+            )
+        )
+    return referenced
+
+
+def patch_vector_sidecar(
+    db_path: Path,
+    base: VectorSidecarInfo,
+    *,
+    doc_ids: list[str],
+    released: dict[bytes, int],
+) -> VectorSidecarInfo | None:
+    """Bring the sidecar described by `base` up to date after only `doc_ids` changed.
+
+    `released` comes from `release_vector_rows`. Chunks whose vector is already
+    in the sidecar (unchanged or moved chunks, duplicate texts) get their old
+    row back; only vectors new to the index are encoded and written, into rows
+    no chunk uses any more or appended. Rows left unused are filled from the end
+    of the file, which is then truncated, so the sidecar stays dense. The cost
+    follows the edit, plus one pass over the per-row scales of quantized dtypes.
+    Falls back to a full rebuild when the file is not the one `base` describes
+    or a changed chunk has another embedding dim.
+    """
+    sidecar_path = vector_sidecar_path(db_path)
+    if not _file_matches(sidecar_path, base):
+        return write_vector_sidecar(db_path, dtype=base.dtype)
+    with connect_sqlite(db_path) as connection:
+        pending = _unmapped_chunks(connection, doc_ids)
+    if any(dim != base.dim for *_, dim in pending):
+        return write_vector_sidecar(db_path, dtype=base.dtype)
+
+    with connect_sqlite(db_path) as connection:
+        rows_by_digest = dict(released)
+        chunk_rows: list[tuple[str, int]] = []
+        new_vectors: dict[bytes, tuple[bytes, list[str]]] = {}
+        for chunk_id, text_hash, embedding_blob, _ in pending:
+            digest = _vector_digest(embedding_blob)
+            if digest in new_vectors:
+                new_vectors[digest][1].append(chunk_id)
+                continue
+            row = rows_by_digest.get(digest)
+            if row is None and text_hash is not None:
+                # A duplicate of a chunk outside the edited documents.
+                match = connection.execute(
+                    """
+                    SELECT vr.row
+                    FROM chunks c
+                    JOIN vector_rows vr ON vr.chunk_id = c.id
+                    WHERE c.text_hash = ? AND c.embedding = ?
+                    LIMIT 1
+                    """,
+                    (text_hash, embedding_blob),
+                ).fetchone()
+                row = int(match[0]) if match is not None else None
+            if row is None:
+                new_vectors[digest] = (embedding_blob, [chunk_id])
+                continue
+            rows_by_digest[digest] = row
+            chunk_rows.append((chunk_id, row))
+
+        released_rows = sorted(set(released.values()))
+        in_use = _referenced_rows(connection, released_rows) | {row for _, row in chunk_rows}
+        free_rows = [row for row in released_rows if row not in in_use]
+        count = base.count
+        writes: dict[int, bytes] = {}
+        for embedding_blob, chunk_ids in new_vectors.values():
+            if free_rows:
+                row = free_rows.pop(0)
+            else:
+                row = count
+                count += 1
+            writes[row] = embedding_blob
+            chunk_rows.extend((chunk_id, row) for chunk_id in chunk_ids)
+
+        # Leftover free rows: drop them at the tail, fill the others with the
+        # last rows of the file.
+        moves: dict[int, int] = {}
+        while free_rows:
+            last = count - 1
+            count -= 1
+            if free_rows[-1] == last:
+                free_rows.pop()
+            else:
+                moves[last] = free_rows.pop(0)
+
+        info = VectorSidecarInfo(token=uuid4().hex, dtype=base.dtype, dim=base.dim, count=count)
+        row_struct = struct.Struct(f"={base.dim}{SIDECAR_DTYPES[base.dtype]}")
+        scales = array(_SCALE_FORMAT)
+        with sidecar_path.open("r+b") as handle:
+            if info.quantized:
+                handle.seek(base.codes_end)
+                scales.frombytes(handle.read(base.count * scales.itemsize))
+                if count > len(scales):
+                    scales.extend([0.0] * (count - len(scales)))
+            for source, target in moves.items():
+                if source in writes:
+                    writes[target] = writes.pop(source)
+                    continue
+                handle.seek(SIDECAR_HEADER_SIZE + source * info.row_bytes)
+                encoded = handle.read(info.row_bytes)
+                handle.seek(SIDECAR_HEADER_SIZE + target * info.row_bytes)
+                handle.write(encoded)
+                if info.quantized:
+                    scales[target] = scales[source]
+            for row, embedding_blob in writes.items():
+                encoded, scale = _encode_row(row_struct, embedding_blob, quantized=info.quantized)
+                handle.seek(SIDECAR_HEADER_SIZE + row * info.row_bytes)
+                handle.write(encoded)
+                if scale is not None:
+                    scales[row] = scale
+            if info.quantized:
+                del scales[count:]
+                handle.seek(info.codes_end)
+                handle.write(scales.tobytes())
+            handle.truncate(info.file_size)
+            handle.seek(0)
+            handle.write((SIDECAR_MAGIC + info.token.encode("ascii")).ljust(SIDECAR_HEADER_SIZE, b"\0"))
+
+        connection.executemany(
+            "UPDATE vector_rows SET row = ? WHERE row = ?",
+            [(target, source) for source, target in moves.items()],
+        )
+        connection.executemany(
+            "INSERT INTO vector_rows (chunk_id, row) VALUES (?, ?)",
+            [(chunk_id, moves.get(row, row)) for chunk_id, row in chunk_rows],
+        )
+        set_index_meta(connection, VECTOR_SIDECAR_META, _info_json(info))
+    return info
+
+
+def move_vector_sidecar(source_db_path: Path, target_db_path: Path) -> None:
+    """Follow an `os.replace(source_db_path, target_db_path)` with its sidecar.
+
+    Between the two renames readers see a token mismatch and fall back to BLOBs.
+    """
+    source = vector_sidecar_path(source_db_path)
+    target = vector_sidecar_path(target_db_path)
+    if source.exists():
+        os.replace(source, target)
+    else:
+        target.unlink(missing_ok=True)
+
+
+def _scan_rows(
+    rows_view: memoryview,
+    scales_view: memoryview[float] | None,
+    row_struct: struct.Struct,
+    query: list[float],
+    limit: int,
+    row_ids: list[int] | None,
+) -> list[tuple[int, float]]:
+    # iter_unpack decodes one row at a time straight from the mapped pages;
+    # nothing per-row outlives its score. With `row_ids` only those rows are
+    # unpacked (by offset), so a filtered scan touches just the matching pages.
+    # nlargest keeps row (= chunk id) order on ties. The iterators holding buffer
+    # exports die with this frame.
+    if row_ids is None:
+        ids: Iterable[int] = count()
+        rows: Iterable[tuple[float, ...]] = row_struct.iter_unpack(rows_view)
+        scales: Iterable[float] | None = scales_view
+    else:
+        ids = row_ids
+        rows = (row_struct.unpack_from(rows_view, row * row_struct.size) for row in row_ids)
+        scales = None if scales_view is None else (scales_view[row] for row in row_ids)
+    if scales is None:
+        scores = (sum(map(mul, query, row)) for row in rows)
+    else:
+        scores = (scale * sum(map(mul, query, row)) for scale, row in zip(scales, rows))
+    return heapq.nlargest(limit, zip(ids, scores), key=itemgetter(1))
+
+
+def _top_rows(
+    view: memoryview,
+    info: VectorSidecarInfo,
+    query: list[float],
+    limit: int,
+    row_ids: list[int] | None = None,
+) -> list[tuple[int, float]]:
+    row_struct = struct.Struct(f"={info.dim}{SIDECAR_DTYPES[info.dtype]}")
+    with view[SIDECAR_HEADER_SIZE : info.codes_end] as rows_view:
+        if not info.quantized:
+            return _scan_rows(rows_view, None, row_struct, query, limit, row_ids)
+        with view[info.codes_end : info.file_size] as scales_bytes:
+            with scales_bytes.cast(_SCALE_FORMAT) as scales_view:
+                return _scan_rows(rows_view, scales_view, row_struct, query, limit, row_ids)
+
+
+def open_vector_sidecar(db_path: Path, info: VectorSidecarInfo) -> mmap.mmap | None:
+    """Map the sidecar read-only; None if the file is missing or from another build.
+
+    The file descriptor is closed right away (mmap keeps its own), and the mapping
+    closes when its last reference is dropped, so a cached mapping can be evicted
+    while another thread is still scanning it.
+    """
+    try:
+        with vector_sidecar_path(db_path).open("rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < info.file_size or not _mapped_token_matches(mapped, info):
+        mapped.close()
+        return None
+    return mapped
+
+
+def _mapped_token_matches(mapped: mmap.mmap, info: VectorSidecarInfo) -> bool:
+    return mapped[: len(SIDECAR_MAGIC) + len(info.token)] == SIDECAR_MAGIC + info.token.encode("ascii")
+
+
+def _filtered_rows(connection: sqlite3.Connection, filters: SearchFilters) -> list[int]:
+    # CROSS JOIN pins the join order to documents -> chunks -> vector_rows so the
+    # filter is resolved through idx_documents_source_path; with an ORDER BY on
+    # vr.row the planner would otherwise scan every vector row instead.
+    where, params = search_filters_sql(filters)
+    rows = connection.execute(
+        f"""
+        SELECT DISTINCT vr.row
+        FROM documents d
+        CROSS JOIN chunks c
+        CROSS JOIN vector_rows vr
+        WHERE c.doc_id = d.id AND vr.chunk_id = c.id AND {where}
+        """,
+        params,
+    ).fetchall()
+    return sorted(int(row[0]) for row in rows)
+
+
+def _exact_score(query: list[float], embedding_blob: bytes) -> float:
+    vector = array("f")
+    vector.frombytes(embedding_blob)
+    return sum(map(mul, query, _normalize(vector.tolist())))
+
+
+def rank_vector_sidecar(
+    db_path: Path,
+    info: VectorSidecarInfo,
+    *,
+    query_embedding: list[float],
+    top_k: int,
+    rerank_factor: int = 1,
+    filters: SearchFilters | None = None,
+    mapped: mmap.mmap | None = None,
+    connection: sqlite3.Connection | None = None,
+) -> list[tuple[int, str, str, str, float]] | None:
+    """Return (row, chunk_id, source_path, text, score) for the best rows.
+
+    `filters` are resolved to sidecar rows in SQL first; only those rows are
+    scored. `mapped` reuses a mapping from `open_vector_sidecar` instead of
+    mapping the file for this call, and `connection` an open connection to
+    `db_path` instead of new ones. None means the sidecar no longer matches
+    rag.db (or the query dim differs) and the caller should use the BLOB path.
+    """
+    if len(query_embedding) != info.dim:
+        return None
+    if info.count == 0:
+        return []
+
+    filtered_rows: list[int] | None = None
+    if filters is not None and not filters.is_empty:
+        with _reader(db_path, connection) as reader:
+            if _read_info(reader) != info:
+                return None
+            filtered_rows = _filtered_rows(reader, filters)
+        if not filtered_rows:
+            return []
+
+    query = _normalize([float(value) for value in query_embedding])
+    limit = max(1, top_k)
+    candidate_limit = limit * max(1, rerank_factor) if info.quantized else limit
+    if mapped is None:
+        with vector_sidecar_path(db_path).open("rb") as handle:
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as own_mapping:
+                if not _mapped_token_matches(own_mapping, info):
+                    return None
+                with memoryview(own_mapping) as view:
+                    candidates = _top_rows(view, info, query, candidate_limit, filtered_rows)
+    else:
+        if not _mapped_token_matches(mapped, info):
+            return None
+        with memoryview(mapped) as view:
+            candidates = _top_rows(view, info, query, candidate_limit, filtered_rows)
+
+    row_ids = [row for row, _ in candidates]
+    placeholders = ",".join("?" for _ in row_ids)
+    where, params = search_filters_sql(filters)
+    with _reader(db_path, connection) as reader:
+        if _read_info(reader) != info:
+            return None
+        dictionary = load_text_dictionary(reader)
+        rows = reader.execute(
+            f"""
+            SELECT vr.row, c.id, d.source_path, {chunk_text_sql(reader)}, c.embedding
+            FROM vector_rows vr
+            JOIN chunks c ON c.id = vr.chunk_id
+            JOIN documents d ON d.id = c.doc_id
+            WHERE vr.row IN ({placeholders}) AND {where}
+            ORDER BY c.id
+            """,
+            [*row_ids, *params],
+        ).fetchall()
+
+    # A shared row stands for all of its duplicate chunks; each gets its score.
+    chunks_by_row: dict[int, list[tuple[str, str, str, bytes]]] = {}
+    for row, chunk_id, source_path, stored_text, compressed, embedding_blob in rows:
+        text = stored_chunk_text(stored_text, compressed, dictionary)
+        chunks_by_row.setdefault(int(row), []).append(
+            (str(chunk_id), str(source_path), str(text), bytes(embedding_blob))
+        )
+    if len(chunks_by_row) != len(row_ids):
+        return None
+
+    ranked: list[tuple[int, str, str, str, float]] = []
+    for row, approximate_score in candidates:
+        row_chunks = chunks_by_row[row]
+        score = _exact_score(query, row_chunks[0][3]) if info.quantized else approximate_score
+        ranked.extend((row, chunk_id, source_path, text, score) for chunk_id, source_path, text, _ in row_chunks)
+    if info.quantized:
+        ranked.sort(key=lambda item: (-item[4], item[0]))
+    return ranked[:limit]
+
+
+def search_vector_sidecar(
+    db_path: Path,
+    info: VectorSidecarInfo,
+    *,
+    query_embedding: list[float],
+    top_k: int,
+    rerank_factor: int = 1,
+    filters: SearchFilters | None = None,
+    mapped: mmap.mmap | None = None,
+    connection: sqlite3.Connection | None = None,
+) -> list[QueryHit] | None:
+    """Score against the mapped sidecar; None means the caller should use the BLOB path."""
+    ranked = rank_vector_sidecar(
+        db_path,
+        info,
+        query_embedding=query_embedding,
+        top_k=top_k,
+        rerank_factor=rerank_factor,
+        filters=filters,
+        mapped=mapped,
+        connection=connection,
+    )
+    if ranked is None:
+        return None
+    return [
+        QueryHit(chunk_id=chunk_id, source_path=source_path, text=text, score=score)
+        for _, chunk_id, source_path, text, score in ranked
+    ]
@@ -1,19 +1,44 @@
 from __future__ import annotations
 
 import argparse
+from array import array
+import heapq
 import json
+import math
+from operator import mul
 from pathlib import Path
 import sqlite3
 import sys
 from typing import Any, TypedDict
 
 from api.config import get_settings
+from api.services.rag.collection import resolve_collection
 from api.services.rag.embedding_client import EmbeddingClient, OllamaEmbeddingClient
+from api.services.rag.generations import current_generation
 from api.services.rag.query import search_index
+from api.services.rag.sqlite_store import (
+    chunk_text_sql,
+    connect_sqlite,
+    iter_sqlite_vectors,
+    load_chunk_texts_by_rowid,
+    load_text_dictionary,
+    stored_chunk_text,
+)
+from api.services.rag.vector_sidecar import (
+    SIDECAR_DISABLED,
+    VectorSidecarInfo,
+    rank_vector_sidecar,
+    read_vector_sidecar_info,
+    vector_sidecar_path,
+)
+from api.tracing import runner_span
+
+RECALL_TOP_K = 10
 
 
 class VerifyIndexResult(TypedDict):
     db_path: str
+    generation: int | None
     documents: int
     chunks: int
     min_embedding_dim: int
@@ -22,6 +47,17 @@ class VerifyIndexResult(TypedDict):
     expected_embedding_dim: int
     sample_query: str
     sample_query_hits: int
+    vector_sidecar: str
+    vector_sidecar_bytes: int
+    full_precision_bytes: int
+    memory_savings_ratio: float | None
+    sidecar_recall_at_k: float | None
+    sidecar_recall_probes: int
+    text_compression: str
+    text_bytes: int
+    stored_text_bytes: int
+    text_dictionary_bytes: int
+    text_compression_ratio: float | None
 
 
 def _build_parser() -> argparse.ArgumentParser:
@@ -32,7 +68,12 @@ def _build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--payload-json",
         default=None,
-        help="Optional JSON object payload with runtime overrides (db_path/index_dir/expected_embed_dim/sample_query)",
+        help="Optional JSON object payload with runtime overrides (collection/db_path/index_dir/expected_embed_dim/sample_query/recall_probes)",
+    )
+    parser.add_argument(
+        "--job-id",
+        default=None,
+        help="Queue job id for compatibility with queue runners (currently unused)",
     )
     return parser
 
@@ -68,7 +109,7 @@ def _read_int(connection: sqlite3.Connection, query: str) -> int:
 
 
 def _validate_sqlite(db_path: Path, *, expected_embed_dim: int) -> tuple[int, int, list[int]]:
-    with sqlite3.connect(db_path) as connection:
+    with connect_sqlite(db_path) as connection:
         tables = _read_required_tables(connection)
         required_tables = {"documents", "chunks"}
         missing = sorted(required_tables - tables)
@@ -100,6 +141,27 @@ def _validate_sqlite(db_path: Path, *, expected_embed_dim: int) -> tuple[int, in
     return documents_count, chunks_count, dims
 
 
+def _measure_text_storage(db_path: Path) -> tuple[str, int, int, int]:
+    """(compression, UTF-8 text bytes, bytes stored for them, dictionary bytes).
+
+    Every compressed text is decompressed, so a corrupt row fails verification.
+    """
+    text_bytes = 0
+    stored_bytes = 0
+    with connect_sqlite(db_path) as connection:
+        dictionary = load_text_dictionary(connection)
+        rows = connection.execute(f"SELECT {chunk_text_sql(connection)} FROM chunks c")
+        for text, compressed in rows:
+            decoded = stored_chunk_text(text, compressed, dictionary)
+            if decoded is None:
+                raise ValueError("verify failed: chunk row without text")
+            text_bytes += len(decoded.encode("utf-8"))
+            stored_bytes += len(compressed) if isinstance(compressed, bytes) else len(str(text).encode("utf-8"))
+    if dictionary is None:
+        return "none", text_bytes, stored_bytes, 0
+    return "zlib", text_bytes, stored_bytes, len(dictionary)
+
+
 def _run_sample_query(
     *,
     sample_query: str,
@@ -124,6 +186,100 @@ def _run_sample_query(
     return hit_count
 
 
+def _sample_stored_vectors(db_path: Path, *, dim: int, count: int) -> list[list[float]]:
+    """Stored vectors of `dim` at up to `count` rowids spread evenly over the chunks table."""
+    with connect_sqlite(db_path) as connection:
+        low, high = connection.execute("SELECT MIN(rowid), MAX(rowid) FROM chunks").fetchone()
+        if low is None or high is None:
+            return []
+        step = max(1, (int(high) - int(low) + 1) // count)
+        vectors: dict[int, list[float]] = {}
+        for target in range(int(low), int(high) + 1, step):
+            row = connection.execute(
+                "SELECT rowid, embedding FROM chunks WHERE rowid >= ? AND embedding_dim = ? ORDER BY rowid LIMIT 1",
+                (target, dim),
+            ).fetchone()
+            if row is not None and isinstance(row[1], bytes):
+                vector = array("f")
+                vector.frombytes(row[1])
+                vectors[int(row[0])] = vector.tolist()
+            if len(vectors) >= count:
+                break
+    return list(vectors.values())
+
+
+def _exact_top_chunk_ids(db_path: Path, probes: list[list[float]], *, dim: int) -> list[set[str]]:
+    """Exact cosine top-k chunk ids per probe, from one streaming pass over the BLOBs.
+
+    Each probe keeps a bounded heap of (score, -position, rowid), so memory does
+    not grow with the index and ties go to the lower chunk id, as in search.
+    """
+    normalized = []
+    for probe in probes:
+        norm = math.sqrt(sum(value * value for value in probe))
+        normalized.append([value / norm for value in probe] if norm else probe)
+    heaps: list[list[tuple[float, int, int]]] = [[] for _ in probes]
+    with connect_sqlite(db_path) as connection:
+        for position, (rowid, embedding) in enumerate(iter_sqlite_vectors(connection)):
+            if len(embedding) != dim:
+                continue
+            norm = math.sqrt(sum(value * value for value in embedding))
+            for heap, probe in zip(heaps, normalized):
+                score = sum(map(mul, probe, embedding)) / norm if norm else 0.0
+                item = (score, -position, rowid)
+                if len(heap) < RECALL_TOP_K:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        texts = load_chunk_texts_by_rowid(connection, sorted({rowid for heap in heaps for _, _, rowid in heap}))
+    return [{texts[rowid].chunk_id for _, _, rowid in heap if rowid in texts} for heap in heaps]
+
+
+def _measure_sidecar(
+    *,
+    db_path: Path,
+    sample_query: str,
+    embedding_client: EmbeddingClient,
+    recall_probes: int,
+    rerank_factor: int,
+) -> tuple[VectorSidecarInfo | None, float | None, int]:
+    """Compare sidecar ranking with exact cosine over the BLOBs.
+
+    Probes are the sample query plus stored vectors at rowids spread evenly
+    over the index, so recall is measured even when the sample query is empty.
+    """
+    info = read_vector_sidecar_info(db_path)
+    if info is None or recall_probes <= 0:
+        return info, None, 0
+
+    probe_embeddings: list[list[float]] = []
+    if sample_query.strip():
+        probe_embeddings.extend(embedding_client.embed_texts([sample_query.strip()]))
+    probe_embeddings.extend(_sample_stored_vectors(db_path, dim=info.dim, count=recall_probes))
+    probe_embeddings = [embedding for embedding in probe_embeddings if len(embedding) == info.dim][:recall_probes]
+    if not probe_embeddings:
+        return info, None, 0
+
+    expected_by_probe = _exact_top_chunk_ids(db_path, probe_embeddings, dim=info.dim)
+    recalls: list[float] = []
+    for probe, expected in zip(probe_embeddings, expected_by_probe):
+        ranked = rank_vector_sidecar(
+            db_path,
+            info,
+            query_embedding=probe,
+            top_k=RECALL_TOP_K,
+            rerank_factor=rerank_factor,
+        )
+        if ranked is None:
+            raise ValueError("verify failed: vector sidecar changed during recall check")
+        returned = {chunk_id for _, chunk_id, _, _, _ in ranked}
+        recalls.append(len(expected & returned) / max(1, len(expected)))
+
+    if not recalls:
+        return info, None, 0
+    return info, round(sum(recalls) / len(recalls), 4), len(recalls)
+
+
 def run_verify_index_job(
     *,
     db_path: Path,
@@ -131,25 +287,41 @@ def run_verify_index_job(
     expected_embed_dim: int,
     sample_query: str,
     embedding_client: EmbeddingClient,
+    recall_probes: int = 16,
 ) -> VerifyIndexResult:
-    if not db_path.exists():
+    current = current_generation(db_path)
+    if current is None:
         raise FileNotFoundError(
             f"verify failed: rag db not found at {db_path}. Run reindex first."
         )
+    # Every check reads the generation current at start, even if a reindex
+    # publishes a new one meanwhile.
+    generation_db_path = current.db_path
 
     documents_count, chunks_count, dims = _validate_sqlite(
-        db_path,
+        generation_db_path,
         expected_embed_dim=expected_embed_dim,
     )
     sample_query_hits = _run_sample_query(
         sample_query=sample_query,
         index_dir=index_dir,
-        db_path=db_path,
+        db_path=generation_db_path,
+        embedding_client=embedding_client,
+    )
+    sidecar, sidecar_recall, sidecar_probes = _measure_sidecar(
+        db_path=generation_db_path,
+        sample_query=sample_query,
         embedding_client=embedding_client,
+        recall_probes=recall_probes,
+        rerank_factor=get_settings().rag_rerank_factor,
     )
+    sidecar_bytes = vector_sidecar_path(generation_db_path).stat().st_size if sidecar is not None else 0
+    full_precision_bytes = sidecar.full_precision_bytes if sidecar is not None else 0
+    text_compression, text_bytes, stored_text_bytes, dictionary_bytes = _measure_text_storage(generation_db_path)
 
     return {
         "db_path": str(db_path),
+        "generation": current.generation,
         "documents": documents_count,
         "chunks": chunks_count,
         "min_embedding_dim": min(dims),
@@ -158,18 +330,46 @@ def run_verify_index_job(
         "expected_embedding_dim": expected_embed_dim,
         "sample_query": sample_query,
         "sample_query_hits": sample_query_hits,
+        "vector_sidecar": sidecar.dtype if sidecar is not None else SIDECAR_DISABLED,
+        "vector_sidecar_bytes": sidecar_bytes,
+        "full_precision_bytes": full_precision_bytes,
+        "memory_savings_ratio": (
+            round(1 - sidecar_bytes / full_precision_bytes, 4) if full_precision_bytes else None
+        ),
+        "sidecar_recall_at_k": sidecar_recall,
+        "sidecar_recall_probes": sidecar_probes,
+        "text_compression": text_compression,
+        "text_bytes": text_bytes,
+        "stored_text_bytes": stored_text_bytes,
+        "text_dictionary_bytes": dictionary_bytes,
+        # Original over stored size; the shared dictionary is counted once.
+        "text_compression_ratio": (
+            round(text_bytes / (stored_text_bytes + dictionary_bytes), 4)
+            if stored_text_bytes + dictionary_bytes
+            else None
+        ),
     }
 
 
-def main() -> None:
+def _payload_collection(payload: dict[str, object]) -> str | None:
+    value = payload.get("collection")
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("collection must be a string")
+    return value
+
+
+def _main() -> None:
     parser = _build_parser()
     args = parser.parse_args()
     settings = get_settings()
 
     try:
         payload = _resolve_payload(args.payload_json)
-        db_path = Path(str(payload.get("db_path", settings.rag_db_path)))
-        index_dir = Path(str(payload.get("index_dir", settings.rag_index_dir)))
+        collection = resolve_collection(_payload_collection(payload), settings)
+        db_path = Path(str(payload.get("db_path", collection.db_path)))
+        index_dir = Path(str(payload.get("index_dir", collection.index_dir)))
         expected_embed_dim = _payload_int(
             payload,
             "expected_embed_dim",
@@ -177,10 +377,11 @@ def main() -> None:
             minimum=0,
         )
         sample_query = str(payload.get("sample_query", settings.rag_verify_sample_query))
+        recall_probes = _payload_int(payload, "recall_probes", 16, minimum=0)
 
         embedding_client = OllamaEmbeddingClient(
             base_url=settings.ollama_embed_base_url,
-            model=settings.ollama_embed_model,
+            model=collection.embed_model,
             timeout_seconds=settings.ollama_timeout_seconds,
         )
 
@@ -190,12 +391,18 @@ def main() -> None:
             expected_embed_dim=expected_embed_dim,
             sample_query=sample_query,
             embedding_client=embedding_client,
+            recall_probes=recall_probes,
         )
     except Exception as exc:
         print(f"[rag-verify-index-runner] failed: {exc}", file=sys.stderr, flush=True)
         raise SystemExit(1) from exc
 
-    print(json.dumps(metrics), flush=True)
+    print(json.dumps({**metrics, "collection": collection.name}), flush=True)
+
+
+def main() -> None:
+    with runner_span("rag_verify_index"):
+        _main()
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@ from typing import TypedDict
 import httpx
 
 from api.config import get_settings
+from api.tracing import http_client_span, runner_span
 
 
 class WarmupResult(TypedDict):
@@ -30,6 +31,11 @@ def _build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Optional JSON payload for compatibility with queue runners (currently unused)",
     )
+    parser.add_argument(
+        "--job-id",
+        default=None,
+        help="Queue job id for compatibility with queue runners (currently unused)",
+    )
     return parser
 
 
@@ -78,8 +84,10 @@ def _probe(
     start = perf_counter()
 
     try:
-        response = httpx.post(url, json=payload, timeout=timeout_seconds)
-        response.raise_for_status()
+        with http_client_span("POST", url, {"gen_ai.request.model": model}) as span:
+            response = httpx.post(url, json=payload, timeout=timeout_seconds)
+            span.set_attribute("http.response.status_code", response.status_code)
+            response.raise_for_status()
     except httpx.HTTPStatusError as exc:
         raise RuntimeError(
             f"{label} probe failed for model '{model}': {_format_http_status_error(exc)}. "
@@ -136,7 +144,7 @@ def run_warmup_job() -> WarmupResult:
     }
 
 
-def main() -> None:
+def _main() -> None:
     parser = _build_parser()
     args = parser.parse_args()
 
@@ -150,5 +158,10 @@ def main() -> None:
     print(json.dumps(result), flush=True)
 
 
+def main() -> None:
+    with runner_span("ollama_warmup"):
+        _main()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+from pathlib import Path
+import select
+import struct
+from time import monotonic, sleep
+from typing import Callable, Protocol
+
+from api.services.rag.job_control import CancellationToken
+from api.services.rag.loader import SUPPORTED_EXTENSIONS, scan_source_files
+
+# inotify(7) event bits.
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_BUFFER_BYTES = 64 * 1024
+
+
+class SourceChanges:
+    """Relative source paths touched since the last drain; `rescan` means events were lost."""
+
+    def __init__(self) -> None:
+        self.paths: set[str] = set()
+        self.rescan = False
+
+    def __bool__(self) -> bool:
+        return bool(self.paths) or self.rescan
+
+
+class SourceWatcher(Protocol):
+    def poll(self, timeout_seconds: float) -> SourceChanges: ...
+
+    def close(self) -> None: ...
+
+
+class InotifyWatcher:
+    """Recursive inotify watch on `source_dir` (Linux), via libc through ctypes.
+
+    Paths are reported relative to `source_dir`. Directory events report the
+    directory itself; the indexer expands it to the files underneath.
+    """
+
+    def __init__(self, source_dir: Path) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        self._source_dir = source_dir
+        self._dirs_by_wd: dict[int, str] = {}
+        self._add_tree("")
+
+    def _add_watch(self, relative_dir: str) -> None:
+        path = self._source_dir / relative_dir if relative_dir else self._source_dir
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(error, f"inotify_add_watch failed for {path}")
+        self._dirs_by_wd[wd] = relative_dir
+
+    def _add_tree(self, relative_dir: str) -> None:
+        self._add_watch(relative_dir)
+        root = self._source_dir / relative_dir if relative_dir else self._source_dir
+        for current, dirnames, _ in os.walk(root):
+            for dirname in dirnames:
+                child = (Path(current) / dirname).relative_to(self._source_dir).as_posix()
+                self._add_watch(child)
+
+    def poll(self, timeout_seconds: float) -> SourceChanges:
+        changes = SourceChanges()
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout_seconds))
+        if not readable:
+            return changes
+        while True:
+            try:
+                buffer = os.read(self._fd, _READ_BUFFER_BYTES)
+            except BlockingIOError:
+                break
+            if not buffer:
+                break
+            self._parse(buffer, changes)
+        return changes
+
+    def _parse(self, buffer: bytes, changes: SourceChanges) -> None:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if mask & _IN_Q_OVERFLOW:
+                changes.rescan = True
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs_by_wd.pop(wd, None)
+                continue
+            parent = self._dirs_by_wd.get(wd)
+            if parent is None or mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                if parent == "":
+                    # The source root itself went away or moved.
+                    changes.rescan = True
+                continue
+            relative_path = f"{parent}/{name}" if parent else name
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # Files may land before the new watch exists; the indexer
+                    # scans the whole directory.
+                    self._add_tree(relative_path)
+                changes.paths.add(relative_path)
+            elif Path(name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                changes.paths.add(relative_path)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback watcher: stats every supported file each `interval_seconds` and diffs."""
+
+    def __init__(self, source_dir: Path, *, interval_seconds: float) -> None:
+        self._source_dir = source_dir
+        self._interval_seconds = interval_seconds
+        self._snapshot = self._stat_all()
+        self._next_scan = monotonic() + interval_seconds
+
+    def _stat_all(self) -> dict[str, tuple[int, int]]:
+        return {
+            source_file.source_path: (source_file.size, source_file.mtime_ns)
+            for source_file in scan_source_files(self._source_dir)
+        }
+
+    def poll(self, timeout_seconds: float) -> SourceChanges:
+        changes = SourceChanges()
+        wait = self._next_scan - monotonic()
+        if wait > timeout_seconds:
+            sleep(timeout_seconds)
+            return changes
+        sleep(max(0.0, wait))
+        self._next_scan = monotonic() + self._interval_seconds
+
+        snapshot = self._stat_all()
+        changes.paths.update(
+            source_path
+            for source_path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(source_path) != self._snapshot.get(source_path)
+        )
+        self._snapshot = snapshot
+        return changes
+
+    def close(self) -> None:
+        return None
+
+
+def create_source_watcher(
+    source_dir: Path,
+    *,
+    poll_interval_seconds: float,
+    force_polling: bool = False,
+) -> SourceWatcher:
+    if not force_polling:
+        try:
+            return InotifyWatcher(source_dir)
+        except OSError:
+            pass
+    return PollingWatcher(source_dir, interval_seconds=poll_interval_seconds)
+
+
+def watch_source_changes(
+    watcher: SourceWatcher,
+    apply_changes: Callable[[set[str] | None], None],
+    *,
+    debounce_seconds: float,
+    max_delay_seconds: float,
+    cancel_token: CancellationToken,
+    on_error: Callable[[Exception], None] | None = None,
+    tick_seconds: float = 0.2,
+) -> None:
+    """Batch watcher events and hand them to `apply_changes` until cancelled.
+
+    A batch is applied once no event arrived for `debounce_seconds` (an editor
+    save or a copy of many files settles first), or after `max_delay_seconds`
+    of continuous changes. `None` asks for a full rescan after lost events.
+    When `apply_changes` raises, the error goes to `on_error` and the batch is
+    kept: it is merged with later events and retried after another debounce.
+    """
+    pending: set[str] = set()
+    rescan = False
+    first_event: float | None = None
+    last_event = 0.0
+    while not cancel_token.is_cancelled():
+        changes = watcher.poll(tick_seconds)
+        now = monotonic()
+        if changes:
+            pending |= changes.paths
+            rescan = rescan or changes.rescan
+            last_event = now
+            if first_event is None:
+                first_event = now
+        if first_event is None:
+            continue
+        if now - last_event >= debounce_seconds or now - first_event >= max_delay_seconds:
+            try:
+                apply_changes(None if rescan else pending)
+            except Exception as exc:
+                if cancel_token.is_cancelled():
+                    return
+                if on_error is not None:
+                    on_error(exc)
+                first_event = last_event = now
+                continue
+            pending = set()
+            rescan = False
+            first_event = None
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import ContextManager
+
+
+class StageTimings:
+    """Wall time per named stage of one request, in the order stages first ran.
+
+    A stage entered more than once (e.g. two scoring passes) accumulates.
+    """
+
+    def __init__(self) -> None:
+        self._started = perf_counter()
+        self._stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + (perf_counter() - start) * 1000
+
+    def total_ms(self) -> float:
+        return (perf_counter() - self._started) * 1000
+
+    def as_dict(self) -> dict[str, float]:
+        """Stage durations in ms plus `total` (time since this object was created)."""
+        return {
+            **{name: round(duration, 3) for name, duration in self._stages.items()},
+            "total": round(self.total_ms(), 3),
+        }
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing response header."""
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in self.as_dict().items())
+
+
+def timed_stage(timings: StageTimings | None, name: str) -> ContextManager[None]:
+    return timings.stage(name) if timings is not None else nullcontext()
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import re
+import secrets
+import sys
+from threading import Lock
+from time import time_ns
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api.config import get_settings
+
+# Spans follow the OpenTelemetry data model with W3C trace-context ids, so a
+# trace crosses the API, the jobs row, the worker and the runner subprocess.
+# Each finished span is one JSON line: printed to stdout (TRACE_EXPORTER=stdout)
+# or appended to TRACE_FILE (TRACE_EXPORTER=file). No collector is needed.
+# Carries the parent span into runner subprocesses (OTel env carrier name).
+TRACEPARENT_ENV = "TRACEPARENT"
+SPAN_EVENT = "span"
+_TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_MAX_STATEMENT_CHARS = 500
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_export_lock = Lock()
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        *,
+        trace_id: str,
+        parent_span_id: str | None,
+        kind: str,
+        attributes: Mapping[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.error: str | None = None
+        self.start_time_unix_nano = time_ns()
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    @property
+    def traceparent(self) -> str | None:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException | str) -> None:
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        end_time_unix_nano = time_ns()
+        _export(
+            {
+                "event": SPAN_EVENT,
+                "service": get_settings().trace_service_name,
+                "name": self.name,
+                "kind": self.kind,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_span_id": self.parent_span_id,
+                "start_time_unix_nano": self.start_time_unix_nano,
+                "end_time_unix_nano": end_time_unix_nano,
+                "duration_ms": round((end_time_unix_nano - self.start_time_unix_nano) / 1e6, 3),
+                "status": "error" if self.error is not None else "ok",
+                "error": self.error,
+                "attributes": self.attributes,
+            }
+        )
+
+
+class _NonRecordingSpan(Span):
+    """Stands in when tracing is off or there is no trace to join; records nothing."""
+
+    def __init__(self) -> None:
+        pass
+
+    @property
+    def recording(self) -> bool:
+        return False
+
+    @property
+    def traceparent(self) -> str | None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException | str) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_NON_RECORDING_SPAN = _NonRecordingSpan()
+
+
+def tracing_enabled() -> bool:
+    return get_settings().trace_exporter != "none"
+
+
+def _export(record: dict[str, Any]) -> None:
+    settings = get_settings()
+    line = json.dumps(record, default=str) + "\n"
+    with _export_lock:
+        if settings.trace_exporter == "file":
+            with open(settings.trace_file, "a", encoding="utf-8") as handle:
+                handle.write(line)
+        else:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """(trace_id, parent span_id) of a W3C traceparent, or None when absent or malformed."""
+    if not value:
+        return None
+    match = _TRACEPARENT_PATTERN.match(value.strip().lower())
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+def current_span() -> Span:
+    return _current_span.get() or _NON_RECORDING_SPAN
+
+
+def begin_span(
+    name: str,
+    *,
+    parent: str | None = None,
+    root: bool = False,
+    kind: str = "internal",
+    attributes: Mapping[str, Any] | None = None,
+) -> Span:
+    """A started span that the caller must end(); it does not become current.
+
+    The parent is the `parent` traceparent when valid, else the current span.
+    Without either, only `root` spans (request, job and runner entry points)
+    start a new trace; DB and HTTP calls outside any trace are not recorded.
+    """
+    if not tracing_enabled():
+        return _NON_RECORDING_SPAN
+    remote_parent = parse_traceparent(parent)
+    if remote_parent is not None:
+        trace_id, parent_span_id = remote_parent
+    else:
+        local_parent = _current_span.get()
+        if local_parent is not None:
+            trace_id, parent_span_id = local_parent.trace_id, local_parent.span_id
+        elif root:
+            trace_id, parent_span_id = secrets.token_hex(16), None
+        else:
+            return _NON_RECORDING_SPAN
+    return Span(name, trace_id=trace_id, parent_span_id=parent_span_id, kind=kind, attributes=attributes)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    *,
+    parent: str | None = None,
+    root: bool = False,
+    kind: str = "internal",
+    attributes: Mapping[str, Any] | None = None,
+) -> Iterator[Span]:
+    """Run the block inside a new current span; an escaping exception marks it as an error."""
+    span = begin_span(name, parent=parent, root=root, kind=kind, attributes=attributes)
+    if not span.recording:
+        yield span
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        if not (isinstance(exc, SystemExit) and exc.code in (None, 0)):
+            span.record_error(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+@contextmanager
+def runner_span(job_type: str) -> Iterator[Span]:
+    """Root span of a job runner subprocess, joining the worker's trace via TRACEPARENT."""
+    with start_span(
+        f"runner {job_type}",
+        parent=os.environ.get(TRACEPARENT_ENV),
+        root=True,
+        attributes={"job.type": job_type},
+    ) as span:
+        yield span
+
+
+@contextmanager
+def http_client_span(
+    method: str,
+    url: str,
+    attributes: Mapping[str, Any] | None = None,
+) -> Iterator[Span]:
+    with start_span(
+        f"{method} {url}",
+        kind="client",
+        attributes={"http.request.method": method, "url.full": url, **(attributes or {})},
+    ) as span:
+        yield span
+
+
+def db_client_span(system: str, statement: str) -> Span:
+    """A started client span for one SQL statement, named like `sqlite SELECT`."""
+    span = begin_span(system, kind="client")
+    if span.recording:
+        words = statement.split()
+        span.name = f"{system} {words[0].upper()}" if words else system
+        span.set_attribute("db.system", system)
+        span.set_attribute("db.statement", " ".join(words)[:_MAX_STATEMENT_CHARS])
+    return span
+
+
+@contextmanager
+def db_statement_span(system: str, statement: str) -> Iterator[Span]:
+    span = db_client_span(system, statement)
+    try:
+        yield span
+    except BaseException as exc:
+        span.record_error(exc)
+        raise
+    finally:
+        span.end()
+
+
+def instrument_engine(engine: Engine) -> Engine:
+    """Record a client span for every statement `engine` runs inside a trace."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+    ) -> None:
+        conn.info.setdefault("trace_spans", []).append(db_client_span(engine.dialect.name, statement))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+    ) -> None:
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context: Any) -> None:
+        connection = exception_context.connection
+        spans = connection.info.get("trace_spans") if connection is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_error(exception_context.original_exception)
+            span.end()
+
+    return engine
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import sys
+
+from api.config import get_settings
+from api.services.rag.collection import resolve_collection
+from api.services.rag.embedding_client import OllamaEmbeddingClient
+from api.services.rag.incremental_reindex_job_runner import (
+    run_incremental_reindex_job,
+    run_path_reindex,
+)
+from api.services.rag.job_control import JobCancelledError, install_sigterm_cancellation
+from api.services.rag.watcher import create_source_watcher, watch_source_changes
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(
+        prog="rag-watch",
+        description="Watch the RAG source directory and incrementally index changed documents",
+    )
+    parser.add_argument(
+        "--collection",
+        default=None,
+        help="Named collection from RAG_COLLECTIONS (sets source dir, db path and embed model)",
+    )
+    parser.add_argument(
+        "--source-dir",
+        default=None,
+        help=f"Source directory containing .txt/.md documents (default: {settings.rag_source_dir})",
+    )
+    parser.add_argument(
+        "--db-path",
+        default=None,
+        help=f"SQLite index to update (default: {settings.rag_db_path})",
+    )
+    parser.add_argument(
+        "--debounce-seconds",
+        type=float,
+        default=2.0,
+        help="Quiet period before a batch of changes is indexed",
+    )
+    parser.add_argument(
+        "--max-delay-seconds",
+        type=float,
+        default=30.0,
+        help="Index a batch after this long even if files keep changing",
+    )
+    parser.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=5.0,
+        help="Scan interval of the polling fallback",
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Use the polling fallback even where inotify is available (e.g. network filesystems)",
+    )
+    return parser
+
+
+def main() -> None:
+    parser = _build_parser()
+    args = parser.parse_args()
+    settings = get_settings()
+    cancel_token = install_sigterm_cancellation()
+
+    try:
+        collection = resolve_collection(args.collection, settings)
+        source_dir = Path(args.source_dir) if args.source_dir else collection.source_dir
+        embedding_client = OllamaEmbeddingClient(
+            base_url=settings.ollama_embed_base_url,
+            model=collection.embed_model,
+            timeout_seconds=settings.ollama_timeout_seconds,
+        )
+        common = {
+            "source_dir": source_dir,
+            "db_path": Path(args.db_path) if args.db_path else collection.db_path,
+            "chunk_size": settings.rag_chunk_size,
+            "chunk_overlap": settings.rag_chunk_overlap,
+            "chunk_strategy": settings.rag_chunk_strategy,
+            "embedding_client": embedding_client,
+            "embed_model": collection.embed_model,
+            "cancel_token": cancel_token,
+        }
+
+        # Watch first so nothing changed during the catch-up scan is missed.
+        watcher = create_source_watcher(
+            source_dir,
+            poll_interval_seconds=args.poll_seconds,
+            force_polling=args.polling,
+        )
+        print(
+            f"[rag-watch] watching source_dir={source_dir} "
+            f"watcher={type(watcher).__name__} collection={collection.name}",
+            flush=True,
+        )
+        print(json.dumps(run_incremental_reindex_job(**common)), flush=True)
+
+        def apply_changes(changed_paths: set[str] | None) -> None:
+            if changed_paths is None:
+                metrics = run_incremental_reindex_job(**common)
+            else:
+                metrics = run_path_reindex(changed_paths=changed_paths, **common)
+            print(json.dumps(metrics), flush=True)
+
+        def report_failure(exc: Exception) -> None:
+            # The batch stays pending and is retried; keep watching.
+            print(f"[rag-watch] apply failed, will retry: {exc}", file=sys.stderr, flush=True)
+
+        try:
+            watch_source_changes(
+                watcher,
+                apply_changes,
+                debounce_seconds=args.debounce_seconds,
+                max_delay_seconds=args.max_delay_seconds,
+                cancel_token=cancel_token,
+                on_error=report_failure,
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+    except JobCancelledError:
+        # SIGTERM during the catch-up run (or while waiting for the writer lock).
+        return
+    except Exception as exc:
+        print(f"[rag-watch] failed: {exc}", file=sys.stderr, flush=True)
+        raise SystemExit(1) from exc
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,18 @@ from fastapi.testclient import TestClient
 from api.config import get_settings
 from api.db import Base, get_engine
 from api.main import app
+from api.services.rag.collection import get_loaded_index_cache
 
 
 @pytest.fixture(autouse=True)
 def reset_api_caches() -> Iterator[None]:
     get_settings.cache_clear()
     get_engine.cache_clear()
+    get_loaded_index_cache.cache_clear()
     yield
     get_settings.cache_clear()
     get_engine.cache_clear()
+    get_loaded_index_cache.cache_clear()
 
 
 @pytest.fixture
@@ -1,4 +1,6 @@
+import json
 from pathlib import Path
+from time import sleep
 
 import pytest
 from fastapi.testclient import TestClient
@@ -79,11 +81,16 @@ def test_ask_endpoint_returns_answer_sources_and_meta(
     assert isinstance(payload["sources"], list)
     assert payload["sources"]
     assert {"chunk_id", "source_path", "score", "text"}.issubset(payload["sources"][0].keys())
+    timings_ms = payload["meta"].pop("timings_ms")
+    assert {"embed", "score", "llm", "total"}.issubset(timings_ms)
+    assert timings_ms["total"] >= timings_ms["llm"]
+    assert response.headers["server-timing"].split(", ")[-1].startswith("total;dur=")
     assert payload["meta"] == {
         "provider": "ollama",
         "model": "fake-model",
         "used_fallback": False,
         "retrieval_k": 2,
+        "collection": "default",
         "retrieved_count": len(payload["sources"]),
         "ollama_base_url": "http://ollama:11434/v1",
     }
@@ -162,3 +169,47 @@ def test_ask_endpoint_validates_k_bounds(client: TestClient) -> None:
     response = client.post("/ask", json={"question": "hello", "k": 0})
 
     assert response.status_code == 422
+
+
+class SlowLLMClient:
+    def generate_answer(self, *, question: str, context: str) -> ChatResult:
+        sleep(0.02)
+        return ChatResult(answer="slow answer", model="fake-model", used_fallback=False)
+
+
+def test_ask_endpoint_logs_slow_request_with_stage_timings(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    index_dir = tmp_path / "rag_index"
+    source_dir = tmp_path / "sample_docs"
+    source_dir.mkdir(parents=True)
+    (source_dir / "ops.md").write_text("predictive maintenance", encoding="utf-8")
+    ingest_documents(
+        source_dir=source_dir,
+        db_path=index_dir / "rag.db",
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+    monkeypatch.setenv("RAG_INDEX_DIR", str(index_dir))
+    monkeypatch.setenv("RAG_DB_PATH", str(index_dir / "rag.db"))
+    monkeypatch.setenv("API_SLOW_REQUEST_MS", "10")
+    get_settings.cache_clear()
+
+    app.dependency_overrides[get_llm_client] = lambda: SlowLLMClient()
+    app.dependency_overrides[get_embedding_client] = lambda: FakeEmbeddingClient()
+    try:
+        response = client.post("/ask", json={"question": "maintenance?"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    logged = [json.loads(line) for line in capsys.readouterr().err.splitlines() if line.startswith("{")]
+    assert len(logged) == 1
+    assert logged[0]["event"] == "slow_request"
+    assert logged[0]["route"] == "/ask"
+    assert logged[0]["timings_ms"]["llm"] >= 20
+    assert logged[0]["timings_ms"] == response.json()["meta"]["timings_ms"]
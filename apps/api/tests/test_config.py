@@ -1,3 +1,5 @@
+import pytest
+
 from api.config import get_settings
 
 
@@ -40,3 +42,23 @@ def test_rag_verify_sample_query_default_and_override(monkeypatch) -> None:
     monkeypatch.setenv("RAG_VERIFY_SAMPLE_QUERY", "quality inspection")
     settings = get_settings()
     assert settings.rag_verify_sample_query == "quality inspection"
+
+
+def test_rag_collections_parse_and_validate(monkeypatch) -> None:
+    monkeypatch.setenv(
+        "RAG_COLLECTIONS",
+        '{"plant_a": {"source_dir": "data/plant_a", "embed_model": "bge-m3"}}',
+    )
+    settings = get_settings()
+    assert settings.rag_collections == {"plant_a": {"source_dir": "data/plant_a", "embed_model": "bge-m3"}}
+    assert settings.rag_collection_cache_size == 4
+
+    for invalid in (
+        '{"default": {"source_dir": "x"}}',
+        '{"plant_b": {}}',
+        '{"plant_c": {"source_dir": "x", "dbpath": "y"}}',
+    ):
+        get_settings.cache_clear()
+        monkeypatch.setenv("RAG_COLLECTIONS", invalid)
+        with pytest.raises(ValueError):
+            get_settings()
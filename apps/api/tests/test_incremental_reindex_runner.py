@@ -1,10 +1,21 @@
+from contextlib import closing
+import os
 from pathlib import Path
 import sqlite3
+import time
 
+import pytest
+
+from api.services.rag import incremental_reindex_job_runner as incremental_runner
+from api.services.rag import loader
 from api.services.rag.chunker import chunk_documents
-from api.services.rag.incremental_reindex_job_runner import run_incremental_reindex_job
+from api.services.rag.incremental_reindex_job_runner import (
+    IncrementalReindexResult,
+    run_incremental_reindex_job,
+)
+from api.services.rag.job_control import ProgressReporter
 from api.services.rag.loader import load_documents
-from api.services.rag.sqlite_store import persist_sqlite_index
+from api.services.rag.sqlite_store import compute_content_hash, persist_sqlite_index
 
 
 class TrackingEmbeddingClient:
@@ -94,3 +105,371 @@ def test_incremental_reindex_updates_only_changed_docs_and_deletes_removed(tmp_p
 
     assert removed_doc_rows == 0
     assert removed_chunk_rows == 0
+
+
+class FailingAfterEmbeddingClient:
+    def __init__(self, dimensions: int, *, fail_on_call: int) -> None:
+        self._dimensions = dimensions
+        self._fail_on_call = fail_on_call
+        self.calls = 0
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.calls == self._fail_on_call:
+            raise RuntimeError("embedding server timeout")
+        return [[1.0] * self._dimensions for _ in texts]
+
+
+def test_incremental_reindex_commits_per_document_checkpoints(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "a.md").write_text("first document", encoding="utf-8")
+    (source_dir / "b.md").write_text("second document", encoding="utf-8")
+    (source_dir / "c.md").write_text("third document", encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    with pytest.raises(RuntimeError, match="embedding server timeout"):
+        run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=500,
+            chunk_overlap=50,
+            embedding_client=FailingAfterEmbeddingClient(dimensions=3, fail_on_call=3),
+            embed_model="fake-embed",
+        )
+
+    # Checkpoints land in the working copy; nothing half-done is published.
+    assert not db_path.exists()
+    with closing(sqlite3.connect(db_path.with_name("rag.db.next"))) as connection:
+        committed = [
+            row[0]
+            for row in connection.execute(
+                "SELECT source_path FROM documents ORDER BY source_path"
+            ).fetchall()
+        ]
+    assert committed == ["a.md", "b.md"]
+
+    retry_client = TrackingEmbeddingClient(dimensions=3)
+    progress_events: list[dict[str, object]] = []
+    metrics = run_incremental_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=500,
+        chunk_overlap=50,
+        embedding_client=retry_client,
+        embed_model="fake-embed",
+        progress=ProgressReporter(
+            phase="scanning",
+            emit=progress_events.append,
+            min_interval_seconds=0,
+        ),
+    )
+
+    assert metrics["unchanged"] == 2
+    assert metrics["new"] == 1
+    assert retry_client.calls == ["third document"]
+    assert metrics["generation"] == 1
+    assert progress_events[0]["docs_total"] == 1
+    assert progress_events[-1]["docs_done"] == 1
+    assert progress_events[-1]["chunks_done"] == 1
+
+
+def test_hash_source_file_matches_stripped_content_hash(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(loader, "_HASH_BLOCK_CHARS", 4)
+    cases = {
+        "plain.md": "alpha beta",
+        "padded.md": "\n\n  alpha   \n\n   beta  \r\n\n  ",
+        "empty.md": " \n\t \n",
+    }
+    for name, text in cases.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+
+    for source_file in loader.scan_source_files(tmp_path):
+        document = loader.read_source_document(source_file)
+        expected = compute_content_hash(document.text) if document is not None else None
+        assert loader.hash_source_file(source_file) == expected
+
+
+def test_incremental_reindex_skips_reading_files_with_unchanged_stat(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "a.md").write_text("first document", encoding="utf-8")
+    (source_dir / "b.md").write_text("second document", encoding="utf-8")
+    # Older than the racy-mtime window, so the stat is recorded on first index.
+    for path in source_dir.iterdir():
+        os.utime(path, ns=(time.time_ns(), time.time_ns() - 60_000_000_000))
+    db_path = tmp_path / "rag" / "rag.db"
+
+    def run() -> dict[str, object]:
+        return dict(
+            run_incremental_reindex_job(
+                source_dir=source_dir,
+                db_path=db_path,
+                chunk_size=500,
+                chunk_overlap=50,
+                embedding_client=ConstantEmbeddingClient(dimensions=3),
+                embed_model="fake-embed",
+            )
+        )
+
+    assert run()["new"] == 2
+
+    hashed: list[str] = []
+    original_hash = incremental_runner.hash_source_file
+
+    def tracking_hash(source_file: loader.SourceFile) -> str | None:
+        hashed.append(source_file.source_path)
+        return original_hash(source_file)
+
+    monkeypatch.setattr(incremental_runner, "hash_source_file", tracking_hash)
+    metrics = run()
+    assert (metrics["unchanged"], metrics["hashed_files"], hashed) == (2, 0, [])
+
+    # Touched but identical: hashed once, then its new stat is recorded.
+    stat = (source_dir / "a.md").stat()
+    os.utime(source_dir / "a.md", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000_000))
+    metrics = run()
+    assert (metrics["unchanged"], metrics["updated"], hashed) == (2, 0, ["a.md"])
+    assert run()["hashed_files"] == 0
+    assert hashed == ["a.md"]
+
+
+def test_incremental_reindex_rehashes_files_modified_within_racy_window(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "fresh.md").write_text("just written", encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    for expected_hashed in (1, 1):
+        metrics = run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=500,
+            chunk_overlap=50,
+            embedding_client=ConstantEmbeddingClient(dimensions=3),
+            embed_model="fake-embed",
+        )
+        assert metrics["hashed_files"] == expected_hashed
+
+    assert metrics["unchanged"] == 1
+
+
+def test_path_reindex_touches_only_changed_paths(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    (source_dir / "manuals").mkdir(parents=True)
+    (source_dir / "keep.md").write_text("keep content stable", encoding="utf-8")
+    (source_dir / "edit.md").write_text("edit before change", encoding="utf-8")
+    (source_dir / "manuals" / "old.md").write_text("old manual", encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+    run_incremental_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=500,
+        chunk_overlap=50,
+        embedding_client=ConstantEmbeddingClient(dimensions=3),
+        embed_model="fake-embed",
+    )
+
+    (source_dir / "edit.md").write_text("edit after change", encoding="utf-8")
+    (source_dir / "manuals" / "old.md").unlink()
+    (source_dir / "manuals").rmdir()
+    (source_dir / "added" / "nested").mkdir(parents=True)
+    (source_dir / "added" / "nested" / "new.md").write_text("new manual", encoding="utf-8")
+
+    hashed: list[str] = []
+    original_hash = incremental_runner.hash_source_file
+
+    def tracking_hash(source_file: loader.SourceFile) -> str | None:
+        hashed.append(source_file.source_path)
+        return original_hash(source_file)
+
+    monkeypatch.setattr(incremental_runner, "hash_source_file", tracking_hash)
+    embedding_client = TrackingEmbeddingClient(dimensions=3)
+    metrics = incremental_runner.run_path_reindex(
+        source_dir=source_dir,
+        db_path=db_path,
+        changed_paths={"edit.md", "manuals", "added"},
+        chunk_size=500,
+        chunk_overlap=50,
+        embedding_client=embedding_client,
+        embed_model="fake-embed",
+    )
+
+    assert metrics["mode"] == "paths"
+    assert (metrics["new"], metrics["updated"], metrics["removed"]) == (1, 1, 1)
+    assert metrics["scanned_files"] == 2
+    assert "keep.md" not in hashed
+    assert sorted(embedding_client.calls) == ["edit after change", "new manual"]
+    with sqlite3.connect(db_path) as connection:
+        source_paths = [
+            row[0]
+            for row in connection.execute("SELECT source_path FROM documents ORDER BY source_path")
+        ]
+    assert source_paths == ["added/nested/new.md", "edit.md", "keep.md"]
+
+
+class WritingDuringEmbeddingClient:
+    """Writes to the index from another connection while each embedding call is in flight."""
+
+    def __init__(self, db_path: Path) -> None:
+        self._db_path = db_path
+        self.calls = 0
+        self.journal_modes: list[str] = []
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        with closing(sqlite3.connect(self._db_path, timeout=0)) as connection, connection:
+            self.journal_modes.append(connection.execute("PRAGMA journal_mode").fetchone()[0])
+            # Fails with "database is locked" if the reindex holds the write lock.
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('probe', ?)", (str(self.calls),))
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+
+def test_incremental_reindex_embeds_outside_write_transactions_in_wal_mode(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "a.md").write_text("first document", encoding="utf-8")
+    (source_dir / "b.md").write_text("second document", encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    # The run writes into the working copy that becomes the next generation.
+    embedding_client = WritingDuringEmbeddingClient(db_path.with_name("rag.db.next"))
+    metrics = run_incremental_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=500,
+        chunk_overlap=50,
+        embedding_client=embedding_client,
+        embed_model="fake-embed",
+    )
+
+    assert (metrics["new"], embedding_client.calls) == (2, 2)
+    assert embedding_client.journal_modes == ["wal", "wal"]
+    with sqlite3.connect(db_path) as connection:
+        # Published generations are immutable and leave WAL mode.
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert connection.execute("SELECT value FROM index_meta WHERE key = 'probe'").fetchone()[0] == "2"
+
+
+def test_incremental_reindex_rewrites_only_edited_chunks(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    sections = [f"# Step {index}\n\nCheck valve {index} pressure before start." for index in range(4)]
+    manual = source_dir / "manual.md"
+    manual.write_text("\n\n".join(sections), encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    def run(client: TrackingEmbeddingClient) -> IncrementalReindexResult:
+        return run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=100,
+            chunk_overlap=0,
+            chunk_strategy="structured",
+            embedding_client=client,
+            embed_model="fake-embed",
+        )
+
+    assert run(TrackingEmbeddingClient(dimensions=3))["written_chunks"] == 4
+    with sqlite3.connect(db_path) as connection:
+        rows_before = dict(connection.execute("SELECT id, rowid FROM chunks").fetchall())
+
+    sections[2] = "# Step 2\n\nCheck gasket 2 seating before start."
+    manual.write_text("\n\n".join(sections), encoding="utf-8")
+    client = TrackingEmbeddingClient(dimensions=3)
+    metrics = run(client)
+
+    assert metrics["updated"] == 1
+    assert client.calls == ["# Step 2\n\nCheck gasket 2 seating before start."]
+    # The edited chunk's new row is inserted and its old row removed.
+    assert (metrics["embedded_chunks"], metrics["written_chunks"]) == (1, 2)
+    with sqlite3.connect(db_path) as connection:
+        rows_after = dict(connection.execute("SELECT id, rowid FROM chunks").fetchall())
+        fts_counts = {
+            term: connection.execute(
+                "SELECT COUNT(*) FROM chunks_fts WHERE chunks_fts MATCH ?", (term,)
+            ).fetchone()[0]
+            for term in ("valve", "gasket")
+        }
+    # Untouched chunks keep their rows; only the edited one was rewritten.
+    edited_id = next(chunk_id for chunk_id in rows_after if chunk_id.endswith("-0002"))
+    assert rows_after[edited_id] != rows_before.pop(edited_id)
+    assert {chunk_id: rowid for chunk_id, rowid in rows_after.items() if chunk_id != edited_id} == rows_before
+    assert fts_counts == {"valve": 3, "gasket": 1}
+
+
+def test_incremental_reindex_moves_shifted_chunks_in_place(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    sections = [f"# Step {index}\n\nCheck valve {index} pressure before start." for index in range(4)]
+    manual = source_dir / "manual.md"
+    manual.write_text("\n\n".join(sections), encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    def run(client: TrackingEmbeddingClient) -> IncrementalReindexResult:
+        return run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=100,
+            chunk_overlap=0,
+            chunk_strategy="structured",
+            embedding_client=client,
+            embed_model="fake-embed",
+        )
+
+    run(TrackingEmbeddingClient(dimensions=3))
+    with sqlite3.connect(db_path) as connection:
+        rowids_by_text = dict(connection.execute("SELECT text, rowid FROM chunks").fetchall())
+
+    manual.write_text("\n\n".join(["# Safety\n\nLock out the gasket press first."] + sections), encoding="utf-8")
+    client = TrackingEmbeddingClient(dimensions=3)
+    metrics = run(client)
+
+    assert client.calls == ["# Safety\n\nLock out the gasket press first."]
+    # One inserted row; the four shifted rows only had id/chunk_index updated.
+    assert (metrics["embedded_chunks"], metrics["written_chunks"]) == (1, 5)
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute("SELECT id, chunk_index, text, rowid FROM chunks ORDER BY chunk_index").fetchall()
+        fts_counts = {
+            term: connection.execute(
+                "SELECT COUNT(*) FROM chunks_fts WHERE chunks_fts MATCH ?", (term,)
+            ).fetchone()[0]
+            for term in ("valve", "gasket")
+        }
+    assert [chunk_index for _, chunk_index, _, _ in rows] == [0, 1, 2, 3, 4]
+    assert all(chunk_id.endswith(f"-{chunk_index:04d}") for chunk_id, chunk_index, _, _ in rows)
+    assert {text: rowid for _, _, text, rowid in rows[1:]} == rowids_by_text
+    assert fts_counts == {"valve": 4, "gasket": 1}
+
+
+def test_incremental_reindex_reports_chunk_reuse_after_insertion(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    sentences = [f"Check line {index} pressure and seal {index % 7} before startup." for index in range(200)]
+    manual = source_dir / "manual.txt"
+    manual.write_text(" ".join(sentences), encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    def run() -> IncrementalReindexResult:
+        return run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=300,
+            chunk_overlap=30,
+            chunk_strategy="content",
+            embedding_client=TrackingEmbeddingClient(dimensions=3),
+            embed_model="fake-embed",
+        )
+
+    first = run()
+    manual.write_text(" ".join(sentences[:1] + ["Operators must log every restart."] + sentences[1:]), encoding="utf-8")
+    metrics = run()
+
+    assert metrics["updated"] == 1
+    assert metrics["embedded_chunks"] + metrics["reused_chunks"] == metrics["chunks_total_after"]
+    assert metrics["embedded_chunks"] <= 2 < first["chunks_total_after"]
+    assert metrics["chunk_reuse_ratio"] is not None and metrics["chunk_reuse_ratio"] > 0.9
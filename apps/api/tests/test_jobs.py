@@ -1,8 +1,10 @@
+from datetime import datetime, timedelta, timezone
+
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from api.db import get_engine
-from api.models import JobRecord
+from api.models import JobEventRecord, JobRecord
 
 
 def test_jobs_returns_empty_list_when_db_is_empty(client: TestClient) -> None:
@@ -44,3 +46,118 @@ def test_get_job_detail_returns_404_for_missing_job(client: TestClient) -> None:
     response = client.get("/jobs/missing")
 
     assert response.status_code == 404
+
+
+def test_cancel_queued_job_marks_it_cancelled(client: TestClient) -> None:
+    with Session(get_engine()) as session:
+        session.add(JobRecord(id="51", type="rag_reindex", status="queued"))
+        session.commit()
+
+    response = client.post("/jobs/51/cancel")
+
+    assert response.status_code == 200
+    assert response.json() == {"job_id": "51", "status": "cancelled"}
+
+    detail = client.get("/jobs/51").json()
+    assert detail["status"] == "cancelled"
+    assert detail["cancel_requested"] is True
+    assert detail["finished_at"] is not None
+
+
+def test_cancel_running_job_sets_cancel_requested(client: TestClient) -> None:
+    with Session(get_engine()) as session:
+        session.add(JobRecord(id="52", type="rag_reindex", status="running"))
+        session.commit()
+
+    response = client.post("/jobs/52/cancel")
+
+    assert response.status_code == 202
+    assert response.json() == {"job_id": "52", "status": "running", "cancel_requested": True}
+
+    with Session(get_engine()) as session:
+        job = session.get(JobRecord, "52")
+
+    assert job is not None
+    assert job.status == "running"
+    assert job.cancel_requested is True
+
+
+def test_cancel_finished_job_returns_conflict(client: TestClient) -> None:
+    with Session(get_engine()) as session:
+        session.add(JobRecord(id="53", type="rag_reindex", status="succeeded"))
+        session.commit()
+
+    response = client.post("/jobs/53/cancel")
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "job already succeeded", "job_id": "53"}
+
+
+def test_cancel_missing_job_returns_404(client: TestClient) -> None:
+    response = client.post("/jobs/missing/cancel")
+
+    assert response.status_code == 404
+
+
+def test_get_job_detail_exposes_progress(client: TestClient) -> None:
+    with Session(get_engine()) as session:
+        session.add(
+            JobRecord(
+                id="54",
+                type="rag_reindex",
+                status="running",
+                progress_json={"chunks_done": 640, "chunks_total": 1280, "eta_seconds": 12.5},
+            )
+        )
+        session.commit()
+
+    response = client.get("/jobs/54")
+
+    assert response.status_code == 200
+    assert response.json()["progress_json"] == {
+        "chunks_done": 640,
+        "chunks_total": 1280,
+        "eta_seconds": 12.5,
+    }
+
+
+def test_job_stats_reports_queue_depth_events_and_percentiles_in_window(client: TestClient) -> None:
+    assert client.post("/rag/reindex").status_code == 202
+    now = datetime.now(timezone.utc)
+    with Session(get_engine()) as session:
+        session.add(JobRecord(id="job-9", type="ollama_warmup", status="running"))
+        session.add_all(
+            JobEventRecord(job_id=f"w{i}", type="ollama_warmup", event="claimed", wait_seconds=float(i), created_at=now)
+            for i in range(1, 21)
+        )
+        session.add_all(
+            [
+                JobEventRecord(job_id="w1", type="ollama_warmup", event="succeeded", run_seconds=4.0, created_at=now),
+                JobEventRecord(job_id="w2", type="ollama_warmup", event="requeued", run_seconds=2.0, created_at=now),
+                # Outside the window: neither counted nor ranked.
+                JobEventRecord(
+                    job_id="w0",
+                    type="ollama_warmup",
+                    event="claimed",
+                    wait_seconds=999.0,
+                    created_at=now - timedelta(hours=2),
+                ),
+            ]
+        )
+        session.commit()
+
+    response = client.get("/jobs/stats", params={"window_seconds": 3600})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["window_seconds"] == 3600
+    reindex = body["types"]["rag_reindex"]
+    assert reindex["queued"] == 1
+    assert reindex["events"]["enqueued"] == 1
+    assert reindex["wait_seconds"] == {"count": 0, "p50": None, "p95": None}
+    warmup = body["types"]["ollama_warmup"]
+    assert warmup["running"] == 1
+    assert warmup["events"]["claimed"] == 20
+    assert warmup["events"]["requeued"] == 1
+    assert warmup["wait_seconds"] == {"count": 20, "p50": 10.0, "p95": 19.0}
+    assert warmup["run_seconds"] == {"count": 2, "p50": 2.0, "p95": 4.0}
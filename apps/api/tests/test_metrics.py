@@ -0,0 +1,62 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from api.llm import OllamaChatClient
+from api.metrics import HTTP_REQUEST_SECONDS, LLM_REQUEST_SECONDS, Histogram, render_metrics
+
+
+def test_metrics_endpoint_exposes_request_histograms_by_route_template(client: TestClient) -> None:
+    before = HTTP_REQUEST_SECONDS.count(method="GET", route="/jobs/{job_id}", status="404")
+
+    assert client.get("/jobs/missing-1").status_code == 404
+    assert client.get("/jobs/missing-2").status_code == 404
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert HTTP_REQUEST_SECONDS.count(method="GET", route="/jobs/{job_id}", status="404") == before + 2
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'route="/jobs/{job_id}",status="404",le="+Inf"' in body
+    assert "missing-1" not in body
+    assert 'http_requests_in_flight{route="/metrics"} 1.0' in body
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("test_render_seconds", "Test histogram.", ("path",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, path="a")
+    histogram.observe(0.5, path="a")
+    histogram.observe(5.0, path="a")
+
+    lines = histogram.render().splitlines()
+
+    assert lines[2:] == [
+        'test_render_seconds_bucket{path="a",le="0.1"} 1',
+        'test_render_seconds_bucket{path="a",le="1.0"} 2',
+        'test_render_seconds_bucket{path="a",le="+Inf"} 3',
+        'test_render_seconds_sum{path="a"} 5.55',
+        'test_render_seconds_count{path="a"} 3',
+    ]
+    assert "test_render_seconds_count" in render_metrics()
+    with pytest.raises(ValueError, match="expects labels"):
+        histogram.observe(1.0)
+
+
+def test_llm_latency_is_recorded_per_model_role_and_outcome(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = OllamaChatClient(
+        base_url="http://ollama:11434/v1",
+        default_model="metrics-default",
+        fallback_model="metrics-fallback",
+    )
+
+    def chat_completion(*, model: str, question: str, context: str) -> str:
+        if model == "metrics-default":
+            raise httpx.ConnectError("down")
+        return "answer"
+
+    monkeypatch.setattr(client, "_chat_completion", chat_completion)
+
+    assert client.generate_answer(question="q", context="c").used_fallback
+    assert LLM_REQUEST_SECONDS.count(model="metrics-default", role="default", outcome="error") == 1
+    assert LLM_REQUEST_SECONDS.count(model="metrics-fallback", role="fallback", outcome="ok") == 1
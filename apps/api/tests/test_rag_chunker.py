@@ -0,0 +1,129 @@
+from pathlib import Path
+import sqlite3
+
+import pytest
+
+from api.services.rag.chunker import chunk_documents
+from api.services.rag.sqlite_store import persist_sqlite_index
+from api.services.rag.types import SourceDocument
+
+MANUAL = """# Pump P-101
+
+Centrifugal pump for the cooling loop.
+
+## Startup
+
+1. Open the suction valve fully before starting.
+2. Prime the casing until water flows from the vent.
+3. Start the motor and open the discharge valve slowly.
+
+## Limits
+
+| Parameter | Min | Max |
+|-----------|-----|-----|
+| Flow m3/h | 10 | 40 |
+| Head m | 20 | 55 |
+| Temp C | 5 | 80 |
+"""
+
+
+def _chunks(text: str, *, chunk_size: int, chunk_overlap: int = 0) -> list[tuple[str | None, str]]:
+    document = SourceDocument(doc_id="doc", source_path="pump.md", text=text)
+    return [
+        (chunk.heading_path, chunk.text)
+        for chunk in chunk_documents(
+            [document],
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            strategy="structured",
+        )
+    ]
+
+
+def test_structured_chunks_follow_sections_and_keep_heading_path() -> None:
+    chunks = _chunks(MANUAL, chunk_size=200)
+
+    assert [heading_path for heading_path, _ in chunks] == [
+        "Pump P-101",
+        "Pump P-101 > Startup",
+        "Pump P-101 > Limits",
+    ]
+    assert chunks[1][1].startswith("## Startup\n\n1. Open the suction valve")
+    assert chunks[2][1].endswith("| Temp C | 5 | 80 |")
+
+
+def test_structured_chunks_split_between_steps_and_table_rows() -> None:
+    chunks = _chunks(MANUAL, chunk_size=16, chunk_overlap=2)
+
+    texts = [text for _, text in chunks]
+    # Procedure steps are never cut mid-step.
+    for step in (
+        "1. Open the suction valve fully before starting.",
+        "2. Prime the casing until water flows from the vent.",
+        "3. Start the motor and open the discharge valve slowly.",
+    ):
+        assert any(step in text for text in texts)
+    # Oversized tables are split by rows, each piece repeating the header.
+    table_chunks = [text for heading_path, text in chunks if heading_path == "Pump P-101 > Limits" and "|" in text]
+    assert len(table_chunks) > 1
+    for text in table_chunks:
+        assert text.splitlines()[0] == "| Parameter | Min | Max |"
+    assert all(len(text.split()) <= 16 for text in texts)
+
+
+def test_structured_chunks_window_long_paragraphs_on_word_boundaries() -> None:
+    words = [f"word{index}" for index in range(25)]
+    chunks = _chunks(" ".join(words), chunk_size=10, chunk_overlap=2)
+
+    assert [text.split() for _, text in chunks] == [words[0:10], words[8:18], words[16:25]]
+    assert {heading_path for heading_path, _ in chunks} == {None}
+
+
+def test_heading_path_is_stored_with_chunks(tmp_path: Path) -> None:
+    document = SourceDocument(doc_id="doc", source_path="pump.md", text=MANUAL)
+    chunks = chunk_documents([document], chunk_size=200, chunk_overlap=0, strategy="structured")
+    db_path = tmp_path / "rag.db"
+    persist_sqlite_index(
+        db_path,
+        documents=[document],
+        chunks=chunks,
+        embeddings=[[1.0, 0.0] for _ in chunks],
+    )
+
+    with sqlite3.connect(db_path) as connection:
+        stored = [row[0] for row in connection.execute("SELECT heading_path FROM chunks ORDER BY chunk_index")]
+    assert stored == [chunk.heading_path for chunk in chunks]
+
+    with pytest.raises(ValueError, match="chunk strategy"):
+        chunk_documents([document], chunk_size=200, chunk_overlap=0, strategy="semantic")
+
+
+def _procedure_text(sentence_count: int) -> list[str]:
+    parts = ["pump", "valve", "seal", "motor", "gasket", "bearing", "flow", "alarm", "limit"]
+    return [
+        f"Step {index}: check the {parts[index % 9]} and the {parts[(index * 7) % 9]} before shift {index % 5}."
+        for index in range(sentence_count)
+    ]
+
+
+def test_content_defined_chunks_keep_boundaries_after_local_edit() -> None:
+    sentences = _procedure_text(300)
+    edited = sentences[:2] + ["Note: the startup sequence was revised."] + sentences[2:]
+
+    def chunk(text: str, strategy: str) -> list[str]:
+        document = SourceDocument(doc_id="doc", source_path="manual.txt", text=text)
+        return [
+            record.text
+            for record in chunk_documents([document], chunk_size=400, chunk_overlap=40, strategy=strategy)
+        ]
+
+    before = chunk(" ".join(sentences), "content")
+    after = chunk(" ".join(edited), "content")
+    assert all(len(text) <= 400 for text in before)
+    # Chunks start and end on whole words.
+    words = set(" ".join(sentences).split())
+    assert all(set(text.split()) <= words for text in before)
+    assert len(set(before) - set(after)) <= 2
+    # Fixed windows shift every chunk after the insertion.
+    fixed_before = chunk(" ".join(sentences), "fixed")
+    assert len(set(fixed_before) - set(chunk(" ".join(edited), "fixed"))) == len(fixed_before)
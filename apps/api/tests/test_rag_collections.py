@@ -0,0 +1,136 @@
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from api.config import get_settings
+from api.db import get_engine
+from api.main import app, get_embedding_client
+from api.models import JobRecord
+from api.services.rag.collection import (
+    LoadedIndexCache,
+    UnknownCollectionError,
+    get_loaded_index_cache,
+    resolve_collection,
+)
+from api.services.rag.ingest import ingest_documents
+from api.services.rag.vector_sidecar import write_vector_sidecar
+
+
+class FakeEmbeddingClient:
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        return [
+            [float(text.lower().count("press")), float(text.lower().count("robot")), 1.0]
+            for text in texts
+        ]
+
+
+def _ingest(source_dir: Path, db_path: Path, text: str) -> None:
+    source_dir.mkdir(parents=True)
+    (source_dir / "notes.md").write_text(text, encoding="utf-8")
+    ingest_documents(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+
+
+def test_resolve_collection_defaults_and_overrides(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("RAG_INDEX_DIR", "data/rag_index")
+    monkeypatch.setenv("RAG_DB_PATH", "data/rag_index/rag.db")
+    monkeypatch.setenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    monkeypatch.setenv(
+        "RAG_COLLECTIONS",
+        '{"plant_a": {"source_dir": "data/plant_a"}, "plant_b": {"source_dir": "data/plant_b", "db_path": "b.db", "embed_model": "bge-m3"}}',
+    )
+
+    default = resolve_collection(None)
+    plant_a = resolve_collection("plant_a")
+    plant_b = resolve_collection("plant_b")
+
+    assert (default.name, default.db_path) == ("default", Path("data/rag_index/rag.db"))
+    assert plant_a.db_path == Path("data/rag_index/collections/plant_a/rag.db")
+    assert plant_a.embed_model == "nomic-embed-text"
+    assert (plant_b.db_path, plant_b.embed_model) == (Path("b.db"), "bge-m3")
+    with pytest.raises(UnknownCollectionError):
+        resolve_collection("plant_z")
+
+
+def test_loaded_index_cache_evicts_least_recently_used_and_reloads_new_builds(tmp_path: Path) -> None:
+    db_paths = []
+    for name in ("a", "b", "c"):
+        db_path = tmp_path / name / "rag.db"
+        _ingest(tmp_path / f"{name}_docs", db_path, f"press {name} line")
+        db_paths.append(db_path)
+    cache = LoadedIndexCache(2)
+
+    first = cache.get(db_paths[0])
+    cache.get(db_paths[1])
+    assert cache.get(db_paths[0]) is first
+    cache.get(db_paths[2])
+
+    assert cache.loaded_paths() == [db_paths[0].absolute(), db_paths[2].absolute()]
+
+    assert write_vector_sidecar(db_paths[0], dtype="float32") is not None
+    reloaded = cache.get(db_paths[0])
+    assert first is not None and reloaded is not None
+    assert reloaded.info.token != first.info.token
+
+
+def test_rag_search_endpoint_routes_to_collection(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    _ingest(tmp_path / "default_docs", tmp_path / "default" / "rag.db", "robot cell maintenance")
+    _ingest(tmp_path / "plant_a_docs", tmp_path / "plant_a" / "rag.db", "press line hydraulic check")
+    monkeypatch.setenv("RAG_INDEX_DIR", str(tmp_path / "default"))
+    monkeypatch.setenv("RAG_DB_PATH", str(tmp_path / "default" / "rag.db"))
+    monkeypatch.setenv(
+        "RAG_COLLECTIONS",
+        f'{{"plant_a": {{"source_dir": "{tmp_path / "plant_a_docs"}", "index_dir": "{tmp_path / "plant_a"}"}}}}',
+    )
+    get_settings.cache_clear()
+    app.dependency_overrides[get_embedding_client] = lambda: FakeEmbeddingClient()
+
+    try:
+        default_hits = client.get("/rag/search", params={"q": "press"})
+        plant_hits = client.get("/rag/search", params={"q": "press", "collection": "plant_a"})
+        unknown = client.get("/rag/search", params={"q": "press", "collection": "plant_z"})
+        collections = client.get("/rag/collections")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert default_hits.json()[0]["text"] == "robot cell maintenance"
+    assert plant_hits.json()[0]["text"] == "press line hydraulic check"
+    assert unknown.status_code == 404
+    assert [(item["name"], item["loaded"]) for item in collections.json()] == [
+        ("default", True),
+        ("plant_a", True),
+    ]
+    assert len(get_loaded_index_cache().loaded_paths()) == 2
+
+
+def test_reindex_and_verify_jobs_carry_collection(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("RAG_COLLECTIONS", '{"plant_a": {"source_dir": "data/plant_a"}}')
+    get_settings.cache_clear()
+
+    reindex = client.post(
+        "/rag/reindex?collection=plant_a",
+        json={"payload_json": {"requested_by": "test"}},
+    )
+    verify = client.post("/rag/verify?collection=plant_a")
+    unknown = client.post("/rag/verify?collection=plant_z")
+
+    assert reindex.status_code == 202
+    assert verify.status_code == 202
+    assert unknown.status_code == 404
+    with Session(get_engine()) as session:
+        reindex_job = session.get(JobRecord, reindex.json()["job_id"])
+        verify_job = session.get(JobRecord, verify.json()["job_id"])
+    assert reindex_job is not None and verify_job is not None
+    assert reindex_job.payload_json == {"requested_by": "test", "collection": "plant_a"}
+    assert verify_job.payload_json == {"collection": "plant_a"}
@@ -0,0 +1,126 @@
+from pathlib import Path
+import sqlite3
+
+from api.services.rag.dedup import (
+    collapse_duplicate_hits,
+    count_near_duplicates,
+    embed_texts_deduplicated,
+)
+from api.services.rag.query import search_index
+from api.services.rag.reindex_job_runner import run_reindex_job
+from api.services.rag.types import QueryHit
+from api.services.rag.vector_sidecar import read_vector_sidecar_info
+
+DISCLAIMER = (
+    "This procedure is provided for trained maintenance personnel only. "
+    "Lock out and tag out all energy sources before opening any guard."
+)
+PROCEDURE = (
+    "Hydraulic press line three requires a daily inspection of the accumulator "
+    "pre-charge pressure, the return filter indicator and the cylinder seals "
+    "before the first shift starts production"
+)
+
+
+class CountingEmbeddingClient:
+    def __init__(self) -> None:
+        self.embedded: list[str] = []
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 997) + 1.0] for text in texts]
+
+
+def test_embed_texts_deduplicated_embeds_each_text_once() -> None:
+    client = CountingEmbeddingClient()
+
+    vectors, embedded = embed_texts_deduplicated(
+        client,
+        ["alpha", "beta", "alpha", "gamma", "beta"],
+        batch_size=2,
+        known_embeddings=lambda hashes: {hashes[2]: [9.0, 9.0]},
+    )
+
+    assert client.embedded == ["alpha", "beta"]
+    assert embedded == 2
+    assert vectors[0] == vectors[2]
+    assert vectors[1] == vectors[4]
+    assert vectors[3] == [9.0, 9.0]
+
+
+def test_count_near_duplicates_flags_small_edits_only() -> None:
+    edited = PROCEDURE.replace("daily", "weekly")
+    unrelated = "Quarterly revenue forecast for the accounting department and finance review"
+
+    assert count_near_duplicates([PROCEDURE, edited, unrelated]) == 1
+    assert count_near_duplicates([PROCEDURE, unrelated]) == 0
+
+
+def test_collapse_duplicate_hits_keeps_best_of_each_group() -> None:
+    hits = [
+        QueryHit(chunk_id="a", source_path="a.md", score=0.9, text=PROCEDURE),
+        QueryHit(chunk_id="b", source_path="b.md", score=0.8, text=PROCEDURE),
+        QueryHit(chunk_id="c", source_path="c.md", score=0.7, text=PROCEDURE.replace("production", "assembly")),
+        QueryHit(chunk_id="d", source_path="d.md", score=0.6, text=DISCLAIMER),
+        QueryHit(chunk_id="e", source_path="e.md", score=0.5, text="unrelated accounting note"),
+    ]
+
+    collapsed = collapse_duplicate_hits(hits, limit=2)
+
+    assert [hit.chunk_id for hit in collapsed] == ["a", "d"]
+
+
+def _write_manuals(source_dir: Path) -> None:
+    source_dir.mkdir(parents=True)
+    for line in range(4):
+        (source_dir / f"line_{line}.md").write_text(
+            f"{DISCLAIMER}\n\nPress line {line} torque table for station {line} bolts.",
+            encoding="utf-8",
+        )
+
+
+def test_reindex_embeds_shared_chunks_once_and_search_collapses(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    _write_manuals(source_dir)
+    db_path = tmp_path / "rag" / "rag.db"
+    client = CountingEmbeddingClient()
+
+    metrics = run_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=130,
+        chunk_overlap=0,
+        embedding_client=client,
+        embed_batch_size=2,
+    )
+
+    # chunk_size=130 with no overlap: each manual's first chunk is the shared disclaimer.
+    shared = DISCLAIMER[:130]
+    assert metrics["chunks"] == 8
+    assert metrics["embedded_chunks"] == 5
+    assert metrics["duplicate_chunks"] == 3
+    assert client.embedded.count(shared) == 1
+    info = read_vector_sidecar_info(db_path)
+    assert info is not None and info.count == 5
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM vector_rows").fetchone()[0] == 8
+
+    collapsed = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text=shared,
+        top_k=8,
+        embedding_client=client,
+    )
+    expanded = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text=shared,
+        top_k=8,
+        embedding_client=client,
+        collapse_duplicates=False,
+    )
+
+    assert [hit.text for hit in collapsed].count(shared) == 1
+    assert len(collapsed) == 5
+    assert [hit.text for hit in expanded].count(shared) == 4
@@ -0,0 +1,229 @@
+from pathlib import Path
+import sqlite3
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from api.services.rag.generations import (
+    collect_generations,
+    current_generation,
+    generation_db_path,
+    index_writer_lock,
+    list_generations,
+    rollback_generation,
+)
+from api.services.rag.incremental_reindex_job_runner import run_incremental_reindex_job
+from api.services.rag.job_control import CancellationToken, JobCancelledError
+from api.services.rag.query import search_index
+from api.services.rag.reindex_job_runner import run_reindex_job
+from api.services.rag.sqlite_store import persist_sqlite_index
+from api.services.rag.types import ChunkRecord, SourceDocument
+from api.services.rag.vector_sidecar import read_vector_sidecar_info, vector_sidecar_path, write_vector_sidecar
+
+
+class FakeEmbeddingClient:
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        return [[float(text.lower().count("press")), float(text.lower().count("robot")), 1.0] for text in texts]
+
+
+def _reindex(source_dir: Path, db_path: Path, text: str) -> int | None:
+    (source_dir / "manual.md").write_text(text, encoding="utf-8")
+    metrics = run_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=200,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+    return metrics["generation"]
+
+
+def _search_text(db_path: Path, query: str) -> str:
+    hits = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text=query,
+        top_k=1,
+        embedding_client=FakeEmbeddingClient(),
+        mode="vector",
+    )
+    return hits[0].text
+
+
+def test_reindex_publishes_generations_with_rollback_and_gc(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    monkeypatch.setenv("RAG_INDEX_GENERATIONS_KEEP", "2")
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    db_path = tmp_path / "rag" / "rag.db"
+
+    assert _reindex(source_dir, db_path, "press line one") == 1
+    assert _reindex(source_dir, db_path, "press line two") == 2
+    assert _reindex(source_dir, db_path, "press line three") == 3
+
+    assert db_path.is_symlink()
+    assert list_generations(db_path) == [2, 3]
+    assert not generation_db_path(db_path, 1).parent.exists()
+    assert _search_text(db_path, "press") == "press line three"
+
+    restored = rollback_generation(db_path)
+    assert restored.generation == 2
+    current = current_generation(db_path)
+    assert current is not None and current.generation == 2
+    assert read_vector_sidecar_info(db_path) is not None
+    assert _search_text(db_path, "press") == "press line two"
+    with pytest.raises(ValueError, match="no generation older"):
+        rollback_generation(db_path)
+
+    # The current generation survives collection even when it is not the newest.
+    assert collect_generations(db_path, keep=1) == []
+    assert rollback_generation(db_path, 3).generation == 3
+    assert collect_generations(db_path, keep=1) == [2]
+
+
+def test_reader_keeps_resolved_generation_across_publish(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    db_path = tmp_path / "rag" / "rag.db"
+    _reindex(source_dir, db_path, "press line before")
+
+    reader = current_generation(db_path)
+    assert reader is not None
+    _reindex(source_dir, db_path, "press line after")
+
+    with sqlite3.connect(reader.db_path) as connection:
+        assert connection.execute("SELECT text FROM chunks").fetchone()[0] == "press line before"
+    assert _search_text(db_path, "press") == "press line after"
+
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_search_survives_publish_and_gc_of_its_generation_midway(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    mode: str,
+) -> None:
+    monkeypatch.setenv("RAG_INDEX_GENERATIONS_KEEP", "1")
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    db_path = tmp_path / "rag" / "rag.db"
+    assert _reindex(source_dir, db_path, "press line before") == 1
+
+    class PublishingEmbeddingClient(FakeEmbeddingClient):
+        def embed_texts(self, texts: list[str]) -> list[list[float]]:
+            # The request has resolved generation 1; a reindex replaces it and
+            # gc deletes its directory before scoring starts.
+            assert _reindex(source_dir, db_path, "press line after") == 2
+            assert not generation_db_path(db_path, 1).parent.exists()
+            return super().embed_texts(texts)
+
+    hits = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text="press",
+        top_k=1,
+        embedding_client=PublishingEmbeddingClient(),
+        mode=mode,
+    )
+
+    assert [hit.text for hit in hits] == ["press line before"]
+    assert _search_text(db_path, "press") == "press line after"
+
+
+def test_first_publish_adopts_plain_index_as_generation_zero(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag" / "rag.db"
+    persist_sqlite_index(
+        db_path,
+        documents=[SourceDocument(doc_id="doc-legacy", source_path="legacy.md", text="robot cell legacy")],
+        chunks=[
+            ChunkRecord(
+                chunk_id="doc-legacy-0000",
+                doc_id="doc-legacy",
+                source_path="legacy.md",
+                text="robot cell legacy",
+            )
+        ],
+        embeddings=[[0.0, 1.0, 1.0]],
+    )
+    assert write_vector_sidecar(db_path, dtype="float32") is not None
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+
+    assert _reindex(source_dir, db_path, "press line new") == 1
+
+    assert list_generations(db_path) == [0, 1]
+    assert not (tmp_path / "rag" / "rag.db.vectors").exists()
+    assert vector_sidecar_path(generation_db_path(db_path, 0)).exists()
+    rollback_generation(db_path)
+    assert _search_text(db_path, "robot") == "robot cell legacy"
+
+
+def test_incremental_reindex_without_changes_publishes_nothing(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    (source_dir / "manual.md").write_text("press line manual", encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    def run() -> int | None:
+        return run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=200,
+            chunk_overlap=20,
+            embedding_client=FakeEmbeddingClient(),
+            embed_model="fake-embed",
+        )["generation"]
+
+    assert run() == 1
+    assert run() == 1
+    assert list_generations(db_path) == [1]
+    assert not db_path.with_name("rag.db.next").exists()
+
+    (source_dir / "manual.md").write_text("press line manual, revised", encoding="utf-8")
+    assert run() == 2
+    assert _search_text(db_path, "press") == "press line manual, revised"
+
+
+def test_writers_wait_for_the_index_writer_lock(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    (source_dir / "manual.md").write_text("press line manual", encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+    generations: list[int | None] = []
+
+    def incremental() -> None:
+        generations.append(
+            run_incremental_reindex_job(
+                source_dir=source_dir,
+                db_path=db_path,
+                chunk_size=200,
+                chunk_overlap=20,
+                embedding_client=FakeEmbeddingClient(),
+                embed_model="fake-embed",
+            )["generation"]
+        )
+
+    with index_writer_lock(db_path):
+        cancel_token = CancellationToken()
+        cancel_token.cancel()
+        with pytest.raises(JobCancelledError, match="index writer lock"):
+            run_reindex_job(
+                source_dir=source_dir,
+                db_path=db_path,
+                chunk_size=200,
+                chunk_overlap=20,
+                embedding_client=FakeEmbeddingClient(),
+                cancel_token=cancel_token,
+            )
+
+        waiting = Thread(target=incremental)
+        waiting.start()
+        sleep(0.3)
+        assert waiting.is_alive()
+        assert current_generation(db_path) is None
+    waiting.join(timeout=10)
+
+    assert generations == [1]
+    assert _search_text(db_path, "press") == "press line manual"
@@ -1,6 +1,11 @@
 from pathlib import Path
 
+import pytest
+
+from api.services.rag import prepare
+from api.services.rag.chunker import chunk_documents
 from api.services.rag.ingest import ingest_documents
+from api.services.rag.loader import load_documents, scan_source_files
 
 
 class FakeEmbeddingClient:
@@ -48,3 +53,33 @@ def test_ingest_documents_writes_sqlite_index(tmp_path: Path) -> None:
     )
 
     assert db_path.exists()
+
+
+def test_prepare_documents_in_process_pool_matches_sequential_load(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    monkeypatch.setattr(prepare, "_MIN_PARALLEL_FILES", 1)
+    monkeypatch.setattr(prepare, "_FILES_PER_TASK", 3)
+    source_dir = tmp_path / "sample_docs"
+    for index in range(20):
+        folder = source_dir / f"line_{index % 3}"
+        folder.mkdir(parents=True, exist_ok=True)
+        text = "" if index == 7 else f"  document {index} " + "pump seal torque " * (index * 7)
+        (folder / f"doc_{index:02d}.md").write_text(text, encoding="utf-8")
+
+    prepared = list(
+        prepare.prepare_documents(
+            scan_source_files(source_dir),
+            chunk_size=120,
+            chunk_overlap=20,
+            workers=2,
+        )
+    )
+
+    documents = load_documents(source_dir)
+    assert prepared.count(None) == 1
+    assert [item.document for item in prepared if item is not None] == documents
+    assert [chunk for item in prepared if item is not None for chunk in item.chunks] == chunk_documents(
+        documents, chunk_size=120, chunk_overlap=20
+    )
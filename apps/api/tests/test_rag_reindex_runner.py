@@ -1,8 +1,15 @@
+from contextlib import closing
 from pathlib import Path
+import sqlite3
 
 import pytest
 
+from api.services.rag.incremental_reindex_job_runner import run_incremental_reindex_job
+from api.services.rag.job_control import CancellationToken, JobCancelledError
+from api.services.rag.query import search_index
 from api.services.rag.reindex_job_runner import run_reindex_job
+from api.services.rag.sqlite_store import connect_sqlite, load_sqlite_chunks_by_rowid, search_fts_rowids
+from api.services.rag.verify_index_job_runner import run_verify_index_job
 
 
 class FakeEmbeddingClient:
@@ -53,3 +60,244 @@ def test_run_reindex_job_self_check_failure_cleans_tmp_file(tmp_path: Path) -> N
     assert not db_path.exists()
     assert not db_path.with_suffix(".db.tmp").exists()
 
+
+
+def test_run_reindex_job_honors_cancellation_between_batches(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "doc.txt").write_text("alpha beta gamma " * 80, encoding="utf-8")
+
+    cancel_token = CancellationToken()
+
+    class CancellingEmbeddingClient(FakeEmbeddingClient):
+        def __init__(self) -> None:
+            super().__init__(dimensions=4)
+            self.batches = 0
+
+        def embed_texts(self, texts: list[str]) -> list[list[float]]:
+            self.batches += 1
+            cancel_token.cancel()
+            return super().embed_texts(texts)
+
+    embedding_client = CancellingEmbeddingClient()
+    db_path = tmp_path / "rag" / "rag.db"
+
+    with pytest.raises(JobCancelledError, match="embedding batch 1"):
+        run_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=120,
+            chunk_overlap=20,
+            embedding_client=embedding_client,
+            embed_batch_size=2,
+            cancel_token=cancel_token,
+        )
+
+    assert embedding_client.batches == 1
+    assert not db_path.exists()
+    assert not db_path.with_suffix(".db.tmp").exists()
+
+
+class FlakyEmbeddingClient(FakeEmbeddingClient):
+    def __init__(self, dimensions: int, *, fail_on_call: int | None = None) -> None:
+        super().__init__(dimensions=dimensions)
+        self._fail_on_call = fail_on_call
+        self.embedded: list[str] = []
+        self.calls = 0
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.calls == self._fail_on_call:
+            raise RuntimeError("ollama timeout")
+        self.embedded.extend(texts)
+        return super().embed_texts(texts)
+
+
+def test_run_reindex_job_resumes_staging_db_for_same_job_id(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    for name in ("a", "b", "c"):
+        (source_dir / f"{name}.txt").write_text(f"document {name} body", encoding="utf-8")
+
+    db_path = tmp_path / "rag" / "rag.db"
+    tmp_db_path = db_path.with_suffix(".db.tmp")
+
+    with pytest.raises(RuntimeError, match="ollama timeout"):
+        run_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=120,
+            chunk_overlap=20,
+            embedding_client=FlakyEmbeddingClient(dimensions=4, fail_on_call=3),
+            embed_batch_size=1,
+            job_id="77",
+        )
+
+    assert tmp_db_path.exists()
+    assert not db_path.exists()
+
+    retry_client = FlakyEmbeddingClient(dimensions=4)
+    metrics = run_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=retry_client,
+        embed_batch_size=1,
+        job_id="77",
+    )
+
+    assert retry_client.embedded == ["document c body"]
+    assert metrics["documents"] == 3
+    assert metrics["resumed_documents"] == 2
+    assert metrics["chunks"] == 3
+    assert db_path.exists()
+    assert not tmp_db_path.exists()
+
+
+def test_run_reindex_job_removes_staging_db_after_final_attempt_or_cancel(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    for name in ("a", "b", "c"):
+        (source_dir / f"{name}.txt").write_text(f"document {name} body", encoding="utf-8")
+
+    db_path = tmp_path / "rag" / "rag.db"
+    tmp_db_path = db_path.with_suffix(".db.tmp")
+
+    with pytest.raises(RuntimeError, match="ollama timeout"):
+        run_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=120,
+            chunk_overlap=20,
+            embedding_client=FlakyEmbeddingClient(dimensions=4, fail_on_call=3),
+            embed_batch_size=1,
+            job_id="80",
+            final_attempt=True,
+        )
+
+    assert not tmp_db_path.exists()
+
+    cancel_token = CancellationToken()
+    cancel_token.cancel()
+    with pytest.raises(JobCancelledError):
+        run_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=120,
+            chunk_overlap=20,
+            embedding_client=FlakyEmbeddingClient(dimensions=4),
+            embed_batch_size=1,
+            cancel_token=cancel_token,
+            job_id="81",
+        )
+
+    assert not tmp_db_path.exists()
+    assert not db_path.exists()
+
+
+def test_run_reindex_job_discards_staging_db_of_other_job(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "a.txt").write_text("document a body", encoding="utf-8")
+    (source_dir / "b.txt").write_text("document b body", encoding="utf-8")
+
+    db_path = tmp_path / "rag" / "rag.db"
+
+    with pytest.raises(RuntimeError, match="ollama timeout"):
+        run_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            chunk_size=120,
+            chunk_overlap=20,
+            embedding_client=FlakyEmbeddingClient(dimensions=4, fail_on_call=2),
+            embed_batch_size=1,
+            job_id="78",
+        )
+
+    retry_client = FlakyEmbeddingClient(dimensions=4)
+    metrics = run_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=retry_client,
+        embed_batch_size=1,
+        job_id="79",
+    )
+
+    assert metrics["resumed_documents"] == 0
+    assert len(retry_client.embedded) == 2
+
+
+def test_run_reindex_job_compresses_chunk_texts_with_shared_dictionary(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    monkeypatch.setenv("RAG_TEXT_COMPRESSION", "zlib")
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    boilerplate = (
+        "Warning: disconnect the main power supply before opening the cabinet. "
+        "Only qualified maintenance personnel may service this equipment. "
+    )
+    for index in range(6):
+        (source_dir / f"manual-{index}.txt").write_text(
+            f"{boilerplate}Press P-{index}01 hydraulic pressure check {index}. {boilerplate}",
+            encoding="utf-8",
+        )
+    db_path = tmp_path / "rag" / "rag.db"
+
+    metrics = run_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=400,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(dimensions=4),
+    )
+
+    assert metrics["compressed_chunks"] == metrics["chunks"]
+    with closing(sqlite3.connect(db_path)) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM chunks WHERE text != ''").fetchone()[0] == 0
+    hits = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text="P-301",
+        top_k=1,
+        embedding_client=FakeEmbeddingClient(dimensions=4),
+        mode="hybrid",
+    )
+    assert hits[0].source_path == "manual-3.txt"
+    assert hits[0].text.startswith("Warning: disconnect the main power supply")
+
+    # Incremental runs compress with the stored dictionary and keep FTS in sync.
+    (source_dir / "manual-3.txt").write_text(f"{boilerplate}Press P-999 torque check.", encoding="utf-8")
+    run_incremental_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=400,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(dimensions=4),
+        embed_model="fake-embed",
+    )
+    with closing(sqlite3.connect(db_path)) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM chunks WHERE text_compressed IS NULL").fetchone()[0] == 0
+    assert _fts_source_paths(db_path, "P-301") == []
+    assert _fts_source_paths(db_path, "P-999") == ["manual-3.txt"]
+
+    result = run_verify_index_job(
+        db_path=db_path,
+        index_dir=db_path.parent,
+        expected_embed_dim=4,
+        sample_query="hydraulic pressure",
+        embedding_client=FakeEmbeddingClient(dimensions=4),
+    )
+    assert result["text_compression"] == "zlib"
+    assert result["stored_text_bytes"] < result["text_bytes"]
+    assert result["text_compression_ratio"] is not None and result["text_compression_ratio"] > 1.0
+
+
+def _fts_source_paths(db_path: Path, query_text: str) -> list[str]:
+    with connect_sqlite(db_path) as connection:
+        rowids = search_fts_rowids(connection, query_text, limit=10)
+        return sorted(chunk.source_path for chunk in load_sqlite_chunks_by_rowid(connection, rowids).values())
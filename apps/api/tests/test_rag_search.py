@@ -15,6 +15,7 @@ from api.services.rag.loader import load_documents
 from api.models import JobRecord
 from api.services.rag.ingest import ingest_documents
 from api.services.rag.query import search_index
+from api.services.rag.types import SearchFilters
 
 
 class FakeEmbeddingClient:
@@ -118,6 +119,9 @@ def test_rag_search_endpoint_returns_hits(rag_client: tuple[TestClient, Path], t
     assert isinstance(payload, list)
     assert len(payload) >= 1
     assert {"chunk_id", "source_path", "score", "text"}.issubset(payload[0].keys())
+    stages = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    assert stages[0] == "embed"
+    assert stages[-1] == "total"
 
 
 def test_rag_search_endpoint_without_index_returns_503(
@@ -152,3 +156,129 @@ def test_search_index_falls_back_to_json_when_sqlite_missing(tmp_path: Path) ->
 
     assert len(hits) == 1
     assert hits[0].source_path == "legacy.txt"
+
+
+def _ingest_hybrid_corpus(tmp_path: Path) -> Path:
+    source_dir = tmp_path / "hybrid_docs"
+    source_dir.mkdir(parents=True)
+    (source_dir / "alarm.txt").write_text(
+        "alarm AL-203 hydraulic pressure low on press", encoding="utf-8"
+    )
+    (source_dir / "robotics.txt").write_text(
+        "robotics automation assembly line maintenance", encoding="utf-8"
+    )
+    (source_dir / "finance.txt").write_text(
+        "financial forecast revenue accounting", encoding="utf-8"
+    )
+
+    rag_db_path = tmp_path / "rag_index" / "rag.db"
+    ingest_documents(
+        source_dir=source_dir,
+        db_path=rag_db_path,
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+    return rag_db_path
+
+
+def test_hybrid_search_surfaces_exact_code_matches(tmp_path: Path) -> None:
+    rag_db_path = _ingest_hybrid_corpus(tmp_path)
+
+    hits = search_index(
+        index_dir=rag_db_path.parent,
+        db_path=rag_db_path,
+        query_text="AL-203",
+        top_k=1,
+        embedding_client=FakeEmbeddingClient(),
+        mode="hybrid",
+    )
+
+    assert [hit.source_path for hit in hits] == ["alarm.txt"]
+
+
+def test_fts_prefilter_limits_vector_scoring_to_lexical_candidates(tmp_path: Path) -> None:
+    rag_db_path = _ingest_hybrid_corpus(tmp_path)
+
+    prefiltered = search_index(
+        index_dir=rag_db_path.parent,
+        db_path=rag_db_path,
+        query_text="robotics",
+        top_k=5,
+        embedding_client=FakeEmbeddingClient(),
+        mode="vector",
+        prefilter=True,
+    )
+    no_lexical_match = search_index(
+        index_dir=rag_db_path.parent,
+        db_path=rag_db_path,
+        query_text="turbine",
+        top_k=5,
+        embedding_client=FakeEmbeddingClient(),
+        mode="vector",
+        prefilter=True,
+    )
+
+    assert [hit.source_path for hit in prefiltered] == ["robotics.txt"]
+    assert len(no_lexical_match) == 3
+
+
+def test_rag_search_endpoint_accepts_hybrid_mode(rag_client: tuple[TestClient, Path], tmp_path: Path) -> None:
+    client, index_dir = rag_client
+    source_dir = tmp_path / "sample_docs"
+    source_dir.mkdir(parents=True)
+    (source_dir / "alarm.md").write_text("alarm AL-203 on press line 3", encoding="utf-8")
+    ingest_documents(
+        source_dir=source_dir,
+        db_path=index_dir / "rag.db",
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+
+    response = client.get("/rag/search", params={"q": "AL-203", "k": 1, "mode": "hybrid"})
+    invalid = client.get("/rag/search", params={"q": "AL-203", "mode": "bm25"})
+
+    assert response.status_code == 200
+    assert response.json()[0]["source_path"] == "alarm.md"
+    assert invalid.status_code == 422
+
+
+def test_filters_apply_to_lexical_candidates(tmp_path: Path) -> None:
+    rag_db_path = _ingest_hybrid_corpus(tmp_path)
+
+    hits = search_index(
+        index_dir=rag_db_path.parent,
+        db_path=rag_db_path,
+        query_text="AL-203 automation",
+        top_k=5,
+        embedding_client=FakeEmbeddingClient(),
+        mode="hybrid",
+        filters=SearchFilters(source_path_glob="rob*"),
+    )
+
+    assert [hit.source_path for hit in hits] == ["robotics.txt"]
+
+
+def test_rag_search_endpoint_filters_by_source_prefix(rag_client: tuple[TestClient, Path], tmp_path: Path) -> None:
+    client, index_dir = rag_client
+    source_dir = tmp_path / "sample_docs"
+    (source_dir / "press_line_3").mkdir(parents=True)
+    (source_dir / "press_line_4").mkdir(parents=True)
+    (source_dir / "press_line_3" / "robot.md").write_text("robotics cell on line 3", encoding="utf-8")
+    (source_dir / "press_line_4" / "robot.md").write_text("robotics automation cell on line 4", encoding="utf-8")
+    ingest_documents(
+        source_dir=source_dir,
+        db_path=index_dir / "rag.db",
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+
+    response = client.get(
+        "/rag/search",
+        params={"q": "robotics automation", "k": 5, "source_prefix": "press_line_3/"},
+    )
+
+    assert response.status_code == 200
+    assert [hit["source_path"] for hit in response.json()] == ["press_line_3/robot.md"]
@@ -5,7 +5,15 @@ import pytest
 
 from api.services.rag.chunker import chunk_documents
 from api.services.rag.loader import load_documents
-from api.services.rag.sqlite_store import load_sqlite_chunks, persist_sqlite_index
+from api.services.rag.sqlite_store import (
+    build_fts_query,
+    delete_document_and_chunks,
+    load_sqlite_chunks,
+    persist_sqlite_index,
+    replace_chunks_for_doc,
+    search_fts_rowids,
+)
+from api.services.rag.types import ChunkRecord, SourceDocument
 
 
 def _embedding_for_chunk(text: str) -> list[float]:
@@ -85,3 +93,34 @@ def test_sqlite_store_roundtrip_and_schema(tmp_path: Path) -> None:
         assert loaded_chunk.embedding == pytest.approx(
             embeddings_by_chunk_id[loaded_chunk.chunk_id], rel=1e-6, abs=1e-6
         )
+
+
+def test_fts_index_follows_chunk_writes(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    document = SourceDocument(doc_id="doc-1", source_path="pump.txt", text="pump P-101 seal leak")
+    persist_sqlite_index(
+        db_path,
+        documents=[document],
+        chunks=[ChunkRecord(chunk_id="doc-1-0000", doc_id="doc-1", source_path="pump.txt", text=document.text)],
+        embeddings=[[1.0, 0.0, 0.0]],
+    )
+
+    with sqlite3.connect(db_path) as connection:
+        assert len(search_fts_rowids(connection, "P-101", limit=5)) == 1
+
+        replace_chunks_for_doc(
+            connection,
+            doc_id="doc-1",
+            chunks=[ChunkRecord(chunk_id="doc-1-0000", doc_id="doc-1", source_path="pump.txt", text="valve V-7 stuck")],
+            embeddings=[[0.0, 1.0, 0.0]],
+        )
+        assert search_fts_rowids(connection, "P-101", limit=5) == []
+        assert len(search_fts_rowids(connection, "v-7", limit=5)) == 1
+
+        delete_document_and_chunks(connection, "doc-1")
+        assert search_fts_rowids(connection, "valve", limit=5) == []
+
+
+def test_build_fts_query_quotes_user_terms() -> None:
+    assert build_fts_query('AL-203 "pressure" OR NEAR(') == '"al-203" OR "pressure" OR "or" OR "near"'
+    assert build_fts_query("  --  ") is None
@@ -0,0 +1,313 @@
+from array import array
+import hashlib
+import math
+from pathlib import Path
+import sqlite3
+import struct
+
+import pytest
+
+from api.services.rag import query, vector_sidecar
+from api.services.rag.incremental_reindex_job_runner import run_incremental_reindex_job
+from api.services.rag.query import cosine_similarity, search_index
+from api.services.rag.reindex_job_runner import run_reindex_job
+from api.services.rag.sqlite_store import load_sqlite_chunks, persist_sqlite_index, replace_chunks_for_doc
+from api.services.rag.types import ChunkRecord, SearchFilters, SourceDocument
+from api.services.rag.vector_sidecar import (
+    SIDECAR_DTYPES,
+    SIDECAR_HEADER_SIZE,
+    read_vector_sidecar_info,
+    vector_sidecar_path,
+    write_vector_sidecar,
+)
+
+
+class FakeEmbeddingClient:
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for text in texts:
+            normalized = text.lower()
+            vectors.append(
+                [
+                    float(normalized.count("automation")),
+                    float(normalized.count("maintenance")),
+                    float(len(normalized) % 7) + 0.5,
+                ]
+            )
+        return vectors
+
+
+def _persist_sample_index(db_path: Path) -> None:
+    texts = {
+        "doc-a": ["automation automation line", "maintenance window"],
+        "doc-b": ["maintenance maintenance plan", "automation of maintenance"],
+    }
+    documents: list[SourceDocument] = []
+    chunks: list[ChunkRecord] = []
+    for doc_id, doc_texts in texts.items():
+        source_path = f"{doc_id}.txt"
+        documents.append(SourceDocument(doc_id=doc_id, source_path=source_path, text="\n".join(doc_texts)))
+        chunks.extend(
+            ChunkRecord(chunk_id=f"{doc_id}-{index:04d}", doc_id=doc_id, source_path=source_path, text=text)
+            for index, text in enumerate(doc_texts)
+        )
+    persist_sqlite_index(
+        db_path,
+        documents=documents,
+        chunks=chunks,
+        embeddings=FakeEmbeddingClient().embed_texts([chunk.text for chunk in chunks]),
+    )
+
+
+def _search(
+    db_path: Path,
+    query: str,
+    top_k: int = 4,
+    filters: SearchFilters | None = None,
+) -> list[tuple[str, float]]:
+    hits = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text=query,
+        top_k=top_k,
+        embedding_client=FakeEmbeddingClient(),
+        filters=filters,
+    )
+    return [(hit.chunk_id, hit.score) for hit in hits]
+
+
+@pytest.mark.parametrize(
+    ("dtype", "tolerance"),
+    [("float32", 1e-6), ("float16", 1e-3), ("int8", 1e-6)],
+)
+def test_sidecar_search_matches_blob_search(tmp_path: Path, dtype: str, tolerance: float) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _persist_sample_index(db_path)
+    blob_hits = _search(db_path, "automation maintenance")
+
+    info = write_vector_sidecar(db_path, dtype=dtype)
+
+    assert info is not None
+    assert info.count == 4
+    assert info.dim == 3
+    assert read_vector_sidecar_info(db_path) == info
+    sidecar_hits = _search(db_path, "automation maintenance")
+    assert [chunk_id for chunk_id, _ in sidecar_hits] == [chunk_id for chunk_id, _ in blob_hits]
+    for (_, sidecar_score), (_, blob_score) in zip(sidecar_hits, blob_hits):
+        assert sidecar_score == pytest.approx(blob_score, abs=tolerance)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+@pytest.mark.parametrize(
+    ("filters", "expected_docs"),
+    [
+        (SearchFilters(source_path_prefix="doc-b"), {"doc-b"}),
+        (SearchFilters(source_path_glob="*-a.txt"), {"doc-a"}),
+        (SearchFilters(doc_ids=("doc-a",)), {"doc-a"}),
+        (SearchFilters(source_path_prefix="plant-9/"), set()),
+    ],
+)
+def test_filtered_sidecar_search_matches_filtered_blob_search(
+    tmp_path: Path,
+    dtype: str,
+    filters: SearchFilters,
+    expected_docs: set[str],
+) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _persist_sample_index(db_path)
+    blob_hits = _search(db_path, "automation maintenance", filters=filters)
+
+    assert write_vector_sidecar(db_path, dtype=dtype) is not None
+    sidecar_hits = _search(db_path, "automation maintenance", filters=filters)
+
+    assert {chunk_id.rsplit("-", 1)[0] for chunk_id, _ in blob_hits} == expected_docs
+    assert [chunk_id for chunk_id, _ in sidecar_hits] == [chunk_id for chunk_id, _ in blob_hits]
+    for (_, sidecar_score), (_, blob_score) in zip(sidecar_hits, blob_hits):
+        assert sidecar_score == pytest.approx(blob_score, abs=1e-6)
+
+
+def test_blob_search_fetches_text_only_for_top_hits(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _persist_sample_index(db_path)
+    fetched: list[list[int]] = []
+    load_texts = query.load_chunk_texts_by_rowid
+
+    def recording_load_texts(connection: sqlite3.Connection, rowids: list[int]) -> object:
+        fetched.append(list(rowids))
+        return load_texts(connection, rowids)
+
+    monkeypatch.setattr(query, "load_chunk_texts_by_rowid", recording_load_texts)
+
+    hits = search_index(
+        index_dir=db_path.parent,
+        db_path=db_path,
+        query_text="maintenance plan",
+        top_k=2,
+        embedding_client=FakeEmbeddingClient(),
+        mode="vector",
+        prefilter=False,
+        collapse_duplicates=False,
+    )
+
+    query_embedding = FakeEmbeddingClient().embed_texts(["maintenance plan"])[0]
+    expected = sorted(
+        load_sqlite_chunks(db_path),
+        key=lambda chunk: cosine_similarity(query_embedding, chunk.embedding),
+        reverse=True,
+    )[:2]
+    assert [hit.chunk_id for hit in hits] == [chunk.chunk_id for chunk in expected]
+    assert [len(rowids) for rowids in fetched] == [2]
+
+
+def test_chunk_writes_invalidate_sidecar_and_search_falls_back(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _persist_sample_index(db_path)
+    assert write_vector_sidecar(db_path, dtype="float32") is not None
+
+    with sqlite3.connect(db_path) as connection:
+        replace_chunks_for_doc(
+            connection,
+            doc_id="doc-a",
+            chunks=[ChunkRecord(chunk_id="doc-a-0000", doc_id="doc-a", source_path="doc-a.txt", text="finance")],
+            embeddings=[[0.0, 0.0, 1.0]],
+        )
+
+    assert read_vector_sidecar_info(db_path) is None
+    hit_ids = [chunk_id for chunk_id, _ in _search(db_path, "automation", top_k=10)]
+    assert "doc-a-0001" not in hit_ids
+    assert "doc-a-0000" in hit_ids
+
+
+def test_sidecar_with_foreign_token_is_ignored(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _persist_sample_index(db_path)
+    assert write_vector_sidecar(db_path, dtype="float32") is not None
+    stale_sidecar = vector_sidecar_path(db_path).read_bytes()
+
+    assert write_vector_sidecar(db_path, dtype="float32") is not None
+    vector_sidecar_path(db_path).write_bytes(stale_sidecar)
+
+    assert read_vector_sidecar_info(db_path) is None
+    assert len(_search(db_path, "automation")) == 4
+
+
+def test_reindex_job_publishes_sidecar_next_to_db(tmp_path: Path) -> None:
+    source_dir = tmp_path / "source"
+    source_dir.mkdir(parents=True)
+    (source_dir / "doc.txt").write_text("automation maintenance " * 60, encoding="utf-8")
+    db_path = tmp_path / "rag" / "rag.db"
+
+    metrics = run_reindex_job(
+        source_dir=source_dir,
+        db_path=db_path,
+        chunk_size=120,
+        chunk_overlap=20,
+        embedding_client=FakeEmbeddingClient(),
+    )
+
+    assert metrics["vector_sidecar"] == "float32"
+    info = read_vector_sidecar_info(db_path)
+    assert info is not None
+    with sqlite3.connect(db_path) as connection:
+        distinct_vectors = connection.execute("SELECT COUNT(DISTINCT embedding) FROM chunks").fetchone()[0]
+        mapped_chunks = connection.execute("SELECT COUNT(*) FROM vector_rows").fetchone()[0]
+    # Repeated text yields identical vectors, which share one sidecar row.
+    assert info.count == distinct_vectors < metrics["chunks"]
+    assert mapped_chunks == metrics["chunks"]
+    assert not vector_sidecar_path(db_path.with_suffix(".db.tmp")).exists()
+
+
+def test_disabled_sidecar_removes_file(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _persist_sample_index(db_path)
+    assert write_vector_sidecar(db_path, dtype="float32") is not None
+
+    assert write_vector_sidecar(db_path, dtype="none") is None
+
+    assert not vector_sidecar_path(db_path).exists()
+    assert read_vector_sidecar_info(db_path) is None
+
+
+class DistinctEmbeddingClient:
+    """One vector per distinct text, so every non-duplicate chunk gets its own sidecar row."""
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        return [[float(byte) - 127.5 for byte in hashlib.blake2b(text.encode()).digest()[:4]] for text in texts]
+
+
+def _assert_sidecar_rows_match_chunks(db_path: Path) -> None:
+    info = read_vector_sidecar_info(db_path)
+    assert info is not None
+    data = vector_sidecar_path(db_path).read_bytes()
+    row_struct = struct.Struct(f"={info.dim}{SIDECAR_DTYPES[info.dtype]}")
+    scales = array("f")
+    scales.frombytes(data[info.codes_end : info.file_size])
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute(
+            "SELECT vr.row, c.embedding FROM chunks c JOIN vector_rows vr ON vr.chunk_id = c.id"
+        ).fetchall()
+        chunk_count = connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    assert len(rows) == chunk_count
+    # Dense: every row is used, and each holds its chunks' normalized vector.
+    assert {row for row, _ in rows} == set(range(info.count))
+    for row, embedding_blob in rows:
+        stored = row_struct.unpack_from(data, SIDECAR_HEADER_SIZE + row * row_struct.size)
+        if info.quantized:
+            stored = tuple(code * scales[row] for code in stored)
+        vector = array("f")
+        vector.frombytes(embedding_blob)
+        norm = math.sqrt(sum(value * value for value in vector))
+        assert stored == pytest.approx([value / norm for value in vector], abs=1e-2 if info.quantized else 1e-6)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_incremental_reindex_patches_sidecar_rows_in_place(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    dtype: str,
+) -> None:
+    monkeypatch.setenv("RAG_VECTOR_SIDECAR", dtype)
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+
+    def write_manual(name: str, steps: list[str]) -> None:
+        sections = [f"# {step}\n\n{name} {step} checklist." for step in steps]
+        (source_dir / f"{name}.md").write_text("\n\n".join(sections), encoding="utf-8")
+
+    steps = ["Layout", "Schedule", "Tasks", "Inspection", "Handover"]
+    for name in ("a", "b", "c"):
+        write_manual(name, steps)
+    db_path = tmp_path / "rag" / "rag.db"
+    options = {"chunk_size": 100, "chunk_overlap": 0, "chunk_strategy": "structured"}
+    run_reindex_job(source_dir=source_dir, db_path=db_path, embedding_client=DistinctEmbeddingClient(), **options)
+    _assert_sidecar_rows_match_chunks(db_path)
+
+    def full_rebuild(db_path: Path, *, dtype: str) -> None:
+        raise AssertionError("incremental runs must patch the sidecar")
+
+    monkeypatch.setattr(vector_sidecar, "write_vector_sidecar", full_rebuild)
+
+    def incremental() -> None:
+        metrics = run_incremental_reindex_job(
+            source_dir=source_dir,
+            db_path=db_path,
+            embedding_client=DistinctEmbeddingClient(),
+            embed_model="fake-embed",
+            **options,
+        )
+        assert metrics["vector_sidecar"] == dtype
+        _assert_sidecar_rows_match_chunks(db_path)
+
+    # Edit and add documents (d repeats a section of c, sharing its row), remove
+    # one (its rows are refilled from the end of the file), then shift every
+    # chunk of a document by inserting a section in front.
+    write_manual("a", ["Layout, revised", "Handover"])
+    (source_dir / "d.md").write_text(
+        "# Tasks\n\nc Tasks checklist.\n\n# Robot\n\nd Robot checklist.",
+        encoding="utf-8",
+    )
+    incremental()
+    (source_dir / "b.md").unlink()
+    incremental()
+    write_manual("c", ["Safety", *steps])
+    incremental()
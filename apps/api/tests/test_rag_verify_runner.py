@@ -4,7 +4,13 @@ import sqlite3
 
 import pytest
 
-from api.services.rag.verify_index_job_runner import run_verify_index_job
+from api.services.rag import sqlite_store
+from api.services.rag.embedder import _deterministic_embedding
+from api.services.rag.query import cosine_similarity
+from api.services.rag.sqlite_store import load_sqlite_chunks, persist_sqlite_index
+from api.services.rag.types import ChunkRecord, SourceDocument
+from api.services.rag.vector_sidecar import write_vector_sidecar
+from api.services.rag.verify_index_job_runner import _exact_top_chunk_ids, run_verify_index_job
 
 
 class FakeEmbeddingClient:
@@ -139,3 +145,90 @@ def test_run_verify_index_job_fails_when_required_tables_missing(tmp_path: Path)
             sample_query="",
             embedding_client=FakeEmbeddingClient(dimensions=3),
         )
+
+
+def test_run_verify_index_job_reports_quantized_sidecar_recall_and_savings(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    texts = [f"maintenance note {index} automation line {index % 7}" for index in range(40)]
+    chunks = [
+        ChunkRecord(chunk_id=f"doc-1-{index:04d}", doc_id="doc-1", source_path="doc.txt", text=text)
+        for index, text in enumerate(texts)
+    ]
+    persist_sqlite_index(
+        db_path,
+        documents=[SourceDocument(doc_id="doc-1", source_path="doc.txt", text="\n".join(texts))],
+        chunks=chunks,
+        embeddings=[_deterministic_embedding(text, dimensions=32) for text in texts],
+    )
+    assert write_vector_sidecar(db_path, dtype="int8") is not None
+
+    result = run_verify_index_job(
+        db_path=db_path,
+        index_dir=db_path.parent,
+        expected_embed_dim=32,
+        sample_query="maintenance automation",
+        embedding_client=FakeEmbeddingClient(dimensions=32),
+        recall_probes=8,
+    )
+
+    assert result["vector_sidecar"] == "int8"
+    assert result["full_precision_bytes"] == 40 * 32 * 4
+    assert result["memory_savings_ratio"] is not None
+    assert result["memory_savings_ratio"] > 0.5
+    assert result["sidecar_recall_probes"] == 8
+    assert result["sidecar_recall_at_k"] == 1.0
+
+
+def test_run_verify_index_job_without_sidecar_reports_none(tmp_path: Path) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    _create_valid_db(db_path, embedding_dim=3)
+
+    result = run_verify_index_job(
+        db_path=db_path,
+        index_dir=db_path.parent,
+        expected_embed_dim=3,
+        sample_query="maintenance automation",
+        embedding_client=FakeEmbeddingClient(dimensions=3),
+    )
+
+    assert result["vector_sidecar"] == "none"
+    assert result["memory_savings_ratio"] is None
+    assert result["sidecar_recall_at_k"] is None
+
+
+def test_recall_reference_streams_vectors_and_matches_full_sort(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    db_path = tmp_path / "rag_index" / "rag.db"
+    # Repeated texts give tied scores, which must resolve to the lower chunk id.
+    texts = [f"maintenance note {index % 30} automation line {index % 7}" for index in range(120)]
+    chunks = [
+        ChunkRecord(chunk_id=f"doc-1-{index:04d}", doc_id="doc-1", source_path="doc.txt", text=text)
+        for index, text in enumerate(texts)
+    ]
+    persist_sqlite_index(
+        db_path,
+        documents=[SourceDocument(doc_id="doc-1", source_path="doc.txt", text="\n".join(texts))],
+        chunks=chunks,
+        embeddings=[_deterministic_embedding(text, dimensions=16) for text in texts],
+    )
+    stored = load_sqlite_chunks(db_path)
+    probes = [stored[index].embedding for index in (0, 17, 64)] + [_deterministic_embedding("press", dimensions=16)]
+    expected = [
+        {
+            chunk.chunk_id
+            for _, _, chunk in sorted(
+                ((cosine_similarity(probe, chunk.embedding), index, chunk) for index, chunk in enumerate(stored)),
+                key=lambda item: (-item[0], item[1]),
+            )[:10]
+        }
+        for probe in probes
+    ]
+
+    def materialize(*args: object, **kwargs: object) -> None:
+        raise AssertionError("the recall check must not load every chunk")
+
+    monkeypatch.setattr(sqlite_store, "load_sqlite_chunks", materialize)
+
+    assert _exact_top_chunk_ids(db_path, probes, dim=16) == expected
@@ -0,0 +1,174 @@
+from pathlib import Path
+import time
+
+import pytest
+
+from api.services.rag.job_control import CancellationToken
+from api.services.rag.watcher import (
+    InotifyWatcher,
+    PollingWatcher,
+    SourceChanges,
+    watch_source_changes,
+)
+
+
+class ScriptedWatcher:
+    """Replays one scripted batch of changes per poll, then cancels."""
+
+    def __init__(self, script: list[SourceChanges], cancel_token: CancellationToken) -> None:
+        self._script = script
+        self._cancel_token = cancel_token
+
+    def poll(self, timeout_seconds: float) -> SourceChanges:
+        if not self._script:
+            self._cancel_token.cancel()
+            return SourceChanges()
+        return self._script.pop(0)
+
+    def close(self) -> None:
+        return None
+
+
+def _changes(*paths: str, rescan: bool = False) -> SourceChanges:
+    changes = SourceChanges()
+    changes.paths.update(paths)
+    changes.rescan = rescan
+    return changes
+
+
+def test_watch_source_changes_debounces_into_batches() -> None:
+    cancel_token = CancellationToken()
+    watcher = ScriptedWatcher(
+        [_changes("a.md"), _changes("b.md"), SourceChanges(), _changes("c.md", rescan=True), SourceChanges()],
+        cancel_token,
+    )
+    applied: list[set[str] | None] = []
+
+    watch_source_changes(
+        watcher,
+        applied.append,
+        debounce_seconds=0,
+        max_delay_seconds=60,
+        cancel_token=cancel_token,
+    )
+    # Zero debounce: each non-empty poll is flushed on the same tick.
+    assert applied == [{"a.md"}, {"b.md"}, None]
+
+    cancel_token = CancellationToken()
+    watcher = ScriptedWatcher([_changes("a.md"), _changes("b.md"), SourceChanges()], cancel_token)
+    applied = []
+    watch_source_changes(
+        watcher,
+        applied.append,
+        debounce_seconds=60,
+        max_delay_seconds=0,
+        cancel_token=cancel_token,
+    )
+    assert applied == [{"a.md"}, {"b.md"}]
+
+    cancel_token = CancellationToken()
+    watcher = ScriptedWatcher([_changes("a.md"), _changes("b.md"), SourceChanges()], cancel_token)
+    applied = []
+    watch_source_changes(
+        watcher,
+        applied.append,
+        debounce_seconds=60,
+        max_delay_seconds=60,
+        cancel_token=cancel_token,
+    )
+    assert applied == []
+
+
+def test_watch_source_changes_retries_a_failed_batch_with_the_next_one() -> None:
+    cancel_token = CancellationToken()
+    watcher = ScriptedWatcher(
+        [_changes("a.md"), _changes("b.md"), SourceChanges(), _changes("c.md", rescan=True), SourceChanges()],
+        cancel_token,
+    )
+    attempts: list[set[str] | None] = []
+    errors: list[Exception] = []
+
+    def apply_changes(changed_paths: set[str] | None) -> None:
+        attempts.append(None if changed_paths is None else set(changed_paths))
+        if len(attempts) in (1, 3):
+            raise RuntimeError("embedding server unavailable")
+
+    watch_source_changes(
+        watcher,
+        apply_changes,
+        debounce_seconds=0,
+        max_delay_seconds=60,
+        cancel_token=cancel_token,
+        on_error=errors.append,
+    )
+
+    # a.md is not dropped: it is retried together with b.md. A failed rescan
+    # stays a rescan.
+    assert attempts == [{"a.md"}, {"a.md", "b.md"}, None, None]
+    assert [str(error) for error in errors] == ["embedding server unavailable"] * 2
+
+
+def test_watch_source_changes_stops_when_cancelled_during_a_batch() -> None:
+    cancel_token = CancellationToken()
+    watcher = ScriptedWatcher([_changes("a.md"), _changes("b.md")], cancel_token)
+    errors: list[Exception] = []
+
+    def apply_changes(changed_paths: set[str] | None) -> None:
+        cancel_token.cancel()
+        cancel_token.raise_if_cancelled("waiting for the index writer lock")
+
+    watch_source_changes(
+        watcher,
+        apply_changes,
+        debounce_seconds=0,
+        max_delay_seconds=60,
+        cancel_token=cancel_token,
+        on_error=errors.append,
+    )
+
+    assert errors == []
+
+
+def test_polling_watcher_reports_added_changed_and_removed_files(tmp_path: Path) -> None:
+    (tmp_path / "keep.md").write_text("keep", encoding="utf-8")
+    (tmp_path / "edit.md").write_text("before", encoding="utf-8")
+    (tmp_path / "gone.md").write_text("gone", encoding="utf-8")
+    watcher = PollingWatcher(tmp_path, interval_seconds=0)
+
+    (tmp_path / "edit.md").write_text("after the change", encoding="utf-8")
+    (tmp_path / "gone.md").unlink()
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "new.md").write_text("new", encoding="utf-8")
+    (tmp_path / "ignored.pdf").write_text("binary", encoding="utf-8")
+
+    assert watcher.poll(0).paths == {"edit.md", "gone.md", "sub/new.md"}
+    assert not watcher.poll(0)
+
+
+def _poll_until(watcher: InotifyWatcher, expected: set[str]) -> set[str]:
+    seen: set[str] = set()
+    deadline = time.monotonic() + 5
+    while not expected <= seen and time.monotonic() < deadline:
+        seen |= watcher.poll(0.1).paths
+    return seen
+
+
+def test_inotify_watcher_reports_writes_and_new_directories(tmp_path: Path) -> None:
+    (tmp_path / "existing").mkdir()
+    try:
+        watcher = InotifyWatcher(tmp_path)
+    except OSError:
+        pytest.skip("inotify is not available")
+
+    try:
+        (tmp_path / "existing" / "manual.md").write_text("hello", encoding="utf-8")
+        (tmp_path / "notes.pdf").write_text("ignored", encoding="utf-8")
+        assert _poll_until(watcher, {"existing/manual.md"}) == {"existing/manual.md"}
+
+        (tmp_path / "later").mkdir()
+        assert "later" in _poll_until(watcher, {"later"})
+        # The new directory is watched as well.
+        (tmp_path / "later" / "inside.txt").write_text("inside", encoding="utf-8")
+        assert "later/inside.txt" in _poll_until(watcher, {"later/inside.txt"})
+    finally:
+        watcher.close()
@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.config import get_settings
+from api.services.rag.sqlite_store import connect_sqlite
+from api.tracing import TRACEPARENT_ENV, runner_span, start_span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+def _read_spans(trace_file: Path) -> list[dict]:
+    return [json.loads(line) for line in trace_file.read_text().splitlines()]
+
+
+@pytest.fixture
+def trace_file(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_EXPORTER", "file")
+    monkeypatch.setenv("TRACE_FILE", str(path))
+    return path
+
+
+def test_enqueue_stores_request_trace_on_job_row(trace_file: Path, client: TestClient) -> None:
+    response = client.post("/rag/reindex", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"})
+    assert response.status_code == 202
+
+    spans = _read_spans(trace_file)
+    request_span = next(span for span in spans if span["name"] == "POST /rag/reindex")
+    enqueue_span = next(span for span in spans if span["name"] == "enqueue rag_reindex")
+    assert request_span["trace_id"] == TRACE_ID
+    assert request_span["parent_span_id"] == PARENT_SPAN_ID
+    assert request_span["kind"] == "server"
+    assert request_span["attributes"]["http.response.status_code"] == 202
+    assert enqueue_span["parent_span_id"] == request_span["span_id"]
+    assert any(
+        span["attributes"].get("db.system") == "sqlite"
+        and span["name"] == "sqlite INSERT"
+        and span["parent_span_id"] == enqueue_span["span_id"]
+        for span in spans
+    )
+
+    job = client.get(f"/jobs/{response.json()['job_id']}").json()
+    assert job["trace_parent"] == f"00-{TRACE_ID}-{enqueue_span['span_id']}-01"
+
+
+def test_runner_span_joins_traceparent_env_and_traces_sqlite_statements(
+    trace_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    monkeypatch.setenv(TRACEPARENT_ENV, f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01")
+
+    with runner_span("rag_verify_index"):
+        with connect_sqlite(tmp_path / "rag.db") as connection:
+            connection.execute("SELECT 1").fetchall()
+
+    spans = _read_spans(trace_file)
+    runner = next(span for span in spans if span["name"] == "runner rag_verify_index")
+    select = next(span for span in spans if span["name"] == "sqlite SELECT")
+    assert runner["trace_id"] == TRACE_ID
+    assert runner["parent_span_id"] == PARENT_SPAN_ID
+    assert select["parent_span_id"] == runner["span_id"]
+    assert select["attributes"]["db.statement"] == "SELECT 1"
+
+
+def test_spans_are_not_recorded_outside_a_trace_or_when_disabled(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    trace_file: Path,
+) -> None:
+    with connect_sqlite(tmp_path / "rag.db") as connection:
+        connection.execute("SELECT 1").fetchall()
+    assert not trace_file.exists()
+
+    monkeypatch.setenv("TRACE_EXPORTER", "none")
+    get_settings.cache_clear()
+    with start_span("root", root=True) as span:
+        assert not span.recording
+        assert span.traceparent is None
+    assert not trace_file.exists()
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json
 import os
 from random import random
+import secrets
 import subprocess
 from threading import Event, Thread
-from time import sleep
-from typing import Any, Callable
+from time import monotonic, perf_counter, sleep
+import sys
+from typing import IO, Any, Callable
 
 from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Connection, Engine
+
+from worker.metrics import (
+    HEARTBEAT_FAILURES,
+    JOB_CLAIM_SECONDS,
+    JOB_QUEUE_WAIT_SECONDS,
+    JOB_RUN_SECONDS,
+    JOBS_RUNNING,
+    start_metrics_server,
+)
+from worker.tracing import SPAN_EVENT, TRACEPARENT_ENV, current_span, instrument_engine, start_span
 
 SUPPORTED_JOB_TYPES = (
     "rag_reindex",
@@ -26,6 +38,11 @@ RUNNER_MODULE_BY_JOB_TYPE = {
     "rag_verify_index": "api.services.rag.verify_index_job_runner",
 }
 
+_SUBPROCESS_POLL_SECONDS = 1.0
+
+# Runners print `{"event": "progress", ...}` lines before their final result line.
+PROGRESS_EVENT = "progress"
+
 
 def _get_database_url() -> str:
     return os.getenv(
@@ -53,6 +70,16 @@ def _get_default_max_attempts() -> int:
     return max(1, int(value))
 
 
+def _get_lease_seconds() -> int:
+    value = os.getenv("WORKER_LEASE_SECONDS", "60")
+    return max(1, int(value))
+
+
+def _get_cancel_grace_seconds() -> float:
+    value = os.getenv("WORKER_CANCEL_GRACE_SECONDS", "30")
+    return max(1.0, float(value))
+
+
 def _get_retry_base_seconds() -> float:
     value = os.getenv("WORKER_DB_RETRY_BASE_SECONDS", "1")
     return max(0.1, float(value))
@@ -63,10 +90,30 @@ def _get_retry_max_seconds() -> float:
     return max(0.5, float(value))
 
 
+def _get_metrics_port() -> int:
+    # 0 (default) keeps the /metrics endpoint off.
+    value = os.getenv("WORKER_METRICS_PORT", "0")
+    return max(0, int(value))
+
+
+# Same name as api.services.rag.job_control.FINAL_ATTEMPT_ENV.
+FINAL_ATTEMPT_ENV = "JOB_FINAL_ATTEMPT"
+
+
+class JobCancelledError(RuntimeError):
+    pass
+
+
+class LeaseLostError(RuntimeError):
+    """The job's lease now belongs to another claim (or the job left `running`)."""
+
+
 def _create_engine() -> Engine:
-    return create_engine(
-        _get_database_url(),
-        pool_pre_ping=True,
+    return instrument_engine(
+        create_engine(
+            _get_database_url(),
+            pool_pre_ping=True,
+        )
     )
 
 
@@ -102,6 +149,7 @@ def send_heartbeat_once(engine: Engine, worker_id: str) -> None:
             print(f"[worker] heartbeat upserted worker_id={worker_id} at={now.isoformat()}", flush=True)
             return
         except Exception as exc:
+            HEARTBEAT_FAILURES.inc()
             print(
                 f"[worker] heartbeat upsert failed attempt={attempt} error={exc!r}; retrying in {delay:.1f}s",
                 flush=True,
@@ -149,28 +197,185 @@ def _build_job_type_params(job_types: tuple[str, ...]) -> tuple[str, dict[str, s
     return placeholders, params
 
 
+# A job is claimable when it is queued, or when it is running but its worker
+# stopped renewing the lease (crashed or lost its DB connection).
+_CLAIMABLE_PREDICATE = (
+    "(status = 'queued' OR (status = 'running' AND lease_expires_at IS NOT NULL "
+    "AND lease_expires_at < :now))"
+)
+
+# Reclaiming an expired lease counts the lost run as an attempt; once that
+# exhausts max_attempts the job is failed instead, so a job whose runner keeps
+# taking its worker down cannot be reclaimed forever.
+_EXHAUSTED_LEASE_PREDICATE = (
+    "status = 'running' AND lease_expires_at IS NOT NULL AND lease_expires_at < :now "
+    "AND attempts + 1 >= max_attempts"
+)
+
+
+_CLAIM_COLUMNS = (
+    "id, type, payload_json, attempts, max_attempts, cancel_requested, "
+    "status, created_at, updated_at, lease_expires_at, trace_parent"
+)
+
+
+def _new_lease_owner() -> str:
+    # Unique per claim, so a worker that reclaims its own expired job still
+    # cannot finish it through the stale claim.
+    return f"{_get_worker_id()[:47]}:{secrets.token_hex(8)}"
+
+
+def _as_utc(value: Any) -> datetime | None:
+    # SQLite hands timestamps back as text; naive values are UTC (CURRENT_TIMESTAMP).
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _queue_wait_seconds(row: Any, now: datetime) -> float | None:
+    """Seconds since the job became claimable: enqueued/requeued, or its lease expired."""
+    if row["status"] == "running":
+        since = _as_utc(row["lease_expires_at"])
+    else:
+        since = _as_utc(row["updated_at"]) or _as_utc(row["created_at"])
+    if since is None:
+        return None
+    return max(0.0, (now - since).total_seconds())
+
+
+def _claimed_job_from_row(row: Any, now: datetime, lease_owner: str) -> dict[str, Any]:
+    return {
+        "id": _coerce_job_id(row["id"]),
+        "type": str(row["type"]),
+        "payload_json": _normalize_payload(row["payload_json"]),
+        # The claim UPDATE already counted the expired run of a reclaimed job.
+        "attempts": int(row["attempts"] or 0) + (1 if row["status"] == "running" else 0),
+        "max_attempts": int(row["max_attempts"] or _get_default_max_attempts()),
+        "cancel_requested": bool(row["cancel_requested"]),
+        "queue_wait_seconds": _queue_wait_seconds(row, now),
+        "trace_parent": row["trace_parent"],
+        "lease_owner": lease_owner,
+    }
+
+
+def _record_job_event(
+    connection: Connection,
+    job_id: int | str,
+    event: str,
+    *,
+    wait_seconds: float | None = None,
+    run_seconds: float | None = None,
+) -> None:
+    """Append to job_events in the caller's transaction; the type is copied from the jobs row."""
+    connection.execute(
+        text(
+            """
+            INSERT INTO job_events (job_id, type, event, wait_seconds, run_seconds, created_at)
+            SELECT id, type, :event, :wait_seconds, :run_seconds, :created_at
+            FROM jobs
+            WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT)
+            """
+        ),
+        {
+            "job_id": job_id,
+            "event": event,
+            "wait_seconds": wait_seconds,
+            "run_seconds": run_seconds,
+            "created_at": datetime.now(timezone.utc),
+        },
+    )
+
+
 def _claim_next_job(engine: Engine, *, job_types: tuple[str, ...]) -> dict[str, Any] | None:
     if not job_types:
         return None
 
+    with JOB_CLAIM_SECONDS.time():
+        job = _claim_job(engine, job_types=job_types)
+    if job is not None and job["queue_wait_seconds"] is not None:
+        JOB_QUEUE_WAIT_SECONDS.observe(job["queue_wait_seconds"], type=job["type"])
+    return job
+
+
+def _fail_exhausted_leases(
+    connection: Connection,
+    *,
+    placeholders: str,
+    params: dict[str, Any],
+) -> None:
+    rows = connection.execute(
+        text(
+            "SELECT id, attempts FROM jobs WHERE type IN ("
+            + placeholders
+            + ") AND "
+            + _EXHAUSTED_LEASE_PREDICATE
+        ),
+        params,
+    ).mappings().all()
+    for row in rows:
+        job_id = _coerce_job_id(row["id"])
+        failed = connection.execute(
+            text(
+                """
+                UPDATE jobs
+                SET status = 'failed',
+                    attempts = attempts + 1,
+                    error = :error,
+                    finished_at = CURRENT_TIMESTAMP,
+                    lease_expires_at = NULL,
+                    lease_owner = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT) AND """
+                + _EXHAUSTED_LEASE_PREDICATE
+            ),
+            {"job_id": job_id, "now": params["now"], "error": "lease expired on the last attempt"},
+        )
+        if failed.rowcount == 1:
+            _record_job_event(connection, job_id, "failed")
+            print(
+                f"[worker] job failed job_id={job_id} attempts={int(row['attempts']) + 1} error=lease expired",
+                flush=True,
+            )
+
+
+def _claim_job(engine: Engine, *, job_types: tuple[str, ...]) -> dict[str, Any] | None:
     placeholders, type_params = _build_job_type_params(job_types)
 
+    now = datetime.now(timezone.utc)
+    claim_params = {
+        **type_params,
+        "now": now,
+        "lease_expires_at": now + timedelta(seconds=_get_lease_seconds()),
+    }
+    lease_owner = _new_lease_owner()
+
     if engine.dialect.name == "postgresql":
         with engine.begin() as connection:
+            _fail_exhausted_leases(connection, placeholders=placeholders, params=claim_params)
             row = connection.execute(
                 text(
                     """
-                    SELECT id, type, payload_json, attempts, max_attempts
+                    SELECT """
+                    + _CLAIM_COLUMNS
+                    + """
                     FROM jobs
-                    WHERE status = 'queued' AND type IN ("""
+                    WHERE type IN ("""
                     + placeholders
                     + """)
+                      AND """
+                    + _CLAIMABLE_PREDICATE
+                    + """
                     ORDER BY created_at ASC, id ASC
                     FOR UPDATE SKIP LOCKED
                     LIMIT 1
                     """
                 ),
-                type_params,
+                claim_params,
             ).mappings().first()
             if row is None:
                 return None
@@ -180,38 +385,47 @@ def _claim_next_job(engine: Engine, *, job_types: tuple[str, ...]) -> dict[str,
                     """
                     UPDATE jobs
                     SET status = 'running',
+                        attempts = attempts + CASE WHEN status = 'running' THEN 1 ELSE 0 END,
                         started_at = CURRENT_TIMESTAMP,
                         updated_at = CURRENT_TIMESTAMP,
+                        lease_expires_at = :lease_expires_at,
+                        lease_owner = :lease_owner,
                         finished_at = NULL,
                         error = NULL
                     WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT)
                     """
                 ),
-                {"job_id": _coerce_job_id(row["id"])},
+                {
+                    "job_id": _coerce_job_id(row["id"]),
+                    "lease_expires_at": claim_params["lease_expires_at"],
+                    "lease_owner": lease_owner,
+                },
             )
 
-            return {
-                "id": _coerce_job_id(row["id"]),
-                "type": str(row["type"]),
-                "payload_json": _normalize_payload(row["payload_json"]),
-                "attempts": int(row["attempts"] or 0),
-                "max_attempts": int(row["max_attempts"] or _get_default_max_attempts()),
-            }
+            job = _claimed_job_from_row(row, now, lease_owner)
+            _record_job_event(connection, job["id"], "claimed", wait_seconds=job["queue_wait_seconds"])
+            return job
 
     with engine.begin() as connection:
+        _fail_exhausted_leases(connection, placeholders=placeholders, params=claim_params)
         row = connection.execute(
             text(
                 """
-                SELECT id, type, payload_json, attempts, max_attempts
+                SELECT """
+                + _CLAIM_COLUMNS
+                + """
                 FROM jobs
-                WHERE status = 'queued' AND type IN ("""
+                WHERE type IN ("""
                 + placeholders
                 + """)
+                  AND """
+                + _CLAIMABLE_PREDICATE
+                + """
                 ORDER BY created_at ASC, id ASC
                 LIMIT 1
                 """
             ),
-            type_params,
+            claim_params,
         ).mappings().first()
         if row is None:
             return None
@@ -221,25 +435,29 @@ def _claim_next_job(engine: Engine, *, job_types: tuple[str, ...]) -> dict[str,
                 """
                 UPDATE jobs
                 SET status = 'running',
+                    attempts = attempts + CASE WHEN status = 'running' THEN 1 ELSE 0 END,
                     started_at = CURRENT_TIMESTAMP,
                     updated_at = CURRENT_TIMESTAMP,
+                    lease_expires_at = :lease_expires_at,
+                    lease_owner = :lease_owner,
                     finished_at = NULL,
                     error = NULL
-                WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT) AND status = 'queued'
-                """
+                WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT) AND """
+                + _CLAIMABLE_PREDICATE
             ),
-            {"job_id": _coerce_job_id(row["id"])},
+            {
+                "job_id": _coerce_job_id(row["id"]),
+                "now": now,
+                "lease_expires_at": claim_params["lease_expires_at"],
+                "lease_owner": lease_owner,
+            },
         )
         if claimed.rowcount != 1:
             return None
 
-        return {
-            "id": _coerce_job_id(row["id"]),
-            "type": str(row["type"]),
-            "payload_json": _normalize_payload(row["payload_json"]),
-            "attempts": int(row["attempts"] or 0),
-            "max_attempts": int(row["max_attempts"] or _get_default_max_attempts()),
-        }
+        job = _claimed_job_from_row(row, now, lease_owner)
+        _record_job_event(connection, job["id"], "claimed", wait_seconds=job["queue_wait_seconds"])
+        return job
 
 
 def _claim_next_rag_reindex_job(engine: Engine) -> dict[str, Any] | None:
@@ -259,8 +477,24 @@ def _build_subprocess_env(api_project_dir: str) -> dict[str, str]:
         "RAG_SOURCE_DIR",
         "RAG_INDEX_DIR",
         "RAG_DB_PATH",
+        "RAG_COLLECTIONS",
+        "RAG_INDEX_GENERATIONS_KEEP",
         "RAG_EXPECTED_EMBED_DIM",
         "RAG_VERIFY_SAMPLE_QUERY",
+        "RAG_CHUNK_SIZE",
+        "RAG_CHUNK_OVERLAP",
+        "RAG_CHUNK_STRATEGY",
+        "RAG_EMBED_BATCH_SIZE",
+        "RAG_INGEST_WORKERS",
+        "RAG_VECTOR_SIDECAR",
+        "RAG_TEXT_COMPRESSION",
+        "RAG_RERANK_FACTOR",
+        "RAG_SEARCH_MODE",
+        "RAG_FTS_PREFILTER",
+        "RAG_FTS_CANDIDATES",
+        "RAG_COLLAPSE_DUPLICATES",
+        "TRACE_EXPORTER",
+        "TRACE_FILE",
     ]
     for key in keys_to_propagate:
         value = os.getenv(key)
@@ -268,10 +502,109 @@ def _build_subprocess_env(api_project_dir: str) -> dict[str, str]:
             env[key] = value
 
     env["WORKER_API_PROJECT_DIR"] = api_project_dir
+    env["OTEL_SERVICE_NAME"] = "runner"
+    # The runner's root span becomes a child of the span running it.
+    traceparent = current_span().traceparent
+    if traceparent is not None:
+        env[TRACEPARENT_ENV] = traceparent
+    else:
+        env.pop(TRACEPARENT_ENV, None)
     return env
 
 
-def _run_job_subprocess(job_type: str, payload_json: dict[str, Any] | None = None) -> dict[str, Any]:
+def _parse_event_line(line: str) -> dict[str, Any] | None:
+    stripped = line.strip()
+    if not stripped.startswith("{"):
+        return None
+    try:
+        parsed = json.loads(stripped)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(parsed, dict) or parsed.get("event") not in (PROGRESS_EVENT, SPAN_EVENT):
+        return None
+    return parsed
+
+
+def _parse_progress_line(line: str) -> dict[str, Any] | None:
+    parsed = _parse_event_line(line)
+    if parsed is None or parsed["event"] != PROGRESS_EVENT:
+        return None
+    return {key: value for key, value in parsed.items() if key != "event"}
+
+
+def _pump_stdout(
+    stream: IO[str],
+    lines: list[str],
+    on_progress: Callable[[dict[str, Any]], None] | None,
+) -> None:
+    for line in stream:
+        parsed = _parse_event_line(line)
+        if parsed is None:
+            lines.append(line)
+            continue
+        if parsed["event"] == SPAN_EVENT:
+            # Runner spans exported to stdout (TRACE_EXPORTER=stdout) go out on ours.
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            continue
+        if on_progress is None:
+            continue
+        try:
+            on_progress({key: value for key, value in parsed.items() if key != "event"})
+        except Exception as exc:
+            print(f"[worker] progress update failed error={exc!r}", flush=True)
+
+
+def _wait_for_subprocess(
+    process: subprocess.Popen[str],
+    *,
+    cancel_event: Event | None,
+    on_progress: Callable[[dict[str, Any]], None] | None = None,
+) -> tuple[str, str, bool]:
+    stdout_stream = process.stdout
+    stderr_stream = process.stderr
+    if stdout_stream is None or stderr_stream is None:
+        raise RuntimeError("subprocess runner must be started with stdout/stderr pipes")
+
+    stdout_lines: list[str] = []
+    stderr_chunks: list[str] = []
+    readers = [
+        Thread(target=_pump_stdout, args=(stdout_stream, stdout_lines, on_progress), daemon=True),
+        Thread(target=lambda: stderr_chunks.append(stderr_stream.read()), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    terminate_deadline: float | None = None
+    while True:
+        try:
+            process.wait(timeout=_SUBPROCESS_POLL_SECONDS)
+        except subprocess.TimeoutExpired:
+            if cancel_event is None or not cancel_event.is_set():
+                continue
+            if terminate_deadline is None:
+                # SIGTERM lets the runner stop at its next batch boundary.
+                process.terminate()
+                terminate_deadline = monotonic() + _get_cancel_grace_seconds()
+            elif monotonic() >= terminate_deadline:
+                process.kill()
+            continue
+        break
+
+    for reader in readers:
+        reader.join()
+    return "".join(stdout_lines), "".join(stderr_chunks), terminate_deadline is not None
+
+
+def _run_job_subprocess(
+    job_type: str,
+    payload_json: dict[str, Any] | None = None,
+    *,
+    cancel_event: Event | None = None,
+    on_progress: Callable[[dict[str, Any]], None] | None = None,
+    job_id: int | str | None = None,
+    final_attempt: bool = False,
+) -> dict[str, Any]:
     if job_type not in RUNNER_MODULE_BY_JOB_TYPE:
         raise RuntimeError(f"unsupported job type for subprocess runner: {job_type}")
 
@@ -287,28 +620,53 @@ def _run_job_subprocess(job_type: str, payload_json: dict[str, Any] | None = Non
     ]
     if payload_json is not None:
         command.extend(["--payload-json", json.dumps(payload_json)])
-
-    completed = subprocess.run(
-        command,
-        capture_output=True,
-        text=True,
-        check=False,
-        cwd="/workspace",
-        env=_build_subprocess_env(api_project_dir),
-    )
-    if completed.returncode != 0:
-        stderr = completed.stderr.strip() or completed.stdout.strip()
+    if job_id is not None:
+        # Lets runners recognise a retry of the same job and resume staged work.
+        command.extend(["--job-id", str(job_id)])
+
+    with start_span(
+        f"subprocess {job_type}",
+        kind="client",
+        attributes={"job.runner": RUNNER_MODULE_BY_JOB_TYPE[job_type]},
+    ) as span:
+        env = _build_subprocess_env(api_project_dir)
+        if final_attempt:
+            # A failure will not be retried, so runners drop resumable state.
+            env[FINAL_ATTEMPT_ENV] = "1"
+        else:
+            env.pop(FINAL_ATTEMPT_ENV, None)
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd="/workspace",
+            env=env,
+        )
+        stdout, stderr, cancelled = _wait_for_subprocess(
+            process,
+            cancel_event=cancel_event,
+            on_progress=on_progress,
+        )
+        span.set_attribute("process.exit.code", process.returncode)
+        if process.returncode != 0:
+            span.record_error(f"exit={process.returncode}")
+    if cancelled:
+        raise JobCancelledError(f"{job_type} cancelled (exit={process.returncode})")
+
+    if process.returncode != 0:
+        stderr = stderr.strip() or stdout.strip()
         stderr_first_line = stderr.splitlines()[0] if stderr else "<empty>"
         print(
             (
                 f"[worker] {job_type} subprocess failed "
-                f"exit={completed.returncode} stderr_first={stderr_first_line}"
+                f"exit={process.returncode} stderr_first={stderr_first_line}"
             ),
             flush=True,
         )
-        raise RuntimeError(f"{job_type} subprocess failed (exit={completed.returncode}): {stderr}")
+        raise RuntimeError(f"{job_type} subprocess failed (exit={process.returncode}): {stderr}")
 
-    output = completed.stdout.strip().splitlines()
+    output = stdout.strip().splitlines()
     if not output:
         raise RuntimeError(f"{job_type} subprocess produced no output")
 
@@ -326,9 +684,24 @@ def _run_reindex_subprocess(payload_json: dict[str, Any] | None = None) -> dict[
     return _run_job_subprocess("rag_reindex", payload_json)
 
 
-def _mark_job_succeeded(engine: Engine, job_id: int | str, result_json: dict[str, Any]) -> None:
+# Every write made on behalf of a claim must still hold its lease; a worker
+# whose lease was reclaimed must not overwrite the new owner's job state.
+_LEASE_HELD_PREDICATE = (
+    "CAST(id AS TEXT) = CAST(:job_id AS TEXT) AND status = 'running' AND lease_owner = :lease_owner"
+)
+
+
+def _mark_job_succeeded(
+    engine: Engine,
+    job_id: int | str,
+    result_json: dict[str, Any],
+    *,
+    lease_owner: str,
+    run_seconds: float | None = None,
+) -> bool:
+    """Record success; False (and no change) when the lease is no longer held."""
     with engine.begin() as connection:
-        connection.execute(
+        updated = connection.execute(
             text(
                 """
                 UPDATE jobs
@@ -336,11 +709,38 @@ def _mark_job_succeeded(engine: Engine, job_id: int | str, result_json: dict[str
                     result_json = :result_json,
                     finished_at = CURRENT_TIMESTAMP,
                     updated_at = CURRENT_TIMESTAMP,
+                    lease_expires_at = NULL,
+                    lease_owner = NULL,
                     error = NULL
-                WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT)
+                WHERE """
+                + _LEASE_HELD_PREDICATE
+            ),
+            {"job_id": job_id, "lease_owner": lease_owner, "result_json": json.dumps(result_json)},
+        )
+        if updated.rowcount != 1:
+            return False
+        _record_job_event(connection, job_id, "succeeded", run_seconds=run_seconds)
+    return True
+
+
+def _update_job_progress(
+    engine: Engine,
+    job_id: int | str,
+    progress: dict[str, Any],
+    *,
+    lease_owner: str,
+) -> None:
+    with engine.begin() as connection:
+        connection.execute(
+            text(
                 """
+                UPDATE jobs
+                SET progress_json = :progress_json,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE """
+                + _LEASE_HELD_PREDICATE
             ),
-            {"job_id": job_id, "result_json": json.dumps(result_json)},
+            {"job_id": job_id, "lease_owner": lease_owner, "progress_json": json.dumps(progress)},
         )
 
 
@@ -351,12 +751,15 @@ def _mark_job_failure(
     attempts: int,
     max_attempts: int,
     error_message: str,
-) -> None:
+    lease_owner: str,
+    run_seconds: float | None = None,
+) -> bool:
+    """Requeue or fail the attempt; False (and no change) when the lease is no longer held."""
     next_attempts = attempts + 1
     requeue = next_attempts < max_attempts
 
     with engine.begin() as connection:
-        connection.execute(
+        updated = connection.execute(
             text(
                 """
                 UPDATE jobs
@@ -365,17 +768,114 @@ def _mark_job_failure(
                     error = :error,
                     finished_at = CASE WHEN CAST(:status AS VARCHAR) = 'failed' THEN CURRENT_TIMESTAMP ELSE NULL END,
                     started_at = CASE WHEN CAST(:status AS VARCHAR) = 'queued' THEN NULL ELSE started_at END,
+                    lease_expires_at = NULL,
+                    lease_owner = NULL,
                     updated_at = CURRENT_TIMESTAMP
-                WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT)
-                """
+                WHERE """
+                + _LEASE_HELD_PREDICATE
             ),
             {
                 "job_id": job_id,
+                "lease_owner": lease_owner,
                 "status": "queued" if requeue else "failed",
                 "attempts": next_attempts,
                 "error": error_message,
             },
         )
+        if updated.rowcount != 1:
+            return False
+        _record_job_event(connection, job_id, "requeued" if requeue else "failed", run_seconds=run_seconds)
+    return True
+
+
+def _mark_job_cancelled(
+    engine: Engine,
+    job_id: int | str,
+    reason: str,
+    *,
+    lease_owner: str,
+    run_seconds: float | None = None,
+) -> bool:
+    """Record cancellation; False (and no change) when the lease is no longer held."""
+    with engine.begin() as connection:
+        updated = connection.execute(
+            text(
+                """
+                UPDATE jobs
+                SET status = 'cancelled',
+                    error = :error,
+                    finished_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP,
+                    lease_expires_at = NULL,
+                    lease_owner = NULL
+                WHERE """
+                + _LEASE_HELD_PREDICATE
+            ),
+            {"job_id": job_id, "lease_owner": lease_owner, "error": reason},
+        )
+        if updated.rowcount != 1:
+            return False
+        _record_job_event(connection, job_id, "cancelled", run_seconds=run_seconds)
+    return True
+
+
+def _renew_job_lease(engine: Engine, job_id: int | str, lease_owner: str, lease_seconds: int) -> bool:
+    """Extend the lease held by `lease_owner` and report whether cancellation was requested.
+
+    Raises LeaseLostError when the job was reclaimed or is no longer running.
+    """
+    with engine.begin() as connection:
+        renewed = connection.execute(
+            text(
+                """
+                UPDATE jobs
+                SET lease_expires_at = :lease_expires_at
+                WHERE """
+                + _LEASE_HELD_PREDICATE
+            ),
+            {
+                "job_id": job_id,
+                "lease_owner": lease_owner,
+                "lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds),
+            },
+        )
+        if renewed.rowcount != 1:
+            raise LeaseLostError(f"job {job_id} is no longer leased by {lease_owner}")
+        row = connection.execute(
+            text("SELECT cancel_requested FROM jobs WHERE CAST(id AS TEXT) = CAST(:job_id AS TEXT)"),
+            {"job_id": job_id},
+        ).first()
+
+    return row is not None and bool(row[0])
+
+
+def _lease_loop(
+    engine: Engine,
+    job_id: int | str,
+    lease_owner: str,
+    lease_seconds: int,
+    stop_event: Event,
+    cancel_event: Event,
+) -> None:
+    """Renew the lease until stopped; stop the runner once the lease is lost or has lapsed."""
+    interval_seconds = max(0.1, lease_seconds / 3)
+    renewed_at = monotonic()
+    while not stop_event.wait(interval_seconds):
+        try:
+            if _renew_job_lease(engine, job_id, lease_owner, lease_seconds):
+                cancel_event.set()
+            renewed_at = monotonic()
+        except LeaseLostError as exc:
+            print(f"[worker] lease lost job_id={job_id} error={exc}; stopping runner", flush=True)
+            cancel_event.set()
+            return
+        except Exception as exc:
+            print(f"[worker] lease renewal failed job_id={job_id} error={exc!r}", flush=True)
+            # Past this point another worker may already have reclaimed the job.
+            if monotonic() - renewed_at >= lease_seconds:
+                print(f"[worker] lease expired job_id={job_id}; stopping runner", flush=True)
+                cancel_event.set()
+                return
 
 
 def _process_claimed_job(
@@ -383,23 +883,94 @@ def _process_claimed_job(
     job: dict[str, Any],
     *,
     runner: Callable[[dict[str, Any] | None], dict[str, Any]],
+    cancel_event: Event | None = None,
 ) -> None:
+    job_type = str(job.get("type", "unknown"))
+    # Continues the trace of the request that enqueued the job, if it had one.
+    with start_span(
+        f"job {job_type}",
+        parent=job.get("trace_parent"),
+        root=True,
+        kind="consumer",
+        attributes={
+            "job.id": str(job["id"]),
+            "job.type": job_type,
+            "job.attempt": int(job.get("attempts", 0)) + 1,
+            "job.queue_wait_seconds": job.get("queue_wait_seconds"),
+        },
+    ) as span:
+        outcome = _run_claimed_job(engine, job, runner=runner, cancel_event=cancel_event)
+        span.set_attribute("job.outcome", outcome)
+        if outcome in ("requeued", "failed"):
+            span.record_error(f"job {outcome}")
+
+
+def _report_lease_lost(job_id: int | str, job_type: str, run_seconds: float | None = None) -> str:
+    if run_seconds is not None:
+        JOB_RUN_SECONDS.observe(run_seconds, type=job_type, outcome="lease_lost")
+    print(f"[worker] lease lost job_id={job_id} type={job_type}; result discarded", flush=True)
+    return "lease_lost"
+
+
+def _run_claimed_job(
+    engine: Engine,
+    job: dict[str, Any],
+    *,
+    runner: Callable[[dict[str, Any] | None], dict[str, Any]],
+    cancel_event: Event | None,
+) -> str:
+    """Run a claimed job to its next state and return it.
+
+    The outcome is succeeded, requeued, failed or cancelled, or lease_lost when
+    another claim took the job over and this run's result was discarded.
+    """
     job_id = _coerce_job_id(job["id"])
+    lease_owner = str(job["lease_owner"])
     job_type = str(job.get("type", "unknown"))
     attempts = int(job.get("attempts", 0))
     max_attempts = int(job.get("max_attempts") or _get_default_max_attempts())
     payload = _normalize_payload(job.get("payload_json"))
 
+    if job.get("cancel_requested"):
+        if not _mark_job_cancelled(engine, job_id, "cancel requested before start", lease_owner=lease_owner):
+            return _report_lease_lost(job_id, job_type)
+        print(f"[worker] job cancelled job_id={job_id} type={job_type} before start", flush=True)
+        return "cancelled"
+
+    cancel_event = cancel_event or Event()
+    stop_event = Event()
+    lease_thread = Thread(
+        target=_lease_loop,
+        args=(engine, job_id, lease_owner, _get_lease_seconds(), stop_event, cancel_event),
+        daemon=True,
+    )
+    lease_thread.start()
+
+    start = perf_counter()
     try:
-        result_json = runner(payload)
+        with JOBS_RUNNING.track_inprogress(type=job_type):
+            result_json = runner(payload)
     except Exception as exc:
-        _mark_job_failure(
+        run_seconds = perf_counter() - start
+        if isinstance(exc, JobCancelledError) or cancel_event.is_set():
+            if not _mark_job_cancelled(engine, job_id, str(exc), lease_owner=lease_owner, run_seconds=run_seconds):
+                return _report_lease_lost(job_id, job_type, run_seconds)
+            JOB_RUN_SECONDS.observe(run_seconds, type=job_type, outcome="cancelled")
+            print(f"[worker] job cancelled job_id={job_id} type={job_type} reason={exc}", flush=True)
+            return "cancelled"
+
+        if not _mark_job_failure(
             engine,
             job_id=job_id,
             attempts=attempts,
             max_attempts=max_attempts,
             error_message=str(exc),
-        )
+            lease_owner=lease_owner,
+            run_seconds=run_seconds,
+        ):
+            return _report_lease_lost(job_id, job_type, run_seconds)
+        outcome = "requeued" if attempts + 1 < max_attempts else "failed"
+        JOB_RUN_SECONDS.observe(run_seconds, type=job_type, outcome=outcome)
         print(
             (
                 f"[worker] job failed job_id={job_id} type={job_type} "
@@ -407,13 +978,43 @@ def _process_claimed_job(
             ),
             flush=True,
         )
-        return
-
-    _mark_job_succeeded(engine, job_id, result_json)
+        return outcome
+    finally:
+        stop_event.set()
+        lease_thread.join()
+
+    run_seconds = perf_counter() - start
+    if not _mark_job_succeeded(engine, job_id, result_json, lease_owner=lease_owner, run_seconds=run_seconds):
+        return _report_lease_lost(job_id, job_type, run_seconds)
+    JOB_RUN_SECONDS.observe(run_seconds, type=job_type, outcome="succeeded")
     print(
         f"[worker] job succeeded job_id={job_id} type={job_type} result={result_json}",
         flush=True,
     )
+    return "succeeded"
+
+
+def _subprocess_runner(
+    engine: Engine,
+    job: dict[str, Any],
+    cancel_event: Event,
+) -> Callable[[dict[str, Any] | None], dict[str, Any]]:
+    job_type = str(job.get("type", ""))
+    job_id = _coerce_job_id(job["id"])
+    lease_owner = str(job["lease_owner"])
+    final_attempt = int(job["attempts"]) + 1 >= int(job["max_attempts"])
+
+    def run(payload: dict[str, Any] | None) -> dict[str, Any]:
+        return _run_job_subprocess(
+            job_type,
+            payload,
+            cancel_event=cancel_event,
+            on_progress=lambda progress: _update_job_progress(engine, job_id, progress, lease_owner=lease_owner),
+            job_id=job_id,
+            final_attempt=final_attempt,
+        )
+
+    return run
 
 
 def main() -> None:
@@ -421,6 +1022,10 @@ def main() -> None:
     heartbeat_seconds = _get_heartbeat_seconds()
     poll_seconds = _get_poll_seconds()
     engine = _create_engine()
+    metrics_port = _get_metrics_port()
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        print(f"[worker] metrics listening on :{metrics_port}/metrics", flush=True)
 
     stop_event = Event()
     heartbeat_thread = Thread(
@@ -436,11 +1041,12 @@ def main() -> None:
             sleep(poll_seconds)
             continue
 
-        job_type = str(job.get("type", ""))
+        cancel_event = Event()
         _process_claimed_job(
             engine,
             job,
-            runner=lambda payload, *, _job_type=job_type: _run_job_subprocess(_job_type, payload),
+            runner=_subprocess_runner(engine, job, cancel_event),
+            cancel_event=cancel_event,
         )
 
 
@@ -1,12 +1,25 @@
+from datetime import datetime, timedelta, timezone
+import io
+import json
+from threading import Event
+from urllib.request import urlopen
+
+import pytest
 from sqlalchemy import create_engine, text
 
 from worker.main import (
+    JobCancelledError,
+    LeaseLostError,
     _claim_next_job,
     _claim_next_rag_reindex_job,
     _coerce_job_id,
     _process_claimed_job,
+    _renew_job_lease,
     _run_job_subprocess,
+    _update_job_progress,
 )
+from worker.metrics import JOB_QUEUE_WAIT_SECONDS, JOB_RUN_SECONDS, start_metrics_server
+from worker.tracing import instrument_engine
 
 
 def _create_schema(engine) -> None:
@@ -26,7 +39,27 @@ def _create_schema(engine) -> None:
                     started_at TIMESTAMP,
                     finished_at TIMESTAMP,
                     error TEXT,
-                    result_json TEXT
+                    result_json TEXT,
+                    progress_json TEXT,
+                    cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+                    lease_expires_at TIMESTAMP,
+                    lease_owner VARCHAR(64),
+                    trace_parent VARCHAR(55)
+                )
+                """
+            )
+        )
+        connection.execute(
+            text(
+                """
+                CREATE TABLE job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id VARCHAR(64) NOT NULL,
+                    type VARCHAR(32) NOT NULL,
+                    event VARCHAR(16) NOT NULL,
+                    wait_seconds FLOAT,
+                    run_seconds FLOAT,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
                 )
                 """
             )
@@ -225,20 +258,20 @@ def test_run_job_subprocess_propagates_ollama_and_rag_env(monkeypatch) -> None:
 
     captured: dict[str, object] = {}
 
-    class _Completed:
-        def __init__(self) -> None:
+    class _Process:
+        def __init__(self, command, **kwargs) -> None:
+            captured["command"] = command
+            captured["kwargs"] = kwargs
             self.returncode = 0
-            self.stdout = "{\"ok\": true}\n"
-            self.stderr = ""
+            self.stdout = io.StringIO("{\"ok\": true}\n")
+            self.stderr = io.StringIO("")
 
-    def fake_run(command, **kwargs):
-        captured["command"] = command
-        captured["kwargs"] = kwargs
-        return _Completed()
+        def wait(self, timeout=None):
+            return self.returncode
 
-    monkeypatch.setattr("worker.main.subprocess.run", fake_run)
+    monkeypatch.setattr("worker.main.subprocess.Popen", _Process)
 
-    result = _run_job_subprocess("rag_reindex_incremental", {"requested_by": "test"})
+    result = _run_job_subprocess("rag_reindex_incremental", {"requested_by": "test"}, job_id=5)
 
     assert result == {"ok": True}
     command = captured["command"]
@@ -247,6 +280,7 @@ def test_run_job_subprocess_propagates_ollama_and_rag_env(monkeypatch) -> None:
     assert isinstance(kwargs, dict)
     assert "api.services.rag.incremental_reindex_job_runner" in command
     assert "--payload-json" in command
+    assert command[-2:] == ["--job-id", "5"]
     assert kwargs["cwd"] == "/workspace"
     env = kwargs["env"]
     assert isinstance(env, dict)
@@ -255,3 +289,428 @@ def test_run_job_subprocess_propagates_ollama_and_rag_env(monkeypatch) -> None:
     assert env["OLLAMA_EMBED_MODEL"] == "nomic-embed-text"
     assert env["RAG_DB_PATH"] == "/workspace/data/rag_index/rag.db"
     assert env["RAG_EXPECTED_EMBED_DIM"] == "768"
+    assert "JOB_FINAL_ATTEMPT" not in env
+
+    _run_job_subprocess("rag_reindex", None, job_id=5, final_attempt=True)
+
+    env = captured["kwargs"]["env"]  # type: ignore[index]
+    assert env["JOB_FINAL_ATTEMPT"] == "1"
+
+
+def test_claim_sets_lease_and_reclaims_expired_running_job(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-lease.db'}")
+    _create_schema(engine)
+
+    expired = datetime.now(timezone.utc) - timedelta(minutes=5)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, lease_expires_at)
+                VALUES ('6', 'rag_reindex', 'running', 0, 3, :expired)
+                """
+            ),
+            {"expired": expired},
+        )
+
+    job = _claim_next_rag_reindex_job(engine)
+    assert job is not None
+    assert job["id"] == 6
+    # The run whose worker stopped renewing counts as an attempt.
+    assert job["attempts"] == 1
+
+    with engine.connect() as connection:
+        row = connection.execute(
+            text("SELECT status, lease_expires_at, attempts FROM jobs WHERE id = '6'")
+        ).fetchone()
+
+    assert row is not None
+    assert row[0] == "running"
+    assert str(row[1]) > str(expired)
+    assert row[2] == 1
+
+    # The lease was just renewed by the claim, so nobody else may take it.
+    assert _claim_next_rag_reindex_job(engine) is None
+
+
+def test_claim_fails_expired_job_on_its_last_attempt_instead_of_reclaiming(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-lease-exhausted.db'}")
+    _create_schema(engine)
+
+    expired = datetime.now(timezone.utc) - timedelta(minutes=5)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, lease_expires_at, created_at)
+                VALUES ('16', 'rag_reindex', 'running', 2, 3, :expired, '2026-01-01 00:00:00'),
+                       ('17', 'rag_reindex', 'queued', 0, 3, NULL, '2026-01-02 00:00:00')
+                """
+            ),
+            {"expired": expired},
+        )
+
+    job = _claim_next_rag_reindex_job(engine)
+    assert job is not None
+    assert job["id"] == 17
+
+    with engine.connect() as connection:
+        row = connection.execute(
+            text("SELECT status, attempts, lease_expires_at, finished_at, error FROM jobs WHERE id = '16'")
+        ).fetchone()
+        events = connection.execute(
+            text("SELECT event FROM job_events WHERE job_id = '16'")
+        ).scalars().all()
+
+    assert row is not None
+    assert row[0] == "failed"
+    assert row[1] == 3
+    assert row[2] is None
+    assert row[3] is not None
+    assert "lease expired" in row[4]
+    assert events == ["failed"]
+
+
+def test_renew_job_lease_reports_cancel_request(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-renew.db'}")
+    _create_schema(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, cancel_requested, lease_owner)
+                VALUES ('7', 'rag_reindex', 'running', 0, 3, 1, 'worker-1:a')
+                """
+            )
+        )
+
+    assert _renew_job_lease(engine, 7, "worker-1:a", lease_seconds=60) is True
+
+    with engine.connect() as connection:
+        lease_expires_at = connection.execute(
+            text("SELECT lease_expires_at FROM jobs WHERE id = '7'")
+        ).scalar_one()
+
+    assert lease_expires_at is not None
+
+
+def test_renew_job_lease_raises_when_another_claim_owns_the_lease(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-renew-lost.db'}")
+    _create_schema(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, lease_owner)
+                VALUES ('18', 'rag_reindex', 'running', 1, 3, 'worker-2:b')
+                """
+            )
+        )
+
+    with pytest.raises(LeaseLostError):
+        _renew_job_lease(engine, 18, "worker-1:a", lease_seconds=60)
+
+    with engine.connect() as connection:
+        lease_expires_at = connection.execute(
+            text("SELECT lease_expires_at FROM jobs WHERE id = '18'")
+        ).scalar_one()
+
+    assert lease_expires_at is None
+
+
+def test_worker_that_lost_its_lease_stops_runner_and_leaves_new_owner_row(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("WORKER_LEASE_SECONDS", "1")
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-lease-lost.db'}")
+    _create_schema(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts)
+                VALUES ('19', 'rag_reindex', 'queued', 0, 3)
+                """
+            )
+        )
+
+    job = _claim_next_rag_reindex_job(engine)
+    assert job is not None
+    assert job["lease_owner"].startswith("worker-1:")
+
+    # Another worker reclaimed the job while this one was stalled.
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE jobs SET lease_owner = 'worker-2:b', attempts = 1 WHERE id = '19'"))
+
+    cancel_event = Event()
+
+    def runner(_payload):
+        if not cancel_event.wait(timeout=5):
+            raise AssertionError("lease renewal never noticed the lost lease")
+        raise JobCancelledError("terminated")
+
+    _process_claimed_job(engine, job, runner=runner, cancel_event=cancel_event)
+
+    with engine.connect() as connection:
+        row = connection.execute(
+            text("SELECT status, attempts, lease_owner FROM jobs WHERE id = '19'")
+        ).fetchone()
+        events = connection.execute(
+            text("SELECT event FROM job_events WHERE job_id = '19'")
+        ).scalars().all()
+
+    assert row is not None
+    assert tuple(row) == ("running", 1, "worker-2:b")
+    assert events == ["claimed"]
+
+
+def test_cancelled_job_is_marked_cancelled_without_retry(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("WORKER_LEASE_SECONDS", "1")
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-cancel.db'}")
+    _create_schema(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts)
+                VALUES ('8', 'rag_reindex', 'queued', 0, 3)
+                """
+            )
+        )
+
+    job = _claim_next_rag_reindex_job(engine)
+    assert job is not None
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE jobs SET cancel_requested = 1 WHERE id = '8'"))
+
+    cancel_event = Event()
+
+    def runner(_payload):
+        # Stands in for a runner that stops at its next batch boundary.
+        if not cancel_event.wait(timeout=5):
+            raise AssertionError("lease renewal never observed the cancel request")
+        raise JobCancelledError("cancelled at embedding batch 3")
+
+    _process_claimed_job(engine, job, runner=runner, cancel_event=cancel_event)
+
+    with engine.connect() as connection:
+        row = connection.execute(
+            text("SELECT status, attempts, lease_expires_at, finished_at FROM jobs WHERE id = '8'")
+        ).fetchone()
+
+    assert row is not None
+    assert row[0] == "cancelled"
+    assert row[1] == 0
+    assert row[2] is None
+    assert row[3] is not None
+
+
+def test_run_job_subprocess_terminates_runner_on_cancel(monkeypatch) -> None:
+    import subprocess
+
+    signals: list[str] = []
+
+    class _Process:
+        def __init__(self, command, **kwargs) -> None:
+            self.returncode = None
+            self.stdout = io.StringIO("")
+            self.stderr = io.StringIO("[rag-reindex-runner] cancelled: cancelled at embedding batch 2")
+
+        def wait(self, timeout=None):
+            if signals:
+                self.returncode = 130
+                return self.returncode
+            raise subprocess.TimeoutExpired("uv", timeout or 0.0)
+
+        def terminate(self) -> None:
+            signals.append("SIGTERM")
+
+        def kill(self) -> None:
+            signals.append("SIGKILL")
+
+    monkeypatch.setattr("worker.main.subprocess.Popen", _Process)
+    cancel_event = Event()
+    cancel_event.set()
+
+    with pytest.raises(JobCancelledError, match="exit=130"):
+        _run_job_subprocess("rag_reindex", None, cancel_event=cancel_event)
+
+    assert signals == ["SIGTERM"]
+
+
+def test_run_job_subprocess_streams_progress_lines(monkeypatch) -> None:
+    class _Process:
+        def __init__(self, command, **kwargs) -> None:
+            self.returncode = 0
+            self.stdout = io.StringIO(
+                '{"event": "progress", "phase": "embedding", "chunks_done": 64, "chunks_total": 128}\n'
+                '{"event": "progress", "phase": "embedding", "chunks_done": 128, "chunks_total": 128}\n'
+                '{"documents": 2, "chunks": 128}\n'
+            )
+            self.stderr = io.StringIO("")
+
+        def wait(self, timeout=None):
+            return self.returncode
+
+    monkeypatch.setattr("worker.main.subprocess.Popen", _Process)
+    progress_updates: list[dict] = []
+
+    result = _run_job_subprocess("rag_reindex", None, on_progress=progress_updates.append)
+
+    assert result == {"documents": 2, "chunks": 128}
+    assert [update["chunks_done"] for update in progress_updates] == [64, 128]
+    assert all("event" not in update for update in progress_updates)
+
+
+def test_update_job_progress_writes_running_job_row(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-progress.db'}")
+    _create_schema(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, lease_owner)
+                VALUES ('9', 'rag_reindex_incremental', 'running', 0, 3, 'worker-1:a')
+                """
+            )
+        )
+
+    _update_job_progress(engine, 9, {"docs_done": 3, "docs_total": 10, "eta_seconds": 14.0}, lease_owner="worker-1:a")
+
+    with engine.connect() as connection:
+        progress_json = connection.execute(
+            text("SELECT progress_json FROM jobs WHERE id = '9'")
+        ).scalar_one()
+
+    assert "\"docs_done\": 3" in str(progress_json)
+
+
+def test_worker_metrics_record_queue_wait_run_time_and_serve_endpoint(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-metrics.db'}")
+    _create_schema(engine)
+    enqueued_at = datetime.now(timezone.utc) - timedelta(seconds=90)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, created_at, updated_at)
+                VALUES ('m1', 'rag_verify_index', 'queued', 0, 1, :enqueued_at, :enqueued_at)
+                """
+            ),
+            {"enqueued_at": enqueued_at.replace(tzinfo=None).isoformat(sep=" ")},
+        )
+    waits_before = JOB_QUEUE_WAIT_SECONDS.count(type="rag_verify_index")
+    failures_before = JOB_RUN_SECONDS.count(type="rag_verify_index", outcome="failed")
+
+    job = _claim_next_job(engine, job_types=("rag_verify_index",))
+    assert job is not None
+    assert 89 <= job["queue_wait_seconds"] < 150
+    _process_claimed_job(engine, job, runner=lambda _: (_ for _ in ()).throw(RuntimeError("boom")))
+
+    assert JOB_QUEUE_WAIT_SECONDS.count(type="rag_verify_index") == waits_before + 1
+    assert JOB_RUN_SECONDS.count(type="rag_verify_index", outcome="failed") == failures_before + 1
+
+    server = start_metrics_server(0, host="127.0.0.1")
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'worker_job_run_seconds_count{type="rag_verify_index",outcome="failed"}' in body
+    assert 'worker_jobs_running{type="rag_verify_index"} 0.0' in body
+    assert "# TYPE worker_heartbeat_failures_total counter" in body
+
+
+def test_job_span_continues_enqueue_trace_into_runner_env(tmp_path, monkeypatch, capsys) -> None:
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_EXPORTER", "file")
+    monkeypatch.setenv("TRACE_FILE", str(trace_file))
+    engine = instrument_engine(create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-trace.db'}"))
+    _create_schema(engine)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    enqueue_span_id = "00f067aa0ba902b7"
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO jobs (id, type, status, attempts, max_attempts, trace_parent) "
+                "VALUES ('5', 'rag_reindex', 'queued', 0, 3, :trace_parent)"
+            ),
+            {"trace_parent": f"00-{trace_id}-{enqueue_span_id}-01"},
+        )
+
+    runner_envs: list[dict[str, str]] = []
+
+    class _Process:
+        def __init__(self, command, **kwargs) -> None:
+            runner_envs.append(kwargs["env"])
+            self.returncode = 0
+            self.stdout = io.StringIO('{"event": "span", "name": "runner rag_reindex"}\n{"chunks": 3}\n')
+            self.stderr = io.StringIO("")
+
+        def wait(self, timeout=None):
+            return self.returncode
+
+    monkeypatch.setattr("worker.main.subprocess.Popen", _Process)
+
+    job = _claim_next_job(engine, job_types=("rag_reindex",))
+    assert job is not None
+    _process_claimed_job(engine, job, runner=lambda payload: _run_job_subprocess("rag_reindex", payload))
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    job_span = next(span for span in spans if span["name"] == "job rag_reindex")
+    subprocess_span = next(span for span in spans if span["name"] == "subprocess rag_reindex")
+    assert job_span["trace_id"] == trace_id
+    assert job_span["parent_span_id"] == enqueue_span_id
+    assert job_span["attributes"]["job.outcome"] == "succeeded"
+    assert subprocess_span["parent_span_id"] == job_span["span_id"]
+    assert runner_envs[0]["TRACEPARENT"] == f"00-{trace_id}-{subprocess_span['span_id']}-01"
+    assert runner_envs[0]["OTEL_SERVICE_NAME"] == "runner"
+    assert any(
+        span["name"] == "sqlite UPDATE" and span["parent_span_id"] == job_span["span_id"] for span in spans
+    )
+    # Runner spans printed on its stdout are forwarded, not taken as the result.
+    assert '"name": "runner rag_reindex"' in capsys.readouterr().out
+
+
+def test_claim_and_completion_append_job_events(tmp_path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'worker-events.db'}")
+    _create_schema(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                INSERT INTO jobs (id, type, status, attempts, max_attempts, updated_at)
+                VALUES ('3', 'rag_verify_index', 'queued', 0, 2, :updated_at)
+                """
+            ),
+            {"updated_at": datetime.now(timezone.utc) - timedelta(seconds=30)},
+        )
+
+    def failing_runner(_: dict | None) -> dict:
+        raise RuntimeError("index missing")
+
+    for runner in (failing_runner, lambda _: {"ok": True}):
+        job = _claim_next_job(engine, job_types=("rag_verify_index",))
+        assert job is not None
+        _process_claimed_job(engine, job, runner=runner)
+
+    with engine.connect() as connection:
+        events = connection.execute(
+            text("SELECT job_id, type, event, wait_seconds, run_seconds FROM job_events ORDER BY id")
+        ).fetchall()
+
+    assert [(row[0], row[1], row[2]) for row in events] == [
+        ("3", "rag_verify_index", "claimed"),
+        ("3", "rag_verify_index", "requeued"),
+        ("3", "rag_verify_index", "claimed"),
+        ("3", "rag_verify_index", "succeeded"),
+    ]
+    assert events[0][3] >= 29
+    assert events[1][4] is not None and events[3][4] is not None
@@ -0,0 +1 @@
+# Benchmark harnesses (run from the workspace root with `uv run python -m benchmarks.<name>`)
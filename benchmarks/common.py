@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import json
+import math
+from pathlib import Path
+import platform
+import sys
+from typing import Any
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def latency_summary_ms(values_seconds: list[float]) -> dict[str, float | int | None]:
+    values_ms = [value * 1000 for value in values_seconds]
+
+    def _rounded(value: float | None) -> float | None:
+        return round(value, 3) if value is not None else None
+
+    return {
+        "count": len(values_ms),
+        "p50": _rounded(percentile(values_ms, 50)),
+        "p95": _rounded(percentile(values_ms, 95)),
+        "p99": _rounded(percentile(values_ms, 99)),
+        "max": _rounded(max(values_ms)) if values_ms else None,
+    }
+
+
+def environment_info() -> dict[str, str]:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def emit_results(results: dict[str, Any], output: str | None) -> None:
+    """Print results as one JSON document and optionally write them to a file.
+
+    The JSON shape is stable so CI can diff runs between releases.
+    """
+    rendered = json.dumps(results, indent=2, sort_keys=True)
+    print(rendered, flush=True)
+    if output:
+        output_path = Path(output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(rendered + "\n", encoding="utf-8")
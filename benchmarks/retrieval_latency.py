@@ -0,0 +1,460 @@
+"""Retrieval latency / recall benchmark for `search_index`.
+
+Builds synthetic corpora with the deterministic embedder (no Ollama needed),
+persists them through `persist_sqlite_index`, then measures per corpus size and
+scoring backend: index build time, load time and memory of the backend's own
+load path (sidecar mapping, BLOB stream or FTS candidates), `search_index`
+p50/p95/p99 latency and recall@k against exact cosine ranking.
+Filtered backends are compared with the exact ranking of the same filtered subset.
+
+    uv run python -m benchmarks.retrieval_latency --sizes 1000,10000
+    uv run python -m benchmarks.retrieval_latency --sizes 100000 --dims 768 --queries 20
+
+Corpora are cached under --workdir keyed by size/dims, so repeated runs only
+pay the generation cost once. Corpora are written and the exact reference is
+computed in bounded batches/streams, so 1M-chunk corpora fit in memory.
+"""
+
+from __future__ import annotations
+
+import argparse
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from functools import partial
+import gc
+import heapq
+import os
+from pathlib import Path
+import resource
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable
+
+from benchmarks.common import emit_results, environment_info, latency_summary_ms
+
+from api.config import get_settings
+from api.services.rag.collection import LoadedIndexCache
+from api.services.rag.embedder import _deterministic_embedding
+from api.services.rag.embedding_client import EmbeddingClient
+from api.services.rag.query import cosine_similarity, search_index
+from api.services.rag.sqlite_store import (
+    compute_content_hash,
+    connect_sqlite,
+    ensure_sqlite_schema,
+    iter_sqlite_vectors,
+    leave_wal_mode,
+    load_chunk_texts_by_rowid,
+    load_sqlite_chunks_by_rowid,
+    remove_sqlite_files,
+    replace_chunks_for_doc,
+    search_fts_rowids,
+    upsert_document,
+)
+from api.services.rag.types import ChunkRecord, QueryHit, SearchFilters
+from api.services.rag.vector_sidecar import vector_sidecar_path, write_vector_sidecar
+
+CHUNKS_PER_DOCUMENT = 20
+# Documents per committed write batch while building a corpus (10k chunks).
+BUILD_BATCH_DOCUMENTS = 500
+VOCABULARY = (
+    "pump", "valve", "bearing", "alarm", "torque", "sensor", "conveyor", "press",
+    "hydraulic", "lubrication", "inspection", "calibration", "motor", "spindle",
+    "coolant", "filter", "gearbox", "encoder", "plc", "interlock",
+)
+
+SearchBackend = Callable[..., list[QueryHit]]
+
+
+class DeterministicEmbeddingClient:
+    def __init__(self, dimensions: int) -> None:
+        self._dimensions = dimensions
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        return [_deterministic_embedding(text, dimensions=self._dimensions) for text in texts]
+
+
+def _search(
+    *,
+    index_dir: Path,
+    db_path: Path,
+    query_text: str,
+    top_k: int,
+    embedding_client: EmbeddingClient,
+    mode: str = "vector",
+    prefilter: bool = False,
+    filters: SearchFilters | None = None,
+) -> list[QueryHit]:
+    return search_index(
+        index_dir=index_dir,
+        db_path=db_path,
+        query_text=query_text,
+        top_k=top_k,
+        embedding_client=embedding_client,
+        mode=mode,
+        prefilter=prefilter,
+        filters=filters,
+        # Recall is measured against exact per-chunk ranking; the synthetic
+        # texts share most words, so duplicate collapsing would drop hits.
+        collapse_duplicates=False,
+    )
+
+
+@dataclass(frozen=True)
+class Backend:
+    prepare: Callable[[Path], object]
+    search: SearchBackend
+    filters: SearchFilters | None = None
+    # How a search reaches the vectors: "sidecar" (mmap), "blob" (stream) or "prefilter" (FTS).
+    load: str = "sidecar"
+
+
+def _with_sidecar(dtype: str) -> Callable[[Path], object]:
+    return lambda db_path: write_vector_sidecar(db_path, dtype=dtype)
+
+
+# Scoring backends under test. New retrieval modes register here so every
+# release is measured on the same corpora and queries.
+BACKENDS: dict[str, Backend] = {
+    "blob": Backend(prepare=_with_sidecar("none"), search=_search, load="blob"),
+    "mmap-float32": Backend(prepare=_with_sidecar("float32"), search=_search),
+    "mmap-float16": Backend(prepare=_with_sidecar("float16"), search=_search),
+    "mmap-int8": Backend(prepare=_with_sidecar("int8"), search=_search),
+    "hybrid-float32": Backend(prepare=_with_sidecar("float32"), search=partial(_search, mode="hybrid")),
+    "prefilter-float32": Backend(
+        prepare=_with_sidecar("float32"),
+        search=partial(_search, prefilter=True),
+        load="prefilter",
+    ),
+    # One line is 10% of the corpus, one cell of a line 1% (see build_corpus).
+    "filter10-float32": Backend(
+        prepare=_with_sidecar("float32"),
+        search=_search,
+        filters=SearchFilters(source_path_prefix="synthetic/line_0/"),
+    ),
+    "filter1-float32": Backend(
+        prepare=_with_sidecar("float32"),
+        search=_search,
+        filters=SearchFilters(source_path_prefix="synthetic/line_0/cell_00/"),
+    ),
+    "filter1-blob": Backend(
+        prepare=_with_sidecar("none"),
+        search=_search,
+        filters=SearchFilters(source_path_prefix="synthetic/line_0/cell_00/"),
+        load="blob",
+    ),
+}
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="bench-retrieval",
+        description="Measure search_index latency, memory and recall on synthetic corpora",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000",
+        help="Comma-separated corpus sizes in chunks (e.g. 1000,10000,100000,1000000)",
+    )
+    parser.add_argument("--dims", type=int, default=768, help="Embedding dimensions")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per corpus/backend")
+    parser.add_argument("--top-k", type=int, default=5, help="Hits per query")
+    parser.add_argument(
+        "--backends",
+        default=",".join(BACKENDS),
+        help=f"Comma-separated scoring backends (available: {', '.join(BACKENDS)})",
+    )
+    parser.add_argument(
+        "--workdir",
+        default=None,
+        help="Directory for cached synthetic corpora (default: temporary directory)",
+    )
+    parser.add_argument("--output", default=None, help="Optional path for the JSON results")
+    return parser
+
+
+def _synthetic_text(index: int) -> str:
+    words = [VOCABULARY[(index * 7 + offset * 3) % len(VOCABULARY)] for offset in range(12)]
+    return f"chunk {index} " + " ".join(words)
+
+
+def build_corpus(db_path: Path, *, size: int, dims: int) -> float:
+    """Write the synthetic corpus document by document, committing every BUILD_BATCH_DOCUMENTS.
+
+    Only one document's chunks are in memory at a time. The corpus is built
+    under a temporary name and renamed at the end, so an interrupted build is
+    never mistaken for a cached corpus.
+    """
+    started = perf_counter()
+    tmp_db_path = db_path.with_name(f"{db_path.name}.tmp")
+    remove_sqlite_files(tmp_db_path)
+    tmp_db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with connect_sqlite(tmp_db_path) as connection:
+        ensure_sqlite_schema(connection)
+        for doc_index in range((size + CHUNKS_PER_DOCUMENT - 1) // CHUNKS_PER_DOCUMENT):
+            doc_id = f"doc{doc_index:08d}"
+            source_path = f"synthetic/line_{doc_index % 10}/cell_{doc_index % 100:02d}/manual_{doc_index:08d}.md"
+            first = doc_index * CHUNKS_PER_DOCUMENT
+            texts = [_synthetic_text(index) for index in range(first, min(size, first + CHUNKS_PER_DOCUMENT))]
+            upsert_document(
+                connection,
+                doc_id=doc_id,
+                source_path=source_path,
+                content_hash=compute_content_hash("\n".join(texts)),
+            )
+            replace_chunks_for_doc(
+                connection,
+                doc_id=doc_id,
+                chunks=[
+                    ChunkRecord(
+                        chunk_id=f"{doc_id}-{chunk_index:04d}",
+                        doc_id=doc_id,
+                        source_path=source_path,
+                        text=text,
+                    )
+                    for chunk_index, text in enumerate(texts)
+                ],
+                embeddings=[_deterministic_embedding(text, dimensions=dims) for text in texts],
+            )
+            if (doc_index + 1) % BUILD_BATCH_DOCUMENTS == 0:
+                connection.commit()
+        connection.commit()
+
+    leave_wal_mode(tmp_db_path)
+    os.replace(tmp_db_path, db_path)
+    return perf_counter() - started
+
+
+def _load_sidecar(db_path: Path, *, filters: SearchFilters | None, query_text: str) -> tuple[object, int, int]:
+    # A fresh cache, so this is the cold mapping a search pays once per generation.
+    loaded = LoadedIndexCache(1).get(db_path)
+    if loaded is None:
+        raise RuntimeError(f"no usable vector sidecar next to {db_path}")
+    return loaded, loaded.info.count, len(loaded.mapped)
+
+
+def _load_blob(db_path: Path, *, filters: SearchFilters | None, query_text: str) -> tuple[object, int, int]:
+    # Every BLOB search streams all (filtered) vectors; nothing stays loaded.
+    with connect_sqlite(db_path) as connection:
+        chunk_count = sum(1 for _ in iter_sqlite_vectors(connection, filters=filters))
+    return None, chunk_count, 0
+
+
+def _load_prefilter(db_path: Path, *, filters: SearchFilters | None, query_text: str) -> tuple[object, int, int]:
+    # The prefilter path decodes only the FTS candidates of each query.
+    with connect_sqlite(db_path) as connection:
+        rowids = search_fts_rowids(
+            connection,
+            query_text,
+            limit=get_settings().rag_fts_candidates,
+            filters=filters,
+        )
+        chunks = load_sqlite_chunks_by_rowid(connection, rowids)
+    return chunks, len(chunks), 0
+
+
+LOADERS: dict[str, Callable[..., tuple[object, int, int]]] = {
+    "sidecar": _load_sidecar,
+    "blob": _load_blob,
+    "prefilter": _load_prefilter,
+}
+
+
+def _measure_load(db_path: Path, backend: Backend, *, query_text: str) -> dict[str, Any]:
+    """Time and memory of the backend's own load path; mapped pages are not heap and count separately."""
+    gc.collect()
+    tracemalloc.start()
+    started = perf_counter()
+    loaded, chunk_count, mapped_bytes = LOADERS[backend.load](
+        db_path,
+        filters=backend.filters,
+        query_text=query_text,
+    )
+    load_seconds = perf_counter() - started
+    current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    gc.collect()
+
+    return {
+        "path": backend.load,
+        "chunks": chunk_count,
+        "load_ms": round(load_seconds * 1000, 3),
+        "resident_bytes": current_bytes,
+        "peak_bytes": peak_bytes,
+        "mapped_bytes": mapped_bytes,
+        "bytes_per_chunk": round(current_bytes / chunk_count, 1) if chunk_count else None,
+    }
+
+
+def _exact_top_k(
+    db_path: Path,
+    query_embeddings: list[list[float]],
+    top_k: int,
+    filters: SearchFilters | None = None,
+) -> list[list[str]]:
+    """Exact cosine top-k chunk ids per query, from one stream over the (filtered) vectors.
+
+    Only a top_k heap per query stays resident. Vectors arrive in chunk id
+    order, so on equal scores the earlier position (smaller chunk id) wins.
+    """
+    heaps: list[list[tuple[float, int, int]]] = [[] for _ in query_embeddings]
+    with connect_sqlite(db_path) as connection:
+        for position, (rowid, embedding) in enumerate(iter_sqlite_vectors(connection, filters=filters)):
+            for heap, query_embedding in zip(heaps, query_embeddings):
+                item = (cosine_similarity(query_embedding, embedding), -position, rowid)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        texts = load_chunk_texts_by_rowid(
+            connection,
+            sorted({rowid for heap in heaps for _, _, rowid in heap}),
+        )
+    return [
+        [texts[rowid].chunk_id for _, _, rowid in sorted(heap, reverse=True)]
+        for heap in heaps
+    ]
+
+
+def _run_backend(
+    backend: Backend,
+    *,
+    db_path: Path,
+    queries: list[str],
+    reference: list[list[str]],
+    top_k: int,
+    embedding_client: EmbeddingClient,
+) -> dict[str, Any]:
+    started = perf_counter()
+    backend.prepare(db_path)
+    prepare_seconds = perf_counter() - started
+    load = _measure_load(db_path, backend, query_text=queries[0])
+
+    def search(query_text: str) -> list[QueryHit]:
+        return backend.search(
+            index_dir=db_path.parent,
+            db_path=db_path,
+            query_text=query_text,
+            top_k=top_k,
+            embedding_client=embedding_client,
+            filters=backend.filters,
+        )
+
+    # One traced query shows what a search allocates on top of the mapped/loaded index.
+    gc.collect()
+    tracemalloc.start()
+    search(queries[0])
+    _, search_peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies: list[float] = []
+    recalls: list[float] = []
+    for query_text, expected in zip(queries, reference):
+        started = perf_counter()
+        hits = search(query_text)
+        latencies.append(perf_counter() - started)
+        returned = {hit.chunk_id for hit in hits}
+        recalls.append(len(returned & set(expected)) / max(1, len(expected)))
+
+    return {
+        "prepare_ms": round(prepare_seconds * 1000, 3),
+        "load": load,
+        "search_peak_bytes": search_peak_bytes,
+        "latency_ms": latency_summary_ms(latencies),
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else None,
+    }
+
+
+def run_benchmark(
+    *,
+    sizes: list[int],
+    dims: int,
+    query_count: int,
+    top_k: int,
+    backend_names: list[str],
+    workdir: Path,
+) -> dict[str, Any]:
+    embedding_client = DeterministicEmbeddingClient(dims)
+    queries = [f"query {index} " + _synthetic_text(index * 31 + 5) for index in range(query_count)]
+    query_embeddings = embedding_client.embed_texts(queries)
+    runs: list[dict[str, Any]] = []
+
+    for size in sizes:
+        db_path = workdir / f"corpus_{size}_{dims}" / "rag.db"
+        build_seconds: float | None = None
+        if not db_path.exists():
+            build_seconds = build_corpus(db_path, size=size, dims=dims)
+
+        references: dict[SearchFilters | None, list[list[str]]] = {}
+
+        sidecar_path = vector_sidecar_path(db_path)
+        for backend_name in backend_names:
+            backend = BACKENDS[backend_name]
+            if backend.filters not in references:
+                references[backend.filters] = _exact_top_k(
+                    db_path, query_embeddings, top_k, filters=backend.filters
+                )
+            measured = _run_backend(
+                backend,
+                db_path=db_path,
+                queries=queries,
+                reference=references[backend.filters],
+                top_k=top_k,
+                embedding_client=embedding_client,
+            )
+            runs.append(
+                {
+                    "corpus_size": size,
+                    "backend": backend_name,
+                    "build_ms": round(build_seconds * 1000, 3) if build_seconds is not None else None,
+                    "db_bytes": db_path.stat().st_size,
+                    "sidecar_bytes": sidecar_path.stat().st_size if sidecar_path.exists() else 0,
+                    **measured,
+                }
+            )
+
+    return {
+        "benchmark": "retrieval_latency",
+        "environment": environment_info(),
+        "config": {
+            "sizes": sizes,
+            "dims": dims,
+            "queries": query_count,
+            "top_k": top_k,
+            "backends": backend_names,
+        },
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "runs": runs,
+    }
+
+
+def main() -> None:
+    parser = _build_parser()
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in str(args.sizes).split(",") if value.strip()]
+    backend_names = [name.strip() for name in str(args.backends).split(",") if name.strip()]
+    unknown = sorted(set(backend_names) - set(BACKENDS))
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-retrieval-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    with redirect_stdout(sys.stderr):
+        results = run_benchmark(
+            sizes=sizes,
+            dims=max(1, args.dims),
+            query_count=max(1, args.queries),
+            top_k=max(1, args.top_k),
+            backend_names=backend_names,
+            workdir=workdir,
+        )
+    emit_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()